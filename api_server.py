@@ -12,7 +12,13 @@ from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import os
 import json
+import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
 from dotenv import load_dotenv
+from ohlc_analyzer import ohlc_cache_stats
+from llm_model import llm_usage_stats
 from brain import (
     sod_action,
     intraday_action,
@@ -29,6 +35,13 @@ from database import (
     delete_strategy,
     save_account_snapshot,
     magic_number_is_available,
+    magic_number_matches_record,
+    load_run_context,
+    apply_payload_run_state,
+    create_analysis_job,
+    update_analysis_job,
+    get_analysis_job,
+    test_run_queue_stats,
 )
 
 load_dotenv()
@@ -54,20 +67,120 @@ def _persist_ea_state_before_brain(
     symbol: str,
     strategy_name: str,
     magic_number: int,
+    run_context: dict = None,
 ) -> None:
-    """Upsert account + positions from EA payload before brain reads DB."""
-    save_account_snapshot(
+    """
+    Upsert account + positions from EA payload before the brain runs. With run_context,
+    its positions / account are filled from the same payload (no read-back) — unless a
+    write failed, in which case they are re-read so the brain sees what is stored.
+    """
+    account = {
+        key: _float_or_none(data.get(key))
+        for key in (
+            "account_size", "realised_pnl", "unrealised_pnl",
+            "today_realised_pnl", "week_pnl", "month_pnl",
+        )
+    }
+    positions = data.get("positions", [])
+    account_saved = save_account_snapshot(
         symbol=symbol,
         strategy_name=strategy_name,
         magic_number=magic_number,
-        account_size=_float_or_none(data.get("account_size")),
-        realised_pnl=_float_or_none(data.get("realised_pnl")),
-        unrealised_pnl=_float_or_none(data.get("unrealised_pnl")),
-        today_realised_pnl=_float_or_none(data.get("today_realised_pnl")),
-        week_pnl=_float_or_none(data.get("week_pnl")),
-        month_pnl=_float_or_none(data.get("month_pnl")),
+        **account,
     )
-    store_current_positions(symbol, data.get("positions", []), magic_number)
+    positions_saved = store_current_positions(symbol, positions, magic_number)
+    if run_context is None:
+        return
+    if account_saved and positions_saved:
+        apply_payload_run_state(run_context, magic_number, symbol, strategy_name, positions, account)
+        return
+    print("[api] EA state not fully persisted — re-reading positions/account from DB")
+    stored = load_run_context(magic_number, symbol, strategy_name, include_state=True)
+    run_context["positions"] = stored["positions"]
+    run_context["account"] = stored["account"]
+
+
+# =============================================================================
+# ASYNC JOB MODE
+# SOD/intraday with "async": true return 202 + job_id immediately; the brain runs on
+# a per-process background executor and the flat EA payload is stored in analysis_jobs,
+# so GET /api/trading/jobs/<id> can be answered by any gunicorn worker.
+# =============================================================================
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Jobs still running this long after they started were lost (worker restart) — report failed.
+JOB_STALE_SECONDS = int(os.getenv("JOB_STALE_SECONDS", "600"))
+# Jobs never picked up this long after submit (queued behind JOB_WORKERS, or the
+# process died with them queued) — report failed; the executor then skips them.
+JOB_PENDING_STALE_SECONDS = int(os.getenv("JOB_PENDING_STALE_SECONDS", "1800"))
+
+_job_executor = None
+_job_executor_pid = None
+_job_executor_lock = threading.Lock()
+
+
+def _get_job_executor() -> ThreadPoolExecutor:
+    """Lazily create the job executor in the current process (threads do not survive fork)."""
+    global _job_executor, _job_executor_pid
+    with _job_executor_lock:
+        if _job_executor is None or _job_executor_pid != os.getpid():
+            _job_executor = ThreadPoolExecutor(
+                max_workers=JOB_WORKERS, thread_name_prefix="trading-job"
+            )
+            _job_executor_pid = os.getpid()
+        return _job_executor
+
+
+def _wants_async_job(data: dict) -> bool:
+    """True if the EA asked for submit-and-poll (body "async": true or ?async=1)."""
+    raw = data.get("async", request.args.get("async"))
+    if isinstance(raw, str):
+        return raw.strip().lower() in ("1", "true", "yes")
+    return bool(raw)
+
+
+def _run_trading_job(job_id: str, action, kwargs: dict) -> None:
+    """Executor body: run sod_action / intraday_action and store the flat payload."""
+    if not update_analysis_job(job_id, "running", from_status="pending"):
+        print(f"[job] {job_id} is no longer pending (failed as stale?) — skipping")
+        return
+    try:
+        result = action(**kwargs)
+    except Exception as e:
+        import traceback
+        print(f"[job] {job_id} ERROR: {e}")
+        print(traceback.format_exc())
+        update_analysis_job(
+            job_id, "failed", error=f"Internal server error: {str(e)}", from_status="running"
+        )
+        return
+    if update_analysis_job(job_id, "done", result=result, from_status="running"):
+        print(f"[job] {job_id} done")
+    else:
+        print(f"[job] {job_id} finished after being marked failed — result discarded")
+
+
+def _submit_trading_job(run_type: str, action, kwargs: dict):
+    """Create the job row, queue the brain run, and return the 202 response."""
+    job_id = str(uuid.uuid4())
+    if not create_analysis_job(
+        job_id,
+        kwargs["magic_number"],
+        kwargs["symbol"],
+        kwargs["strategy_name"],
+        run_type,
+    ):
+        return jsonify({"error": "Failed to create analysis job"}), 500
+
+    _get_job_executor().submit(_run_trading_job, job_id, action, kwargs)
+    print(f"[job] {run_type} job {job_id} queued (magic {kwargs['magic_number']})")
+    return jsonify({
+        "job_id": job_id,
+        "status": "pending",
+        "run_type": run_type,
+        "magic_number": kwargs["magic_number"],
+        "poll_url": f"/api/trading/jobs/{job_id}",
+    }), 202
 
 
 def _parse_magic_number(data: dict):
@@ -142,12 +255,34 @@ def cron_morning_market_brief():
 
     try:
         from market_data import get_market_data
-        from database import save_market_data_cache
+        from database import (
+            advisory_lock,
+            get_market_data_cache,
+            save_market_data_cache,
+            MARKET_DATA_REFRESH_LOCK_KEY,
+        )
+        from brain import MARKET_DATA_REFRESH_WAIT_SECONDS
         from telegram_notify import send_market_brief_to_telegram
 
-        data = get_market_data(symbol)
-        data["_morning_brief"] = True
-        saved = save_market_data_cache(data)
+        # Share the single-flight lock with SOD/intraday refreshes; if one of them
+        # synthesized while we queued, post its snapshot instead of fetching again
+        # (a quote-only refresh keeps an older synthesis and does not count).
+        requested_at = datetime.now(timezone.utc)
+        with advisory_lock(MARKET_DATA_REFRESH_LOCK_KEY, MARKET_DATA_REFRESH_WAIT_SECONDS):
+            cached = get_market_data_cache(use_memo=False) or {}
+            try:
+                synthesized_at = datetime.fromisoformat(cached.get("_synthesized_at") or "")
+                if synthesized_at.tzinfo is None:
+                    synthesized_at = synthesized_at.replace(tzinfo=timezone.utc)
+            except ValueError:
+                synthesized_at = None
+            if synthesized_at and synthesized_at >= requested_at:
+                print("[cron] Market data refreshed by a concurrent request — reusing it")
+                data = {k: v for k, v in cached.items() if k != "_db_created_at"}
+            else:
+                data = get_market_data(symbol)
+            data["_morning_brief"] = True
+            saved = save_market_data_cache(data)
         if not saved:
             return jsonify({
                 "success": False,
@@ -169,6 +304,30 @@ def cron_morning_market_brief():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@app.route("/api/cron/db-maintenance", methods=["POST"])
+def cron_db_maintenance():
+    """
+    Scheduled job: pre-create upcoming monthly partitions of test_inputs / trade_events
+    and apply retention (PARTITION_RETENTION_MODE detach|drop, then sweep unreferenced
+    test_blobs), compact old market_data_cache snapshots and delete day-old
+    analysis_jobs / ohlc_analysis_cache rows. Run daily or weekly.
+
+    Auth: optional header X-Cron-Secret when CRON_SECRET env is set.
+    """
+    if not _cron_secret_ok():
+        return jsonify({"error": "Unauthorized"}), 401
+    try:
+        from database import maintain_partitions, prune_market_data_cache, prune_transient_rows
+        return jsonify({
+            "success": True,
+            "partitions": maintain_partitions(),
+            "market_data_cache_deleted": prune_market_data_cache(),
+            "transient_rows_deleted": prune_transient_rows(),
+        }), 200
+    except Exception as e:
+        return jsonify({"success": False, "error": str(e)}), 500
+
+
 @app.route("/api/trading/sod", methods=["POST"])
 def trading_sod():
     """
@@ -180,6 +339,9 @@ def trading_sod():
         "4h_DATA": [...],
         "1D_DATA": [...]
     }
+
+    Optional "async": true — respond 202 with a job_id immediately and run the
+    analysis in the background; poll GET /api/trading/jobs/<job_id> for the result.
     """
     try:
         data = request.get_json(force=True, silent=True)
@@ -216,21 +378,23 @@ def trading_sod():
                          "or POST /api/strategies to create a new one."
             }), 400
 
-        strategy_record = get_strategy(strategy_name)
-        if not strategy_record:
+        # One read for strategy + analysis note; validated here and handed to the brain.
+        run_context = load_run_context(magic_number, symbol, strategy_name, include_state=False)
+        if not run_context["strategy"]:
             return jsonify({
                 "error": f"Strategy '{strategy_name}' not found. "
                          "Use GET /api/strategies to see available strategies, "
                          "or POST /api/strategies to create a new one."
             }), 400
 
-        magic_ok, magic_msg = magic_number_is_available(
-            magic_number, symbol, strategy_name
+        magic_ok, magic_msg = magic_number_matches_record(
+            magic_number, symbol, strategy_name, run_context["analysis_record"]
         )
         if not magic_ok:
             return jsonify({"error": magic_msg}), 409
 
-        _persist_ea_state_before_brain(data, symbol, strategy_name, magic_number)
+        # Positions / account for the brain come from the payload persisted here.
+        _persist_ea_state_before_brain(data, symbol, strategy_name, magic_number, run_context)
 
         # Log the SOD data received
         print("=" * 50)
@@ -249,14 +413,19 @@ def trading_sod():
             "1D_DATA": d1_data,
         }
 
+        sod_kwargs = {
+            "symbol": symbol,
+            "ohlc_data": ohlc_data,
+            "magic_number": magic_number,
+            "strategy_name": strategy_name,
+            "run_context": run_context,
+        }
+        if _wants_async_job(data):
+            return _submit_trading_job("sod", sod_action, sod_kwargs)
+
         # Call sod_action in brain.py to perform comprehensive SOD analysis
         # This includes: OHLC analysis, chart analysis with GPT Vision, market data, and final GPT analysis
-        result = sod_action(
-            symbol=symbol,
-            ohlc_data=ohlc_data,
-            magic_number=magic_number,
-            strategy_name=strategy_name,
-        )
+        result = sod_action(**sod_kwargs)
         
         # Return the AI analysis result directly to the EA
         # The EA will receive the complete SOD analysis including decision, bias, and order_details
@@ -286,6 +455,8 @@ def trading_intraday():
     }
     
     Note: Timeframe keys can vary - send whichever timeframes are needed
+
+    Optional "async": true — same submit-and-poll job mode as /api/trading/sod.
     """
     try:
         data = request.get_json(force=True, silent=True)
@@ -302,7 +473,7 @@ def trading_intraday():
         ohlc_data = {}
         for key, value in data.items():
             if key not in (
-                "symbol", "positions", "strategy", "magic_number", "fill_event",
+                "symbol", "positions", "strategy", "magic_number", "fill_event", "async",
                 "account_size", "realised_pnl", "unrealised_pnl",
                 "today_realised_pnl", "week_pnl", "month_pnl",
             ) and key.endswith("_DATA"):
@@ -329,23 +500,25 @@ def trading_intraday():
                          "or POST /api/strategies to create a new one."
             }), 400
 
-        strategy_record = get_strategy(strategy_name)
-        if not strategy_record:
+        # One read for strategy + analysis note; validated here and handed to the brain.
+        run_context = load_run_context(magic_number, symbol, strategy_name, include_state=False)
+        if not run_context["strategy"]:
             return jsonify({
                 "error": f"Strategy '{strategy_name}' not found. "
                          "Use GET /api/strategies to see available strategies, "
                          "or POST /api/strategies to create a new one."
             }), 400
 
-        magic_ok, magic_msg = magic_number_is_available(
-            magic_number, symbol, strategy_name
+        magic_ok, magic_msg = magic_number_matches_record(
+            magic_number, symbol, strategy_name, run_context["analysis_record"]
         )
         if not magic_ok:
             return jsonify({"error": magic_msg}), 409
 
         fill_event = (data.get("fill_event") or "").strip() or None
 
-        _persist_ea_state_before_brain(data, symbol, strategy_name, magic_number)
+        # Positions / account for the brain come from the payload persisted here.
+        _persist_ea_state_before_brain(data, symbol, strategy_name, magic_number, run_context)
 
         # Log the intraday request
         print("=" * 50)
@@ -360,14 +533,19 @@ def trading_intraday():
             print(f"Fill event: {fill_event}")
         print("=" * 50)
 
+        intraday_kwargs = {
+            "symbol": symbol,
+            "ohlc_data": ohlc_data,
+            "magic_number": magic_number,
+            "strategy_name": strategy_name,
+            "fill_event": fill_event,
+            "run_context": run_context,
+        }
+        if _wants_async_job(data):
+            return _submit_trading_job("intraday", intraday_action, intraday_kwargs)
+
         # Call intraday_action in brain.py
-        result = intraday_action(
-            symbol=symbol,
-            ohlc_data=ohlc_data,
-            magic_number=magic_number,
-            strategy_name=strategy_name,
-            fill_event=fill_event,
-        )
+        result = intraday_action(**intraday_kwargs)
         
         # Return the AI analysis result directly to the EA
         return jsonify(result), 200
@@ -381,6 +559,71 @@ def trading_intraday():
         }), 500
 
 
+@app.route("/api/trading/jobs/<job_id>", methods=["GET"])
+def trading_job_status(job_id: str):
+    """
+    Poll an async SOD/intraday job.
+
+    200 — job finished: body is the same flat payload the synchronous endpoint returns.
+    202 — still pending/running: { "job_id", "status", "run_type", "magic_number" }
+    404 — unknown job_id; 500 — job failed: { "error", "job_id", "status": "failed" }
+    """
+    try:
+        try:
+            job_id = str(uuid.UUID(job_id))
+        except ValueError:
+            return jsonify({"error": "job_id must be a UUID"}), 400
+
+        job = get_analysis_job(job_id)
+        if not job:
+            return jsonify({"error": f"Job '{job_id}' not found"}), 404
+
+        status = job["status"]
+        if status == "done":
+            return jsonify(job["result"] or {}), 200
+
+        # Running jobs age from when they started; queued ones from submit.
+        if status == "running":
+            since, limit = job.get("started_at") or job.get("updated_at"), JOB_STALE_SECONDS
+        elif status == "pending":
+            since, limit = job.get("created_at"), JOB_PENDING_STALE_SECONDS
+        else:
+            since = None
+        if since:
+            age = (datetime.now(timezone.utc) - datetime.fromisoformat(since)).total_seconds()
+            if age > limit:
+                error = (
+                    f"Job lost after {int(age)}s {status} (worker restarted?)"
+                    if status == "running" else
+                    f"Job not started within {int(age)}s of submit"
+                )
+                if update_analysis_job(job_id, "failed", error=error, from_status=status):
+                    status, job["error"] = "failed", error
+                else:
+                    # It moved on meanwhile (started or finished) — report its new state.
+                    job = get_analysis_job(job_id) or job
+                    status = job["status"]
+                    if status == "done":
+                        return jsonify(job["result"] or {}), 200
+
+        if status == "failed":
+            return jsonify({
+                "error": job.get("error") or "Job failed",
+                "job_id": job_id,
+                "status": "failed",
+            }), 500
+
+        return jsonify({
+            "job_id": job_id,
+            "status": status,
+            "run_type": job["run_type"],
+            "magic_number": job["magic_number"],
+        }), 202
+
+    except Exception as e:
+        return jsonify({"error": f"Internal server error: {str(e)}"}), 500
+
+
 @app.route("/api/trading/execute", methods=["POST"])
 def trading_execute():
     """
@@ -428,7 +671,10 @@ def trading_status():
     """Get system status and pending instructions."""
     return jsonify({
         "status": "operational",
-        "version": "1.0.0"
+        "version": "1.0.0",
+        "ohlc_cache": ohlc_cache_stats(),
+        "llm_usage": llm_usage_stats(),
+        "test_inputs_queue": test_run_queue_stats(),
     }), 200
 
 
@@ -677,6 +923,7 @@ def not_found(error):
             "/api/health",
             "/api/trading/sod",
             "/api/trading/intraday",
+            "GET /api/trading/jobs/<job_id>",
             "/api/trading/execute",
             "/api/trading/status",
             "/api/trading/store_positions",
@@ -868,16 +1115,14 @@ def chat():
         if not openai_key:
             return jsonify({"error": "OPENAI_API_KEY not configured"}), 503
 
-        from llm_model import DEFAULT_MODEL
-        from openai import OpenAI
+        from llm_model import DEFAULT_MODEL, create_chat_completion
         from prompt import compose_botcore_prompt
 
         context = _build_chat_context(
             symbol, user_id, strategy_name=strategy_name, magic_number=magic_number,
         )
-        client  = OpenAI(api_key=openai_key)
 
-        response = client.chat.completions.create(
+        response = create_chat_completion(
             model=DEFAULT_MODEL,
             messages=[
                 {"role": "system", "content": compose_botcore_prompt()},
@@ -955,12 +1200,10 @@ def chat_stream():
         def generate():
             full_reply = []
             try:
-                from llm_model import DEFAULT_MODEL
-                from openai import OpenAI
+                from llm_model import DEFAULT_MODEL, create_chat_completion
                 from prompt import compose_botcore_prompt
 
-                client = OpenAI(api_key=openai_key)
-                stream = client.chat.completions.create(
+                stream = create_chat_completion(
                     model=DEFAULT_MODEL,
                     messages=[
                         {"role": "system", "content": compose_botcore_prompt()},
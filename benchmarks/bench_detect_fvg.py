@@ -0,0 +1,51 @@
+"""
+Benchmark _detect_fvg against the original linear-scan version.
+
+    python benchmarks/bench_detect_fvg.py [bars ...]    (default: 5000 50000)
+
+Both implementations run on the same random candles and swings; outputs are
+asserted equal before timings are printed.
+"""
+
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "tests"))
+
+import ohlc_analyzer  # noqa: E402
+from ohlc_reference import detect_fvg, random_candles  # noqa: E402
+
+
+def _best_of(fn, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main(sizes) -> None:
+    rng = random.Random(5)
+    print(f"{'bars':>7} {'max_fvgs':>9} {'found':>6} {'original ms':>12} {'indexed ms':>11} {'speedup':>8}")
+    for n in sizes:
+        candles = random_candles(rng, n)
+        frame = ohlc_analyzer.to_candle_frame(candles)
+        highs, lows = ohlc_analyzer._swing_points(frame)
+        for max_fvgs in (5, 10**9):
+            expected = detect_fvg(candles, highs, lows, max_fvgs)
+            got = ohlc_analyzer._detect_fvg(frame, highs, lows, max_fvgs)
+            assert got == expected, f"mismatch at {n} bars, max_fvgs={max_fvgs}"
+            repeat = 3 if n <= 10_000 else 1
+            old = _best_of(lambda: detect_fvg(candles, highs, lows, max_fvgs), repeat)
+            new = _best_of(lambda: ohlc_analyzer._detect_fvg(frame, highs, lows, max_fvgs), repeat)
+            label = "all" if max_fvgs >= 10**9 else str(max_fvgs)
+            print(f"{n:>7} {label:>9} {len(got):>6} {old * 1000:>12.1f} {new * 1000:>11.1f} {old / new:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [5000, 50000])
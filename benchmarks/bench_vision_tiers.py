@@ -0,0 +1,95 @@
+"""
+Compare Vision payload settings: resolution tier x image format x detail level.
+
+    python benchmarks/bench_vision_tiers.py SYMBOL [TIMEFRAME ...] [--ohlc payload.json]
+        [--tiers low,medium,high] [--formats png,png8,webp,jpeg] [--details auto,low,high]
+
+Runs one real Vision request per combination (bypassing the Vision cache) and
+prints bytes sent, token usage and end-to-end latency (fetch/render + encode +
+Vision). Needs OPENAI_API_KEY, plus CHART_IMG_API_KEY unless CHART_SOURCE=local
+with an --ohlc payload (EA format, e.g. tests/fixtures/*.json).
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import chart_analyzer  # noqa: E402
+
+
+def run(
+    symbol: str,
+    timeframes: List[str],
+    tiers: List[str],
+    image_formats: List[str],
+    details: List[str],
+    ohlc_data: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    asset_type: str = "forex",
+) -> List[Dict[str, Any]]:
+    formatted_symbol = chart_analyzer.format_symbol_for_chart(symbol, asset_type)
+    results = []
+    for tier in tiers:
+        for image_format in image_formats:
+            for detail in details:
+                row: Dict[str, Any] = {"tier": tier, "image_format": image_format, "detail": detail}
+                started = time.monotonic()
+                try:
+                    images = chart_analyzer.fetch_chart_images(
+                        formatted_symbol, timeframes, ohlc_data=ohlc_data,
+                        tier=tier, image_format=image_format,
+                    )
+                    row["bytes_sent"] = sum(len(img["base64"]) for img in images)
+                    usage: Dict[str, Any] = {}
+                    text = chart_analyzer._call_vision(
+                        images, chart_analyzer.VISION_MAX_COMPLETION_TOKENS,
+                        detail=detail, usage_out=usage,
+                    )
+                    row.update(usage)
+                    row["chars"] = len(text)
+                except Exception as e:
+                    row["error"] = str(e)
+                row["latency_seconds"] = round(time.monotonic() - started, 2)
+                results.append(row)
+    return results
+
+
+def main(argv: List[str]) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("symbol")
+    parser.add_argument("timeframes", nargs="*", default=["H1", "H4"])
+    parser.add_argument("--ohlc", help="EA OHLC payload JSON used for local rendering")
+    parser.add_argument("--asset-type", default="forex")
+    parser.add_argument("--tiers", default=",".join(chart_analyzer.CHART_TIERS))
+    parser.add_argument("--formats", default="png,png8,webp,jpeg")
+    parser.add_argument("--details", default="auto,low,high")
+    args = parser.parse_args(argv)
+
+    ohlc_data = None
+    if args.ohlc:
+        with open(args.ohlc) as f:
+            ohlc_data = json.load(f)
+
+    rows = run(
+        args.symbol, args.timeframes,
+        tiers=args.tiers.split(","),
+        image_formats=args.formats.split(","),
+        details=args.details.split(","),
+        ohlc_data=ohlc_data,
+        asset_type=args.asset_type,
+    )
+    print(f"{'tier':>7} {'format':>6} {'detail':>6} {'bytes':>10} {'prompt':>7} "
+          f"{'cached':>7} {'compl':>6} {'secs':>6}  error")
+    for r in rows:
+        print(f"{r['tier']:>7} {r['image_format']:>6} {r['detail']:>6} {r.get('bytes_sent', 0):>10,} "
+              f"{r.get('prompt_tokens', 0):>7} {r.get('cached_tokens', 0):>7} "
+              f"{r.get('completion_tokens', 0):>6} {r['latency_seconds']:>6.2f}  {r.get('error', '')}")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -6,32 +6,52 @@ OHLC analysis, chart analysis, market data, and AI reasoning.
 """
 
 import json
+import os
 import re
+import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta, timezone
 from zoneinfo import ZoneInfo
-from typing import Dict, Any, List, Optional
+from typing import Callable, Dict, Any, List, Optional
 
 from ohlc_analyzer import analyze_ohlc_data
 from chart_analyzer import analyze_charts_with_gpt_vision
-from market_data import get_market_data
+from market_data import (
+    get_market_data,
+    market_data_for_prompt,
+    risk_asset_quotes,
+    sources_expire_at,
+    synthesis_reused,
+)
 from prompt import compose_sod_prompt, compose_intraday_prompt
 from llm_model import call_gpt_mini
 from database import (
-    get_analysis_record,
     get_market_data_cache,
     save_market_data_cache,
     save_sod_analysis,
     save_intraday_analysis,
     save_test_run,
-    get_current_positions,
-    get_strategy,
-    get_account_context_for_analysis,
+    load_run_context,
+    advisory_lock,
+    MARKET_DATA_REFRESH_LOCK_KEY,
 )
 
-# Market data is cached in the DB as 'market_data_note'.
-# Intraday runs re-use it if fresher than this threshold.
-MARKET_DATA_CACHE_HOURS = 4
+# Market data is cached in the DB as 'market_data_note'. Intraday runs re-use it
+# until its earliest per-source TTL passes (market_data.sources_expire_at); snapshots
+# saved without per-source bookkeeping fall back to this age threshold.
+MARKET_DATA_CACHE_HOURS = float(os.getenv("MARKET_DATA_CACHE_HOURS", "4"))
+
+# A stale cache is refreshed by one caller across all gunicorn workers (Postgres
+# advisory lock). Others wait this long for it, then fall back to the previous
+# snapshot flagged "_stale".
+MARKET_DATA_REFRESH_WAIT_SECONDS = float(os.getenv("MARKET_DATA_REFRESH_WAIT_SECONDS", "90"))
+
+# Intraday serves a snapshot with an expired source immediately and refreshes it
+# in the background; only beyond this age does the run block on a fetch.
+MARKET_DATA_HARD_STALE_HOURS = float(os.getenv("MARKET_DATA_HARD_STALE_HOURS", "12"))
+
+# One background refresh per worker at a time (the advisory lock covers other workers).
+_market_refresh_running = threading.Lock()
 
 _LONDON_TZ = ZoneInfo("Europe/London")
 
@@ -44,14 +64,16 @@ def _london_time_str() -> str:
     return now_london.strftime(f"%Y-%m-%d %H:%M {abbr} (UTC{offset_h:+d})")
 
 
-def _require_strategy_prompt(strategy_name: Optional[str]) -> str:
-    """Load strategy prompt from DB; required for every SOD/intraday run."""
+def _require_strategy_prompt(
+    strategy_name: Optional[str],
+    record: Optional[Dict[str, Any]],
+) -> str:
+    """Strategy prompt from the run context's strategy row; required for every SOD/intraday run."""
     name = (strategy_name or "").strip()
     if not name:
         raise ValueError(
             "Missing required strategy. All analysis runs must be linked to a named strategy."
         )
-    record = get_strategy(name)
     if not record or not (record.get("strategy_prompt") or "").strip():
         raise ValueError(
             f"Strategy '{name}' not found in database. "
@@ -75,14 +97,17 @@ def _strategy_mandate_lines(strategy_name: str) -> List[str]:
 
 def _london_morning_brief_note_valid_for_sod(cached: Optional[Dict[str, Any]]) -> bool:
     """
-    True if market_data_note was written today in Europe/London at or after 05:00 local.
+    True if the market_data_note synthesis was produced today in Europe/London at or
+    after 05:00 local.
 
     The scheduled morning brief (before SOD) populates this row; same-day SOD then reuses
-    it instead of re-fetching RapidAPI / Perplexity / synthesis.
+    it instead of re-fetching RapidAPI / Perplexity / synthesis. Judged by
+    "_synthesized_at", not the row time: quote-only refreshes bump the row but keep an
+    older synthesis. Rows saved before per-source bookkeeping fall back to _fetched_at.
     """
     if not cached:
         return False
-    created_at_str = cached.get("_db_created_at")
+    created_at_str = cached.get("_synthesized_at") or cached.get("_fetched_at")
     if not created_at_str:
         return False
     try:
@@ -156,7 +181,8 @@ def _user_run_instructions(
     fill_event: Optional[str] = None,
 ) -> List[str]:
     """
-    Opening block for user_prompt: task instructions first, then context is appended after.
+    Task block for user_prompt: follows the stable strategy + market intelligence
+    prefix; per-run context is appended after it.
     run: "sod" | "intraday"
     """
     if run == "sod":
@@ -181,8 +207,8 @@ def _user_run_instructions(
         )
 
     return [
-        "=== YOUR TASK (READ FIRST) ===",
-        "You must now run your analysis using all context information provided below.",
+        "=== YOUR TASK ===",
+        "You must now run your analysis using the market intelligence above and all context information provided below.",
         "Your analysis will be based on your strategy provided, and you will be outputting your analysis, your next review time, your monitoring timeframes at next review time, and the execution details for any trades you will be placing or managing. As your output will dictate what is traded.",
         "You must output valid JSON per your system prompt, only with exactly four top-level fields:",
         f'1. "{analysis_key}" — {analysis_line}',
@@ -519,7 +545,7 @@ def _record_test_run(
     flat_output: Dict[str, Any],
     raw_gpt_response: str,
 ) -> None:
-    """Save full AI inputs + flat output to test_inputs (non-fatal on failure)."""
+    """Queue full AI inputs + flat output for test_inputs (write-behind, non-fatal on failure)."""
     try:
         save_test_run(
             magic_number=magic_number,
@@ -585,11 +611,26 @@ def _context_section_header() -> List[str]:
     ]
 
 
+def _market_data_as_of_line(market_context: Optional[Dict[str, Any]]) -> str:
+    """Freshness of the market intelligence block, kept out of that (cached) block."""
+    market_context = market_context or {}
+    as_of = (
+        market_context.get("_synthesized_at")
+        or market_context.get("_fetched_at")
+        or market_context.get("_db_created_at")
+    )
+    if not as_of:
+        return "MARKET DATA AS OF: unavailable"
+    suffix = " (stale — refresh in progress)" if market_context.get("_stale") else ""
+    return f"MARKET DATA AS OF: {as_of}{suffix}"
+
+
 def _append_run_metadata_sod(
     parts: List[str],
     magic_number: int,
     symbol: str,
     strategy_name: str,
+    market_context: Optional[Dict[str, Any]] = None,
 ) -> None:
     parts.extend([
         "=== RUN INFO ===",
@@ -600,6 +641,7 @@ def _append_run_metadata_sod(
         f"STRATEGY: {strategy_name}",
         f"ANALYSIS DATE: {datetime.now(timezone.utc).isoformat()}",
         f"CURRENT TIME (London): {_london_time_str()}",
+        _market_data_as_of_line(market_context),
         "NOTE: All OHLC timestamps and chart images are London local time.",
         "      next_review_time must be London local (format: YYYY-MM-DDTHH:MM:SS, no Z).",
         "",
@@ -614,6 +656,7 @@ def _append_run_metadata_intraday(
     magic_number: int,
     symbol: str,
     strategy_name: str,
+    market_context: Optional[Dict[str, Any]] = None,
 ) -> None:
     parts.extend([
         "=== RUN INFO ===",
@@ -624,6 +667,7 @@ def _append_run_metadata_intraday(
         f"STRATEGY: {strategy_name}",
         f"ANALYSIS TIME: {datetime.now(timezone.utc).isoformat()}",
         f"CURRENT TIME (London): {_london_time_str()}",
+        _market_data_as_of_line(market_context),
         "NOTE: All OHLC timestamps and chart images are London local time.",
         "      next_review_time must be London local (format: YYYY-MM-DDTHH:MM:SS, no Z).",
         "",
@@ -642,7 +686,7 @@ def _append_market_context(parts: List[str], market_context: Dict[str, Any]) ->
         "Use for predictive bias and timing — not to recap past news. "
         "Weight forward_bias_24_48h, upcoming_catalysts, event_scenarios, and what_to_watch.",
         "",
-        json.dumps(market_context, indent=2),
+        json.dumps(market_data_for_prompt(market_context), indent=2),
         "",
     ])
 
@@ -763,6 +807,23 @@ def _append_chart_context(parts: List[str], chart_observations: Any) -> None:
     ])
 
 
+def _append_risk_quotes_context(parts: List[str], market_context: Optional[Dict[str, Any]]) -> None:
+    """
+    Latest risk-asset quotes from the snapshot's raw sources. They refresh on their own
+    short TTL without re-running synthesis, so they go here (per-run) rather than in
+    the cached market intelligence block.
+    """
+    quotes, fetched_at = risk_asset_quotes(market_context)
+    if not quotes:
+        return
+    parts.append(f"=== RISK ASSET QUOTES (as of {fetched_at}) ===")
+    for asset, quote in quotes.items():
+        change = quote.get("change_pct")
+        change_str = f" ({change:+.2f}%)" if isinstance(change, (int, float)) else ""
+        parts.append(f"  {asset}: {quote.get('price')}{change_str}")
+    parts.append("")
+
+
 def _append_account_context(context_parts: list, account_ctx: Dict[str, Any]) -> None:
     """Append latest account snapshot (one line, from DB)."""
     context_parts.extend([
@@ -771,39 +832,154 @@ def _append_account_context(context_parts: list, account_ctx: Dict[str, Any]) ->
     ])
 
 
+def _market_data_age_hours(cached: Optional[Dict[str, Any]]) -> Optional[float]:
+    """Age of a cached market_data_note in hours, or None if it has no readable timestamp."""
+    created_at_str = (cached or {}).get('_db_created_at')
+    if not created_at_str:
+        return None
+    try:
+        created_at = datetime.fromisoformat(created_at_str)
+        if created_at.tzinfo is None:
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        return (datetime.now(timezone.utc) - created_at).total_seconds() / 3600
+    except Exception:
+        return None
+
+
+def _market_data_fresh_for_intraday(cached: Optional[Dict[str, Any]], log: bool = True) -> bool:
+    """
+    True until the earliest per-source TTL of the market_data_note row passes, so an
+    expired risk-asset quote alone triggers a (prices-only) refresh. Rows without
+    per-source bookkeeping are fresh while younger than MARKET_DATA_CACHE_HOURS.
+    """
+    if not cached:
+        if log:
+            print("[market] No market data cache in DB — fetching fresh...")
+        return False
+    age_hours = _market_data_age_hours(cached)
+    if age_hours is None:
+        if log:
+            print("[market] Cache timestamp missing or unreadable — refreshing...")
+        return False
+    expires_at = sources_expire_at(cached)
+    if expires_at is not None:
+        remaining = (expires_at - datetime.now(timezone.utc)).total_seconds()
+        if remaining > 0:
+            if log:
+                print(f"[market] Using cached market data ({age_hours:.1f}h old, "
+                      f"next source expires in {remaining / 60:.0f}m)")
+            return True
+        if log:
+            print(f"[market] A market data source expired ({age_hours:.1f}h old snapshot) — refreshing...")
+        return False
+    if age_hours < MARKET_DATA_CACHE_HOURS:
+        if log:
+            print(f"[market] Using cached market data ({age_hours:.1f}h old)")
+        return True
+    if log:
+        print(f"[market] Cache is {age_hours:.1f}h old — refreshing...")
+    return False
+
+
+def _refresh_market_data_single_flight(
+    symbol: str,
+    is_fresh: Callable[[Optional[Dict[str, Any]]], bool],
+    wait_seconds: Optional[float] = None,
+    resynthesize: bool = False,
+) -> Dict[str, Any]:
+    """
+    Refresh market data with at most one external fetch across all workers.
+
+    Whoever takes the advisory lock re-reads the cache (a concurrent caller may
+    have just refreshed it) and only fetches if it is still not fresh. Callers
+    that queue behind it therefore pick up its snapshot. If the lock is not
+    released within MARKET_DATA_REFRESH_WAIT_SECONDS the previous snapshot is
+    returned with "_stale": True, or, if there is none yet, the caller fetches
+    directly. Without a database the fetch runs uncoordinated.
+
+    A refresh that kept the previous synthesis (only quotes changed) overwrites the
+    latest row instead of adding one; resynthesize forces a new synthesis.
+    """
+    if wait_seconds is None:
+        wait_seconds = MARKET_DATA_REFRESH_WAIT_SECONDS
+    with advisory_lock(MARKET_DATA_REFRESH_LOCK_KEY, wait_seconds) as acquired:
+        if acquired is False:
+            cached = get_market_data_cache()
+            if cached:
+                print(f"[market] Refresh still running elsewhere after "
+                      f"{wait_seconds:g}s — using previous snapshot (stale)")
+                cached["_stale"] = True
+                return cached
+            # Nothing to fall back on: fetch without the lock rather than serve an empty snapshot.
+            print(f"[market] Refresh still running elsewhere after {wait_seconds:g}s and no "
+                  f"previous snapshot — fetching directly")
+
+        cached = None
+        if acquired:
+            # Bypass the worker memo: the holder before us may have saved moments ago.
+            cached = get_market_data_cache(use_memo=False)
+            if is_fresh(cached):
+                print("[market] Market data refreshed by a concurrent request — reusing it")
+                return cached
+
+        # Partial refresh: sources still within their TTL are carried over from cached.
+        data = get_market_data(symbol, previous=cached, resynthesize=resynthesize)
+        save_market_data_cache(data, replace_latest=synthesis_reused(data))
+        print("[market] Market data refreshed and saved to DB")
+        return data
+
+
+def _start_background_market_refresh(symbol: str) -> bool:
+    """Refresh market data on a daemon thread unless this worker is already doing so."""
+    if not _market_refresh_running.acquire(blocking=False):
+        return False
+
+    def _run():
+        try:
+            # wait_seconds=0: if another worker holds the lock it is already refreshing.
+            _refresh_market_data_single_flight(
+                symbol, lambda c: _market_data_fresh_for_intraday(c, log=False), wait_seconds=0
+            )
+        except Exception as e:
+            print(f"[market] Background refresh error: {e}")
+        finally:
+            _market_refresh_running.release()
+
+    threading.Thread(target=_run, name="market-data-refresh", daemon=True).start()
+    return True
+
+
 def _get_market_data_cached(symbol: str) -> Dict[str, Any]:
     """
-    Load market data from DB cache (market_data_note) if fresh.
-    Re-fetches from APIs only if the cache is missing or older than MARKET_DATA_CACHE_HOURS.
+    Load market data from DB cache (market_data_note), stale-while-revalidate.
+
+    Fresh (no per-source TTL passed, see _market_data_fresh_for_intraday): returned as-is.
+    Stale but < MARKET_DATA_HARD_STALE_HOURS: returned immediately with "_stale": True
+    while a background refresh re-fetches only the expired sources. Missing or hard-stale: blocks on a single-flight
+    refresh across workers (see _refresh_market_data_single_flight).
     Used by intraday_action inside the parallel executor.
 
     Stored under symbol="GLOBAL" — market intelligence is not symbol-specific
     (VIX, DXY, Fed policy, news apply to all pairs equally).
     """
     cached = get_market_data_cache()
-    if cached:
-        created_at_str = cached.get('_db_created_at')
-        if created_at_str:
-            try:
-                created_at = datetime.fromisoformat(created_at_str)
-                if created_at.tzinfo is None:
-                    created_at = created_at.replace(tzinfo=timezone.utc)
-                age_hours = (datetime.now(timezone.utc) - created_at).total_seconds() / 3600
-                if age_hours < MARKET_DATA_CACHE_HOURS:
-                    print(f"[market] Using cached market data ({age_hours:.1f}h old)")
-                    return cached
-                print(f"[market] Cache is {age_hours:.1f}h old — refreshing...")
-            except Exception:
-                print("[market] Cache timestamp unreadable — refreshing...")
-        else:
-            print("[market] Cache has no timestamp — refreshing...")
-    else:
-        print("[market] No market data cache in DB — fetching fresh...")
-
-    data = get_market_data(symbol)
-    save_market_data_cache(data)
-    print("[market] Market data refreshed and saved to DB")
-    return data
+    if _market_data_fresh_for_intraday(cached):
+        return cached
+
+    age_hours = _market_data_age_hours(cached)
+    if age_hours is not None and age_hours < MARKET_DATA_HARD_STALE_HOURS:
+        started = _start_background_market_refresh(symbol)
+        print(f"[market] Serving {age_hours:.1f}h-old market data; background refresh "
+              f"{'started' if started else 'already running'}")
+        stale = dict(cached)
+        stale["_stale"] = True
+        return stale
+
+    if age_hours is not None:
+        print(f"[market] Cache exceeds hard limit ({MARKET_DATA_HARD_STALE_HOURS:g}h) — blocking on refresh")
+    return _refresh_market_data_single_flight(
+        symbol, lambda c: _market_data_fresh_for_intraday(c, log=False)
+    )
 
 
 def sod_action(
@@ -811,12 +987,13 @@ def sod_action(
     ohlc_data: Dict[str, List[Dict[str, Any]]],
     magic_number: int,
     strategy_name: str,
+    run_context: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     """
     Start of Day (SOD) action - comprehensive daily market analysis.
 
     Workflow:
-      0. Load DB positions + account + previous run note + strategy (required)
+      0. Load DB positions + account + previous run note + strategy (required) — one query
       1. OHLC analysis
       2. Market data  — reuses today's London morning brief (≥05:00) in DB if present;
                         otherwise fetches and saves (market_data_note)
@@ -829,6 +1006,7 @@ def sod_action(
         ohlc_data:     {timeframe_key: [candle dicts], ...}
         magic_number:  MT5 EA magic number (unique per bot instance)
         strategy_name: Name of the strategy to load from DB (required)
+        run_context:   Optional load_run_context() result already read by the API layer
 
     Returns:
         Comprehensive SOD analysis as JSON dictionary
@@ -837,8 +1015,11 @@ def sod_action(
     print(f"SOD Analysis starting: {symbol} (magic {magic_number})")
     print("=" * 60)
 
+    if run_context is None:
+        run_context = load_run_context(magic_number, symbol, (strategy_name or "").strip())
+
     try:
-        strategy_prompt_text = _require_strategy_prompt(strategy_name)
+        strategy_prompt_text = _require_strategy_prompt(strategy_name, run_context.get("strategy"))
     except ValueError as e:
         print(f"[brain] {e}")
         return {
@@ -851,11 +1032,11 @@ def sod_action(
     print(f"[brain] Strategy loaded: '{scoped_strategy}'")
 
     # ------------------------------------------------------------------
-    # Step 0: DB reads (fast, sequential — no API calls)
+    # Step 0: DB context (single round trip via load_run_context)
     # ------------------------------------------------------------------
     print("\n[brain] Loading DB context...")
-    db_positions = get_current_positions(symbol, magic_number)
-    analysis_record = get_analysis_record(magic_number, symbol, scoped_strategy)
+    db_positions = run_context.get("positions") or []
+    analysis_record = run_context.get("analysis_record")
     previous_intraday = (
         analysis_note_text(
             analysis_record.get("intraday_analysis") if analysis_record else None,
@@ -880,16 +1061,17 @@ def sod_action(
         if cached and _london_morning_brief_note_valid_for_sod(cached):
             print("[market] Using morning brief market data cache for SOD (no refetch)")
             return cached
-        data = get_market_data(symbol)
-        save_market_data_cache(data)
-        print("[market] Market data fetched and saved to DB")
-        return data
+        return _refresh_market_data_single_flight(
+            symbol, _london_morning_brief_note_valid_for_sod, resynthesize=True
+        )
 
     def _run_ohlc():
-        return analyze_ohlc_data(ohlc_data)
+        return analyze_ohlc_data(ohlc_data, state_key=(magic_number, symbol))
 
     def _run_charts():
-        return analyze_charts_with_gpt_vision(symbol=symbol, timeframes=timeframes)
+        return analyze_charts_with_gpt_vision(
+            symbol=symbol, timeframes=timeframes, ohlc_data=ohlc_data
+        )
 
     print("\n[brain] Step 1: Collecting data in parallel (OHLC + Charts + Market)...")
 
@@ -931,18 +1113,21 @@ def sod_action(
     # ------------------------------------------------------------------
     print("\n[brain] Step 2: Assembling decision context...")
 
-    account_ctx = get_account_context_for_analysis(magic_number)
+    account_ctx = run_context.get("account") or {}
     context_parts: List[str] = []
-    context_parts.extend(_user_run_instructions("sod", "sod_analysis"))
+    # Stable blocks first (strategy, then market intel that changes a few times a day)
+    # so consecutive runs share a long prompt prefix for provider-side caching.
     context_parts.extend(_strategy_mandate_lines(scoped_strategy))
-    context_parts.extend(_context_section_header())
-    _append_run_metadata_sod(context_parts, magic_number, symbol, scoped_strategy)
     _append_market_context(context_parts, market_context)
+    context_parts.extend(_user_run_instructions("sod", "sod_analysis"))
+    context_parts.extend(_context_section_header())
+    _append_run_metadata_sod(context_parts, magic_number, symbol, scoped_strategy, market_context)
     _append_analysis_and_positions_sod(
         context_parts, previous_intraday, db_positions
     )
     _append_ohlc_context(context_parts, processed_ohlc)
     _append_chart_context(context_parts, chart_observations)
+    _append_risk_quotes_context(context_parts, market_context)
     _append_account_context(context_parts, account_ctx)
 
     full_context = "\n".join(context_parts)
@@ -953,12 +1138,15 @@ def sod_action(
     print("\n[brain] Step 3: Sending to gpt-5.4-mini for SOD trading decision...")
     try:
         sod_prompt    = compose_sod_prompt(strategy_prompt_text)
+        llm_usage: Dict[str, Any] = {}
         response_text = call_gpt_mini(
             system_prompt=sod_prompt,
             user_prompt=full_context,
             temperature=0.2,
+            usage_out=llm_usage,
         )
-        print(f"[brain] gpt-5.4-mini response received ({len(response_text)} chars)")
+        print(f"[brain] gpt-5.4-mini response received ({len(response_text)} chars, "
+              f"{llm_usage.get('cached_tokens', 0)}/{llm_usage.get('prompt_tokens', 0)} prompt tokens cached)")
 
         parsed = _parse_gpt_response(response_text)
         result = _normalize_trading_response(parsed, "sod_analysis", symbol)
@@ -984,6 +1172,7 @@ def sod_action(
             "chart_timeframes_analyzed": timeframes,
             "previous_intraday_context_used": previous_intraday is not None,
             "strategy_used": scoped_strategy,
+            "llm_usage": llm_usage,
         }
 
         print("\n" + "=" * 60)
@@ -996,7 +1185,7 @@ def sod_action(
             run_type="sod",
             symbol=symbol,
             strategy_name=scoped_strategy,
-            macro=market_context,
+            macro=market_data_for_prompt(market_context),
             ohlc=processed_ohlc,
             chart=chart_observations,
             system_prompt=sod_prompt,
@@ -1020,15 +1209,17 @@ def intraday_action(
     magic_number: int,
     strategy_name: str,
     fill_event: Optional[str] = None,
+    run_context: Optional[Dict[str, Any]] = None,
 ) -> Dict[str, Any]:
     """
     Intraday action - active trading analysis during the day.
 
     Workflow:
-      0. Load DB positions + SOD note + last run note + strategy (required)
+      0. Load DB positions + SOD note + last run note + strategy (required) — one query
       1. OHLC analysis
       2. Market data  — loaded from DB cache (market_data_note saved by SOD).
-                        Re-fetched only if cache is missing or older than MARKET_DATA_CACHE_HOURS.
+                        Once a source TTL passes: served stale, expired sources refreshed in background;
+                        blocks only if missing or older than MARKET_DATA_HARD_STALE_HOURS.
       3. Chart visual analysis — GPT Vision sees only the chart images, no context
       4. Trading decision  — GPT-4o-mini receives full context including chart observations
       5. Persist intraday_analysis to analysis_notes (overwrites prior intraday text)
@@ -1039,6 +1230,7 @@ def intraday_action(
         magic_number:  MT5 EA magic number (unique per bot instance)
         fill_event:    Optional broker event that triggered this run (ENTRY_FILL, EXIT, SL, TP, PARTIAL)
         strategy_name: Name of the strategy to load from DB (required)
+        run_context:   Optional load_run_context() result already read by the API layer
 
     Returns:
         Intraday trading decision as JSON dictionary
@@ -1047,8 +1239,11 @@ def intraday_action(
     print(f"Intraday Analysis starting: {symbol} (magic {magic_number})")
     print("=" * 60)
 
+    if run_context is None:
+        run_context = load_run_context(magic_number, symbol, (strategy_name or "").strip())
+
     try:
-        strategy_prompt_text = _require_strategy_prompt(strategy_name)
+        strategy_prompt_text = _require_strategy_prompt(strategy_name, run_context.get("strategy"))
     except ValueError as e:
         print(f"[brain] {e}")
         return {
@@ -1061,11 +1256,11 @@ def intraday_action(
     print(f"[brain] Strategy loaded: '{scoped_strategy}'")
 
     # ------------------------------------------------------------------
-    # Step 0: DB reads (fast, sequential — no API calls)
+    # Step 0: DB context (single round trip via load_run_context)
     # ------------------------------------------------------------------
     print("\n[brain] Loading DB context...")
-    db_positions = get_current_positions(symbol, magic_number)
-    analysis_record = get_analysis_record(magic_number, symbol, scoped_strategy)
+    db_positions = run_context.get("positions") or []
+    analysis_record = run_context.get("analysis_record")
     sod_text = analysis_note_text(
         analysis_record.get("sod_analysis") if analysis_record else None,
         "sod_analysis",
@@ -1087,10 +1282,12 @@ def intraday_action(
     # All three are independent. They converge in Step 2.
     # ------------------------------------------------------------------
     def _run_ohlc():
-        return analyze_ohlc_data(ohlc_data)
+        return analyze_ohlc_data(ohlc_data, state_key=(magic_number, symbol))
 
     def _run_charts():
-        return analyze_charts_with_gpt_vision(symbol=symbol, timeframes=timeframes)
+        return analyze_charts_with_gpt_vision(
+            symbol=symbol, timeframes=timeframes, ohlc_data=ohlc_data
+        )
 
     print("\n[brain] Step 1: Collecting data in parallel (OHLC + Charts + Market)...")
 
@@ -1098,6 +1295,7 @@ def intraday_action(
     chart_observations = ""
     market_context     = {}
     market_from_cache  = False
+    market_age_hours: Optional[float] = None
 
     with ThreadPoolExecutor(max_workers=3) as executor:
         future_ohlc   = executor.submit(_run_ohlc)
@@ -1125,6 +1323,9 @@ def intraday_action(
                 try:
                     market_context = future.result()
                     market_from_cache = "_db_created_at" in market_context
+                    market_age_hours = _market_data_age_hours(market_context)
+                    if market_age_hours is None and market_context and not market_context.get("_stale"):
+                        market_age_hours = 0.0  # fetched just now
                     print(f"[brain] Market data done ({'from cache' if market_from_cache else 'fresh fetch'})")
                 except Exception as e:
                     print(f"[brain] Market data error: {e}")
@@ -1134,18 +1335,20 @@ def intraday_action(
     # ------------------------------------------------------------------
     print("\n[brain] Step 2: Assembling decision context...")
 
-    account_ctx = get_account_context_for_analysis(magic_number)
+    account_ctx = run_context.get("account") or {}
     context_parts: List[str] = []
-    context_parts.extend(_user_run_instructions("intraday", "intraday_analysis", fill_event=fill_event))
+    # Stable prefix first — see sod_action.
     context_parts.extend(_strategy_mandate_lines(scoped_strategy))
-    context_parts.extend(_context_section_header())
-    _append_run_metadata_intraday(context_parts, magic_number, symbol, scoped_strategy)
     _append_market_context(context_parts, market_context)
+    context_parts.extend(_user_run_instructions("intraday", "intraday_analysis", fill_event=fill_event))
+    context_parts.extend(_context_section_header())
+    _append_run_metadata_intraday(context_parts, magic_number, symbol, scoped_strategy, market_context)
     _append_analysis_and_positions_intraday(
         context_parts, sod_text, last_intraday, db_positions, fill_event=fill_event
     )
     _append_ohlc_context(context_parts, processed_ohlc)
     _append_chart_context(context_parts, chart_observations)
+    _append_risk_quotes_context(context_parts, market_context)
     _append_account_context(context_parts, account_ctx)
 
     full_context = "\n".join(context_parts)
@@ -1156,12 +1359,15 @@ def intraday_action(
     print("\n[brain] Step 3: Sending to gpt-5.4-mini for intraday trading decision...")
     try:
         intraday_prompt = compose_intraday_prompt(strategy_prompt_text)
+        llm_usage: Dict[str, Any] = {}
         response_text = call_gpt_mini(
             system_prompt=intraday_prompt,
             user_prompt=full_context,
             temperature=0.2,
+            usage_out=llm_usage,
         )
-        print(f"[brain] gpt-5.4-mini response received ({len(response_text)} chars)")
+        print(f"[brain] gpt-5.4-mini response received ({len(response_text)} chars, "
+              f"{llm_usage.get('cached_tokens', 0)}/{llm_usage.get('prompt_tokens', 0)} prompt tokens cached)")
 
         parsed = _parse_gpt_response(response_text)
         result = _normalize_trading_response(parsed, "intraday_analysis", symbol, fill_event=fill_event)
@@ -1187,7 +1393,10 @@ def intraday_action(
             "sod_context_used": sod_text is not None,
             "last_intraday_context_used": last_intraday is not None,
             "market_data_from_cache": market_from_cache,
+            "market_data_age_hours": round(market_age_hours, 2) if market_age_hours is not None else None,
+            "market_data_stale": bool(market_context.get("_stale")),
             "strategy_used": scoped_strategy,
+            "llm_usage": llm_usage,
         }
 
         print("\n" + "=" * 60)
@@ -1200,7 +1409,7 @@ def intraday_action(
             run_type="intraday",
             symbol=symbol,
             strategy_name=scoped_strategy,
-            macro=market_context,
+            macro=market_data_for_prompt(market_context),
             ohlc=processed_ohlc,
             chart=chart_observations,
             system_prompt=intraday_prompt,
@@ -10,34 +10,74 @@ Called by brain.py via: analyze_charts_with_gpt_vision(...)
   Returns: {"chart_analysis": "<plain-text vision output>", "_metadata": {...}}
 
 brain.py then uses these observations as part of its full decision context.
+Charts for all timeframes are fetched concurrently over one keep-alive session;
+any that miss the total deadline are dropped rather than delaying Vision.
+Fetched PNGs are cached on disk per bar (shared by all workers), see CHART CACHE.
+With CHART_SOURCE=local, charts are drawn from the EA's own OHLC payload instead
+(Pillow), optionally with ohlc_analyzer swings/FVGs overlaid, see LOCAL CHART RENDERER.
 Test helpers: save_chart_image(...), get_chart_url(...)
 """
 
 import requests
 import base64
+import hashlib
+import io
+import mmap
 import os
-from typing import Optional, Dict, Any, List
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Optional, Dict, Any, List, Tuple
 from dotenv import load_dotenv
-from openai import OpenAI
-from llm_model import DEFAULT_MODEL
+from requests.adapters import HTTPAdapter
+from llm_model import DEFAULT_MODEL, create_chat_completion, response_usage
+from ohlc_analyzer import analyze_ohlc_data
+
+try:
+    from PIL import Image, ImageDraw, ImageFont
+except ImportError:  # Pillow only needed for CHART_SOURCE=local
+    Image = ImageDraw = ImageFont = None
 
 load_dotenv()
 CHART_IMG_API_KEY = os.getenv("CHART_IMG_API_KEY")
 CHART_IMG_BASE_URL = "https://api.chart-img.com/v1/tradingview/advanced-chart"
 
-# Lazy-initialised — avoids crashing the server at import time if the key
-# is not yet set in the environment (e.g. during Railway container startup).
-_openai_client: OpenAI | None = None
+# Per-request timeout, total budget for all timeframes of one analysis, and
+# the max number of simultaneous connections to chart-img.com per worker.
+CHART_FETCH_TIMEOUT_SECONDS = float(os.getenv("CHART_FETCH_TIMEOUT_SECONDS", "15"))
+CHART_FETCH_DEADLINE_SECONDS = float(os.getenv("CHART_FETCH_DEADLINE_SECONDS", "20"))
+CHART_FETCH_CONCURRENCY = max(1, int(os.getenv("CHART_FETCH_CONCURRENCY", "4")))
+
+# Shared keep-alive session; rebuilt after fork (gunicorn workers).
+_http_session: Optional[requests.Session] = None
+_http_session_pid: Optional[int] = None
+_http_session_lock = threading.Lock()
 
 
-def _get_openai_client() -> OpenAI:
-    global _openai_client
-    if _openai_client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
-        if not api_key:
-            raise ValueError("OPENAI_API_KEY environment variable is not set")
-        _openai_client = OpenAI(api_key=api_key)
-    return _openai_client
+def _get_http_session() -> requests.Session:
+    """
+    Process-wide requests.Session for chart-img.com.
+    pool_block=True caps open connections per host at CHART_FETCH_CONCURRENCY.
+    """
+    global _http_session, _http_session_pid
+    pid = os.getpid()
+    if _http_session is not None and _http_session_pid == pid:
+        return _http_session
+    with _http_session_lock:
+        if _http_session is None or _http_session_pid != pid:
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=CHART_FETCH_CONCURRENCY,
+                pool_block=True,
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            _http_session = session
+            _http_session_pid = pid
+    return _http_session
 
 
 # =============================================================================
@@ -91,6 +131,422 @@ TIMEFRAME_MAP = {
 }
 
 
+# =============================================================================
+# CHART CACHE (disk, shared by all gunicorn workers on the host)
+# One PNG per (symbol, timeframe, size, theme, studies, last closed bar). The bar
+# time comes from the EA's OHLC payload, so several EAs on one symbol asking for
+# the same chart before the next close reuse one download, and a close always
+# misses. Recency is the file mtime (touched on hit); the oldest files are evicted
+# once the directory exceeds CHART_CACHE_MAX_BYTES. The directory is only scanned
+# when this worker's running size estimate passes the limit or every
+# CHART_CACHE_EVICT_INTERVAL_SECONDS (other workers write too). Empty
+# CHART_CACHE_DIR disables.
+# =============================================================================
+
+CHART_CACHE_DIR = os.getenv(
+    "CHART_CACHE_DIR", os.path.join(tempfile.gettempdir(), "botcore_chart_cache")
+).strip()
+CHART_CACHE_MAX_BYTES = int(os.getenv("CHART_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+CHART_CACHE_EVICT_INTERVAL_SECONDS = float(os.getenv("CHART_CACHE_EVICT_INTERVAL_SECONDS", "300"))
+
+# Fallback when the payload has no closed bar for the timeframe: wall-clock
+# buckets. H4 and above use hourly buckets: their bar boundaries depend on the
+# feed's session, and an hour always lands on one.
+_CHART_BUCKET_SECONDS = {
+    "M1": 60,
+    "M5": 300,
+    "M15": 900,
+    "M30": 1800,
+    "H1": 3600,
+    "H4": 3600,
+    "D1": 3600,
+    "W1": 3600,
+}
+
+
+def _chart_cache_path(
+    symbol: str,
+    timeframe: str,
+    width: int,
+    height: int,
+    theme: str,
+    studies: str,
+    bar_time: Optional[int] = None,
+    now: Optional[float] = None,
+) -> Optional[str]:
+    if not CHART_CACHE_DIR or CHART_CACHE_MAX_BYTES <= 0:
+        return None
+    if bar_time is not None:
+        bar_key = f"bar:{bar_time}"
+    else:
+        bucket_len = _CHART_BUCKET_SECONDS.get(timeframe, 3600)
+        bar_key = f"bucket:{int((time.time() if now is None else now) // bucket_len) * bucket_len}"
+    raw = f"{symbol}|{timeframe}|{width}|{height}|{theme}|{studies}|{bar_key}"
+    digest = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    return os.path.join(CHART_CACHE_DIR, f"{digest}.png")
+
+
+def _last_closed_bar_time(
+    ohlc_data: Optional[Dict[str, List[Dict[str, Any]]]], timeframe: str
+) -> Optional[int]:
+    """Open time of the newest closed candle (index 1: the EA sends the forming bar first)."""
+    key = _ohlc_key_for_timeframe(ohlc_data, timeframe)
+    candles = ohlc_data[key] if key else None
+    if not candles or len(candles) < 2:
+        return None
+    try:
+        return int(candles[1]["time"])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+# Per-worker LRU of already-encoded cache files, keyed by (path, inode, size): files
+# are replaced atomically (new inode), and mtime is touched on every hit.
+CHART_CACHE_MEMO_ENTRIES = int(os.getenv("CHART_CACHE_MEMO_ENTRIES", "64"))
+_chart_memo: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+_chart_memo_lock = threading.Lock()
+
+
+def _chart_cache_read(path: str) -> Optional[str]:
+    """
+    Base64 of a cached PNG. The first read in a worker encodes from an mmap of the
+    file (no read() copy); later hits return the memoised string without re-encoding.
+    """
+    try:
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            if st.st_size == 0:
+                return None
+            key = (path, st.st_ino, st.st_size)
+            with _chart_memo_lock:
+                image_base64 = _chart_memo.get(key)
+                if image_base64 is not None:
+                    _chart_memo.move_to_end(key)
+            if image_base64 is None:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    image_base64 = base64.b64encode(mm).decode("ascii")
+                if CHART_CACHE_MEMO_ENTRIES > 0:
+                    with _chart_memo_lock:
+                        _chart_memo[key] = image_base64
+                        while len(_chart_memo) > CHART_CACHE_MEMO_ENTRIES:
+                            _chart_memo.popitem(last=False)
+        os.utime(path)
+        return image_base64
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[chart] cache read error: {e}")
+        return None
+
+
+def _atomic_write(path: str, data: bytes) -> None:
+    """Write via temp file + rename so readers in other workers never see a partial file."""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+# Per-worker estimate of the directory size (None until the first scan).
+_chart_cache_size_lock = threading.Lock()
+_chart_cache_size: Dict[str, Any] = {"bytes": None, "scanned_at": 0.0}
+
+
+def _chart_cache_write(path: str, image_bytes: bytes) -> None:
+    """Atomic write, then trim the directory to size if the estimate says so."""
+    try:
+        _atomic_write(path, image_bytes)
+        with _chart_cache_size_lock:
+            estimate = _chart_cache_size["bytes"]
+            if estimate is not None:
+                estimate += len(image_bytes)
+                _chart_cache_size["bytes"] = estimate
+            due = (
+                estimate is None
+                or estimate > CHART_CACHE_MAX_BYTES
+                or time.monotonic() - _chart_cache_size["scanned_at"] >= CHART_CACHE_EVICT_INTERVAL_SECONDS
+            )
+            if due:
+                # Claim the scan so concurrent writers do not repeat it.
+                _chart_cache_size["scanned_at"] = time.monotonic()
+        if due:
+            total = _chart_cache_evict()
+            with _chart_cache_size_lock:
+                _chart_cache_size["bytes"] = total
+    except Exception as e:
+        print(f"[chart] cache write error: {e}")
+
+
+def _chart_cache_evict() -> int:
+    """Delete the least recently used PNGs until under the limit; returns the remaining size."""
+    entries = []
+    total = 0
+    with os.scandir(CHART_CACHE_DIR) as it:
+        for entry in it:
+            if not entry.name.endswith(".png"):
+                continue
+            try:
+                st = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total += st.st_size
+    if total <= CHART_CACHE_MAX_BYTES:
+        return total
+    entries.sort()
+    for _, size, path in entries:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        if total <= CHART_CACHE_MAX_BYTES:
+            break
+    return total
+
+
+# =============================================================================
+# LOCAL CHART RENDERER (CHART_SOURCE=local)
+# Draws candlestick PNGs from the EA's OHLC payload with Pillow, so no
+# chart-img.com round trip is needed. Timeframes without candles in the
+# payload still fall back to chart-img.com.
+# =============================================================================
+
+CHART_SOURCE = os.getenv("CHART_SOURCE", "chart_img").strip().lower()
+CHART_LOCAL_OVERLAYS = os.getenv("CHART_LOCAL_OVERLAYS", "1").strip().lower() in ("1", "true", "yes")
+
+_CHART_THEMES = {
+    "dark": {
+        "background": (19, 23, 34), "grid": (42, 46, 57), "text": (178, 181, 190),
+        "up": (38, 166, 154), "down": (239, 83, 80),
+        "swing_high": (255, 152, 0), "swing_low": (33, 150, 243),
+    },
+    "light": {
+        "background": (255, 255, 255), "grid": (230, 232, 236), "text": (60, 64, 72),
+        "up": (8, 153, 129), "down": (242, 54, 69),
+        "swing_high": (230, 120, 0), "swing_low": (25, 118, 210),
+    },
+}
+
+# EA OHLC key spellings → chart timeframe code (same aliases brain.py uses).
+_OHLC_KEY_ALIASES = {
+    "1H": "H1", "4H": "H4", "1D": "D1", "1W": "W1",
+    "5M": "M5", "15M": "M15", "30M": "M30",
+}
+
+
+def _ohlc_key_for_timeframe(ohlc_data: Optional[Dict[str, Any]], timeframe: str) -> Optional[str]:
+    for key, candles in (ohlc_data or {}).items():
+        code = str(key).strip().upper().replace("_DATA", "")
+        if _OHLC_KEY_ALIASES.get(code, code) == timeframe.upper() and candles:
+            return key
+    return None
+
+
+def render_chart_png(
+    candles: List[Dict[str, Any]],
+    width: int = 800,
+    height: int = 600,
+    theme: str = "dark",
+    title: str = "",
+    overlays: Optional[Dict[str, Any]] = None,
+) -> bytes:
+    """
+    Draw a candlestick chart and return PNG bytes.
+
+    Args:
+        candles:  EA candle dicts, newest-first (as in ohlc_data)
+        width / height: image size in pixels
+        theme:    "dark" or "light"
+        title:    drawn top-left, e.g. "FX:EURUSD H1"
+        overlays: optional ohlc_analyzer timeframe result; its swing_highs,
+                  swing_lows and fair_value_gaps are drawn over the candles
+
+    Raises:
+        RuntimeError if Pillow is not installed; ValueError if there are no candles.
+    """
+    if Image is None:
+        raise RuntimeError("Pillow is not installed — cannot render charts locally")
+    if not candles:
+        raise ValueError("no candles to render")
+
+    colors = _CHART_THEMES.get(theme, _CHART_THEMES["dark"])
+    margin_left, margin_right, margin_top, margin_bottom = 8, 72, 24, 12
+    plot_w = max(1, width - margin_left - margin_right)
+    plot_h = max(1, height - margin_top - margin_bottom)
+
+    # Newest-first in, oldest-left out; at least 3px per bar.
+    n = min(len(candles), max(1, plot_w // 3))
+    bars = candles[:n][::-1]
+    slot = plot_w / n
+    body_w = max(1, int(slot * 0.7))
+
+    hi = max(c["high"] for c in bars)
+    lo = min(c["low"] for c in bars)
+    pad = (hi - lo) * 0.05 or abs(hi) * 0.001 or 1.0
+    hi, lo = hi + pad, lo - pad
+
+    def y_of(price: float) -> float:
+        return margin_top + (hi - price) / (hi - lo) * plot_h
+
+    def x_of(bar_index: int) -> float:
+        # bar_index is newest-first, as in ohlc_analyzer output
+        return margin_left + (n - 1 - bar_index + 0.5) * slot
+
+    img = Image.new("RGBA", (width, height), colors["background"] + (255,))
+    layer = Image.new("RGBA", (width, height), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(img)
+    shade = ImageDraw.Draw(layer)
+    font = ImageFont.load_default()
+
+    decimals = 5 if abs(hi) < 10 else (3 if abs(hi) < 1000 else 2)
+    for step in range(7):
+        price = lo + (hi - lo) * step / 6
+        y = y_of(price)
+        draw.line([(margin_left, y), (margin_left + plot_w, y)], fill=colors["grid"])
+        draw.text((margin_left + plot_w + 6, y - 6), f"{price:.{decimals}f}", fill=colors["text"], font=font)
+
+    if overlays:
+        for fvg in overlays.get("fair_value_gaps") or []:
+            bi = fvg.get("bar_index", 0) + 1  # middle candle of the 3-bar gap
+            if bi >= n:
+                continue
+            tone = colors["up"] if fvg.get("type") == "BULLISH" else colors["down"]
+            shade.rectangle(
+                [x_of(bi), y_of(fvg["top"]), margin_left + plot_w, y_of(fvg["bottom"])],
+                fill=tone + (60,),
+            )
+
+    for i, c in enumerate(bars):
+        x = margin_left + (i + 0.5) * slot
+        o = c.get("open")
+        if o is None:
+            o = c["close"]
+        color = colors["up"] if c["close"] >= o else colors["down"]
+        draw.line([(x, y_of(c["high"])), (x, y_of(c["low"]))], fill=color)
+        top = y_of(max(o, c["close"]))
+        bottom = y_of(min(o, c["close"]))
+        draw.rectangle([x - body_w / 2, top, x + body_w / 2, max(bottom, top + 1)], fill=color)
+
+    if overlays:
+        for key, color, above in (("swing_highs", colors["swing_high"], True),
+                                  ("swing_lows", colors["swing_low"], False)):
+            for sw in overlays.get(key) or []:
+                bi = sw.get("bar_index", 0)
+                if bi >= n:
+                    continue
+                x, y = x_of(bi), y_of(sw["price"])
+                shade.line([(x, y), (margin_left + plot_w, y)], fill=color + (110,))
+                tip = y - 4 if above else y + 4
+                base = tip - 6 if above else tip + 6
+                draw.polygon([(x, tip), (x - 4, base), (x + 4, base)], fill=color)
+
+    if title:
+        draw.text((margin_left, 6), title, fill=colors["text"], font=font)
+
+    out = io.BytesIO()
+    Image.alpha_composite(img, layer).convert("RGB").save(out, format="PNG")
+    return out.getvalue()
+
+
+def render_chart_image_base64(
+    symbol: str,
+    timeframe: str,
+    candles: List[Dict[str, Any]],
+    width: int = 800,
+    height: int = 600,
+    theme: str = "dark",
+    ohlc_key: Optional[str] = None,
+) -> Optional[str]:
+    """Local-render counterpart of the chart-img fetch; base64 PNG or None on error."""
+    try:
+        overlays = None
+        if CHART_LOCAL_OVERLAYS:
+            key = ohlc_key or f"{timeframe}_DATA"
+            analysis = analyze_ohlc_data({key: candles})
+            overlays = (analysis.get("timeframes") or {}).get(key)
+        png = render_chart_png(
+            candles, width=width, height=height, theme=theme,
+            title=f"{symbol} {timeframe}", overlays=overlays,
+        )
+        print(f"[chart] Rendered {symbol} {timeframe} locally ({len(png):,} bytes)")
+        return base64.b64encode(png).decode("utf-8")
+    except Exception as e:
+        print(f"[chart] Local render failed for {symbol} {timeframe}: {e}")
+        return None
+
+
+# =============================================================================
+# VISION PAYLOAD (resolution tiers, re-encoding, detail)
+# Chart size is picked per timeframe from CHART_TIERS; images can be re-encoded
+# (palette PNG / WebP / JPEG) before the base64 data URL is built, and the
+# Vision "detail" level is configurable. benchmarks/bench_vision_tiers.py compares them.
+# =============================================================================
+
+CHART_TIERS = {
+    "low":    (512, 384),
+    "medium": (800, 600),
+    "high":   (1280, 960),
+}
+CHART_TIER = os.getenv("CHART_TIER", "medium").strip().lower()
+# e.g. "M5=low,H1=medium,D1=high"
+CHART_TIER_BY_TF = {
+    tf.strip().upper(): tier.strip().lower()
+    for tf, _, tier in (
+        item.partition("=") for item in os.getenv("CHART_TIER_BY_TF", "").split(",") if "=" in item
+    )
+}
+CHART_IMAGE_FORMAT = os.getenv("CHART_IMAGE_FORMAT", "png").strip().lower()  # png | png8 | webp | jpeg
+CHART_IMAGE_QUALITY = int(os.getenv("CHART_IMAGE_QUALITY", "80"))
+VISION_DETAIL = os.getenv("VISION_DETAIL", "auto").strip().lower()  # auto | low | high
+
+_IMAGE_MIME = {"png": "image/png", "png8": "image/png", "webp": "image/webp", "jpeg": "image/jpeg"}
+
+
+def chart_size_for_timeframe(timeframe: str, tier: Optional[str] = None) -> Tuple[int, int]:
+    """(width, height) for a timeframe from its tier (CHART_TIER_BY_TF, then CHART_TIER)."""
+    name = tier or CHART_TIER_BY_TF.get(timeframe.upper(), CHART_TIER)
+    return CHART_TIERS.get(name, CHART_TIERS["medium"])
+
+
+def _encode_for_vision(
+    image_base64: str,
+    image_format: Optional[str] = None,
+    quality: Optional[int] = None,
+) -> Tuple[str, str]:
+    """
+    Re-encode a base64 PNG for the Vision payload. Returns (base64, mime).
+    Falls back to the original PNG if Pillow is missing or encoding fails.
+    """
+    fmt = (image_format or CHART_IMAGE_FORMAT).lower()
+    if fmt == "png" or fmt not in _IMAGE_MIME or Image is None:
+        return image_base64, "image/png"
+    q = CHART_IMAGE_QUALITY if quality is None else quality
+    try:
+        with Image.open(io.BytesIO(base64.b64decode(image_base64))) as src:
+            img = src.convert("RGB")
+        out = io.BytesIO()
+        if fmt == "png8":
+            img.quantize(colors=64).save(out, format="PNG", optimize=True)
+        elif fmt == "webp":
+            img.save(out, format="WEBP", quality=q, method=4)
+        else:
+            img.save(out, format="JPEG", quality=q, optimize=True)
+        return base64.b64encode(out.getvalue()).decode("utf-8"), _IMAGE_MIME[fmt]
+    except Exception as e:
+        print(f"[chart] Re-encode to {fmt} failed, sending PNG: {e}")
+        return image_base64, "image/png"
+
+
 # =============================================================================
 # CHART FETCHING
 # =============================================================================
@@ -101,7 +557,8 @@ def get_chart_image_base64(
     width: int = 800,
     height: int = 600,
     theme: str = "dark",
-    studies: str = ""
+    studies: str = "",
+    ohlc_data: Optional[Dict[str, List[Dict[str, Any]]]] = None,
 ) -> Optional[str]:
     """
     Fetch a chart image from chart-img.com and return it as a base64 string.
@@ -117,10 +574,36 @@ def get_chart_image_base64(
         height:    Image height in pixels (default 800)
         theme:     "dark" or "light"
         studies:   Comma-separated indicators e.g. "RSI,MACD" — leave empty for clean chart
+        ohlc_data: EA OHLC payload; with CHART_SOURCE=local the chart is rendered
+                   from its candles for this timeframe instead of fetched. Its last
+                   closed bar also keys the disk chart cache.
 
     Returns:
         Base64-encoded PNG string, or None if the fetch failed.
+        Served from the disk chart cache when the same chart was fetched since the
+        last bar close.
     """
+    if CHART_SOURCE == "local":
+        ohlc_key = _ohlc_key_for_timeframe(ohlc_data, timeframe)
+        if ohlc_key:
+            rendered = render_chart_image_base64(
+                symbol, timeframe, ohlc_data[ohlc_key],
+                width=width, height=height, theme=theme, ohlc_key=ohlc_key,
+            )
+            if rendered:
+                return rendered
+        print(f"[chart] No local render for {symbol} {timeframe} -- falling back to chart-img.com")
+
+    cache_path = _chart_cache_path(
+        symbol, timeframe, width, height, theme, studies,
+        bar_time=_last_closed_bar_time(ohlc_data, timeframe),
+    )
+    if cache_path:
+        cached = _chart_cache_read(cache_path)
+        if cached:
+            print(f"[chart] Cache hit: {symbol} {timeframe}")
+            return cached
+
     if not CHART_IMG_API_KEY:
         print("ERROR: CHART_IMG_API_KEY not set in environment")
         return None
@@ -142,17 +625,19 @@ def get_chart_image_base64(
 
         print(f"[chart] Fetching {symbol} {timeframe} from chart-img.com...")
 
-        response = requests.get(
+        response = _get_http_session().get(
             CHART_IMG_BASE_URL,
             params=params,
             headers=headers,
-            timeout=15
+            timeout=CHART_FETCH_TIMEOUT_SECONDS
         )
 
         if response.status_code == 200:
             image_bytes = response.content
             image_base64 = base64.b64encode(image_bytes).decode("utf-8")
             print(f"[chart] OK: {symbol} {timeframe} ({len(image_bytes):,} bytes)")
+            if cache_path and image_bytes:
+                _chart_cache_write(cache_path, image_bytes)
             return image_base64
         else:
             print(f"[chart] ERROR {response.status_code}: {response.text[:200]}")
@@ -166,6 +651,75 @@ def get_chart_image_base64(
         return None
 
 
+def fetch_chart_images(
+    symbol: str,
+    timeframes: List[str],
+    width: Optional[int] = None,
+    height: Optional[int] = None,
+    theme: str = "dark",
+    deadline_seconds: Optional[float] = None,
+    ohlc_data: Optional[Dict[str, List[Dict[str, Any]]]] = None,
+    tier: Optional[str] = None,
+    image_format: Optional[str] = None,
+) -> List[Dict[str, str]]:
+    """
+    Fetch all timeframes concurrently (at most CHART_FETCH_CONCURRENCY at once).
+
+    Charts not back within deadline_seconds (default CHART_FETCH_DEADLINE_SECONDS)
+    are dropped so a slow chart-img.com response cannot hold up Vision.
+    Size comes from width/height if given, else the timeframe's resolution tier;
+    images are then re-encoded per image_format (default CHART_IMAGE_FORMAT).
+
+    Returns:
+        [{"timeframe": "H1", "base64": "...", "mime": "image/png"}, ...] in the
+        requested timeframe order, failed and late timeframes omitted.
+    """
+    if not timeframes:
+        return []
+    deadline = CHART_FETCH_DEADLINE_SECONDS if deadline_seconds is None else deadline_seconds
+    started = time.monotonic()
+
+    executor = ThreadPoolExecutor(
+        max_workers=min(CHART_FETCH_CONCURRENCY, len(timeframes)),
+        thread_name_prefix="chart-fetch",
+    )
+    try:
+        futures = {
+            tf: executor.submit(
+                get_chart_image_base64,
+                symbol=symbol,
+                timeframe=tf,
+                width=width or chart_size_for_timeframe(tf, tier)[0],
+                height=height or chart_size_for_timeframe(tf, tier)[1],
+                theme=theme,
+                ohlc_data=ohlc_data,
+            )
+            for tf in timeframes
+        }
+        done, _ = wait(futures.values(), timeout=deadline)
+    finally:
+        # Do not wait for stragglers; unstarted fetches are cancelled.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    chart_images = []
+    for tf, future in futures.items():
+        if future not in done:
+            print(f"[chart] Dropping {tf} -- not fetched within {deadline:.0f}s deadline")
+            continue
+        image_base64 = future.result()
+        if image_base64:
+            encoded, mime = _encode_for_vision(image_base64, image_format)
+            chart_images.append({"timeframe": tf, "base64": encoded, "mime": mime})
+        else:
+            print(f"[chart] Skipping {tf} -- fetch failed")
+
+    print(
+        f"[chart] Fetched {len(chart_images)}/{len(timeframes)} charts "
+        f"in {time.monotonic() - started:.1f}s"
+    )
+    return chart_images
+
+
 # =============================================================================
 # HELPER FUNCTIONS (testing / debugging)
 # =============================================================================
@@ -246,6 +800,72 @@ def format_symbol_for_chart(symbol: str, asset_type: str = "forex") -> str:
     return symbol
 
 
+# =============================================================================
+# VISION OBSERVATION CACHE
+# Vision output depends only on the prompt, model and labelled images, so the
+# normalised chart_analysis text is cached on disk under a digest of those.
+# Shared across magic numbers and workers; entries expire after
+# VISION_CACHE_TTL_SECONDS (0 disables).
+# =============================================================================
+
+VISION_MAX_COMPLETION_TOKENS = 2000
+VISION_TEMPERATURE = 0.2
+VISION_CACHE_TTL_SECONDS = int(os.getenv("VISION_CACHE_TTL_SECONDS", "3600"))
+
+# "combined": all charts in one Vision request (default).
+# "per_timeframe": one request per chart in parallel, each with its own token
+# budget; timeframes that fail or are not done within VISION_PER_TF_TIMEOUT_SECONDS
+# (the whole fan-out's deadline, retries included) are dropped instead of failing the run.
+VISION_MODE = os.getenv("VISION_MODE", "combined").strip().lower()
+VISION_PER_TF_MAX_COMPLETION_TOKENS = int(os.getenv("VISION_PER_TF_MAX_COMPLETION_TOKENS", "800"))
+VISION_PER_TF_TIMEOUT_SECONDS = float(os.getenv("VISION_PER_TF_TIMEOUT_SECONDS", "60"))
+
+
+def _vision_cache_path(
+    chart_images: List[Dict[str, str]],
+    model: str,
+    max_completion_tokens: int = VISION_MAX_COMPLETION_TOKENS,
+) -> Optional[str]:
+    if not CHART_CACHE_DIR or VISION_CACHE_TTL_SECONDS <= 0:
+        return None
+    h = hashlib.sha256()
+    h.update(f"{model}|{max_completion_tokens}|{VISION_TEMPERATURE}|{VISION_DETAIL}\n".encode("utf-8"))
+    h.update(CHART_ANALYSIS_PROMPT.encode("utf-8"))
+    for img in chart_images:
+        h.update(f"\n{img['timeframe']}|{img.get('mime', 'image/png')}\n".encode("utf-8"))
+        h.update(img["base64"].encode("ascii"))
+    return os.path.join(CHART_CACHE_DIR, "vision", f"{h.hexdigest()}.txt")
+
+
+def _vision_cache_get(path: str) -> Optional[str]:
+    try:
+        if time.time() - os.path.getmtime(path) > VISION_CACHE_TTL_SECONDS:
+            os.unlink(path)
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read() or None
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"[analysis] vision cache read error: {e}")
+        return None
+
+
+def _vision_cache_put(path: str, chart_text: str) -> None:
+    try:
+        _atomic_write(path, chart_text.encode("utf-8"))
+        cutoff = time.time() - VISION_CACHE_TTL_SECONDS
+        with os.scandir(os.path.dirname(path)) as it:
+            for entry in it:
+                try:
+                    if entry.name.endswith(".txt") and entry.stat().st_mtime < cutoff:
+                        os.unlink(entry.path)
+                except FileNotFoundError:
+                    pass
+    except Exception as e:
+        print(f"[analysis] vision cache write error: {e}")
+
+
 # =============================================================================
 # GPT VISION ANALYSIS  — called by brain.py
 # =============================================================================
@@ -253,7 +873,8 @@ def format_symbol_for_chart(symbol: str, asset_type: str = "forex") -> str:
 def analyze_charts_with_gpt_vision(
     symbol: str,
     timeframes: List[str],
-    asset_type: str = "forex"
+    asset_type: str = "forex",
+    ohlc_data: Optional[Dict[str, List[Dict[str, Any]]]] = None,
 ) -> Dict[str, Any]:
     """
     Fetch charts for every requested timeframe and send them to GPT Vision
@@ -261,6 +882,8 @@ def analyze_charts_with_gpt_vision(
 
     GPT Vision receives only the CHART_ANALYSIS_PROMPT and the chart images.
     This lets it focus entirely on what it sees, producing richer observations.
+    With VISION_MODE=per_timeframe each chart gets its own parallel request and
+    the texts are merged in timeframe order.
 
     brain.py then combines these observations with OHLC data, market data,
     positions, and analysis notes before making the final trading decision.
@@ -269,6 +892,7 @@ def analyze_charts_with_gpt_vision(
         symbol:     Raw symbol e.g. "EURUSD"
         timeframes: List of timeframes e.g. ["H1", "H4", "D1", "W1"]
         asset_type: "forex" | "crypto" | "stock"
+        ohlc_data:  EA OHLC payload, used to render charts when CHART_SOURCE=local
 
     Returns:
         {
@@ -289,20 +913,13 @@ def analyze_charts_with_gpt_vision(
     formatted_symbol = format_symbol_for_chart(symbol, asset_type)
     print(f"\n[analysis] Starting visual chart analysis: {formatted_symbol} {', '.join(timeframes)}")
 
-    # --- fetch all charts ---
-    chart_images = []
-    for tf in timeframes:
-        image_base64 = get_chart_image_base64(
-            symbol=formatted_symbol,
-            timeframe=tf,
-            width=800,
-            height=600,
-            theme="dark"
-        )
-        if image_base64:
-            chart_images.append({"timeframe": tf, "base64": image_base64})
-        else:
-            print(f"[analysis] Skipping {tf} -- fetch failed")
+    # --- fetch all charts (concurrently, bounded by CHART_FETCH_DEADLINE_SECONDS) ---
+    chart_images = fetch_chart_images(
+        symbol=formatted_symbol,
+        timeframes=timeframes,
+        theme="dark",
+        ohlc_data=ohlc_data,
+    )
 
     if not chart_images:
         raise ValueError(
@@ -311,8 +928,54 @@ def analyze_charts_with_gpt_vision(
         )
 
     print(f"[analysis] Fetched {len(chart_images)}/{len(timeframes)} charts")
+
+    metadata = {
+        "symbol": formatted_symbol,
+        "timeframes_analyzed": [img["timeframe"] for img in chart_images],
+        "timeframes_requested": timeframes,
+    }
+
+    if VISION_MODE == "per_timeframe":
+        return _analyze_charts_per_timeframe(chart_images, metadata)
+
+    vision_cache_path = _vision_cache_path(chart_images, DEFAULT_MODEL)
+    if vision_cache_path:
+        cached_text = _vision_cache_get(vision_cache_path)
+        if cached_text:
+            print(f"[analysis] Vision cache hit ({len(cached_text)} chars) -- skipping GPT Vision")
+            return {"chart_analysis": cached_text, "_metadata": {**metadata, "vision_cache": "hit"}}
+
     print("[analysis] Sending to GPT Vision for pure visual analysis...")
 
+    # --- call OpenAI Vision ---
+    try:
+        chart_text = _call_vision(chart_images, VISION_MAX_COMPLETION_TOKENS)
+        print(f"[analysis] GPT Vision response received ({len(chart_text)} chars)")
+
+        if vision_cache_path and chart_text:
+            _vision_cache_put(vision_cache_path, chart_text)
+
+        return {
+            "chart_analysis": chart_text,
+            "_metadata": {**metadata, "vision_cache": "miss"},
+        }
+
+    except Exception as e:
+        print(f"[analysis] GPT Vision call failed: {e}")
+        raise
+
+
+def _call_vision(
+    chart_images: List[Dict[str, str]],
+    max_completion_tokens: int,
+    timeout: Optional[float] = None,
+    detail: Optional[str] = None,
+    usage_out: Optional[Dict[str, Any]] = None,
+) -> str:
+    """
+    One Vision request for the given labelled charts; returns normalised text.
+    usage_out, if given, receives prompt/cached/completion token counts from the response.
+    """
     # --- build Vision API message ---
     # System: chart analysis instructions only — no trading context
     # User: one label + one image per timeframe
@@ -330,37 +993,101 @@ def analyze_charts_with_gpt_vision(
         })
         content.append({
             "type": "image_url",
-            "image_url": {"url": f"data:image/png;base64,{img['base64']}"}
+            "image_url": {
+                "url": f"data:{img.get('mime', 'image/png')};base64,{img['base64']}",
+                "detail": detail or VISION_DETAIL,
+            }
         })
 
     messages = [
         {"role": "user", "content": content}
     ]
 
-    # --- call OpenAI Vision ---
+    response = create_chat_completion(
+        model=DEFAULT_MODEL,
+        messages=messages,
+        max_completion_tokens=max_completion_tokens,
+        temperature=VISION_TEMPERATURE,
+        timeout=timeout,
+    )
+    if usage_out is not None:
+        usage_out.update(response_usage(response))
+    raw = response.choices[0].message.content or ""
+    return _normalize_chart_vision_text(raw)
+
+
+def _analyze_chart_single(img: Dict[str, str]) -> Tuple[str, bool]:
+    """Vision for one timeframe (per_timeframe mode). Returns (text, cache_hit)."""
+    cache_path = _vision_cache_path([img], DEFAULT_MODEL, VISION_PER_TF_MAX_COMPLETION_TOKENS)
+    if cache_path:
+        cached_text = _vision_cache_get(cache_path)
+        if cached_text:
+            return cached_text, True
+    chart_text = _call_vision(
+        [img], VISION_PER_TF_MAX_COMPLETION_TOKENS, timeout=VISION_PER_TF_TIMEOUT_SECONDS
+    )
+    if cache_path and chart_text:
+        _vision_cache_put(cache_path, chart_text)
+    return chart_text, False
+
+
+def _analyze_charts_per_timeframe(
+    chart_images: List[Dict[str, str]],
+    metadata: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Fan out one Vision request per chart in parallel and merge the normalised
+    texts in timeframe order, each prefixed with its label if the model omitted it.
+    Timeframes whose request fails (or times out) are dropped.
+    """
+    print(f"[analysis] Sending {len(chart_images)} charts to GPT Vision (one request per timeframe)...")
+
+    executor = ThreadPoolExecutor(max_workers=len(chart_images), thread_name_prefix="vision-tf")
     try:
-        response = _get_openai_client().chat.completions.create(
-            model=DEFAULT_MODEL,
-            messages=messages,
-            max_completion_tokens=2000,
-            temperature=0.2
-        )
-        raw = response.choices[0].message.content or ""
-        chart_text = _normalize_chart_vision_text(raw)
-        print(f"[analysis] GPT Vision response received ({len(chart_text)} chars)")
+        futures = [(img["timeframe"], executor.submit(_analyze_chart_single, img)) for img in chart_images]
+        done, _ = wait([f for _, f in futures], timeout=VISION_PER_TF_TIMEOUT_SECONDS)
+    finally:
+        # A slow timeframe must not hold up the merge; its late result is discarded.
+        executor.shutdown(wait=False, cancel_futures=True)
 
-        return {
-            "chart_analysis": chart_text,
-            "_metadata": {
-                "symbol": formatted_symbol,
-                "timeframes_analyzed": [img["timeframe"] for img in chart_images],
-                "timeframes_requested": timeframes,
-            }
-        }
+    sections: List[str] = []
+    analyzed: List[str] = []
+    hits = 0
+    for tf, future in futures:
+        if future not in done:
+            print(f"[analysis] GPT Vision timed out for {tf} after {VISION_PER_TF_TIMEOUT_SECONDS:.0f}s, dropping")
+            continue
+        try:
+            chart_text, cache_hit = future.result()
+        except Exception as e:
+            print(f"[analysis] GPT Vision failed for {tf}, dropping: {e}")
+            continue
+        if not chart_text:
+            print(f"[analysis] GPT Vision returned nothing for {tf}, dropping")
+            continue
+        hits += int(cache_hit)
+        analyzed.append(tf)
+        if not chart_text.upper().startswith(f"{tf.upper()}:"):
+            chart_text = f"{tf}:\n{chart_text}"
+        sections.append(chart_text)
 
-    except Exception as e:
-        print(f"[analysis] GPT Vision call failed: {e}")
-        raise
+    if not sections:
+        raise ValueError("GPT Vision failed for every timeframe")
+
+    chart_text = "\n\n".join(sections)
+    print(
+        f"[analysis] GPT Vision per-timeframe responses merged "
+        f"({len(analyzed)}/{len(chart_images)} timeframes, {hits} cached, {len(chart_text)} chars)"
+    )
+    return {
+        "chart_analysis": chart_text,
+        "_metadata": {
+            **metadata,
+            "timeframes_analyzed": analyzed,
+            "vision_mode": "per_timeframe",
+            "vision_cache": "hit" if hits == len(analyzed) else ("miss" if hits == 0 else "partial"),
+        },
+    }
 
 
 def _normalize_chart_vision_text(text: str) -> str:
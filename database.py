@@ -1,34 +1,173 @@
 """
 Database Layer - PostgreSQL Integration
 
-7 tables:
+8 tables:
   analysis_notes    — one row per magic_number (EA instance); full run JSON per sod/intraday
+  analysis_jobs     — async SOD/intraday jobs (submit-and-poll); result holds the flat EA payload
   market_data_cache — global synthesized market intelligence (morning brief)
-  current_positions — live MT5 positions, fully replaced on each EA update
-  trade_events      — append-only audit log of EA execution confirmations
+  current_positions — live MT5 positions, synced (diffed) on each EA update
+  trade_events      — append-only audit log of EA execution confirmations (monthly partitions)
   users             — chat interface user accounts and message history
   strategies        — named strategy prompts, selectable per EA instance
   account_snapshots — latest account metrics per magic_number (upsert)
 
-  test_inputs — one row per AI run (all test fields in a single table)
+  test_inputs — one row per AI run (all test fields in a single table; monthly partitions)
+  test_blobs  — SHA-256 addressed prompt / macro payloads referenced by test_inputs
+  ohlc_analysis_cache — optional cross-worker memo of per-timeframe OHLC analysis
+  market_data_latest  — single-row pointer to the newest market_data_cache snapshot
 """
 
+import atexit
 import psycopg2
+import psycopg2.extensions
+import psycopg2.extras
+import psycopg2.pool
 import os
+import queue
+import random
+import select
 import json
+import hashlib
+import threading
+import time
+from contextlib import ExitStack, contextmanager
 from typing import Dict, List, Any, Optional
-from datetime import datetime, timezone
+from datetime import date, datetime, timedelta, timezone
 from dotenv import load_dotenv
 
 load_dotenv()
 
-
-def get_db_connection():
-    """Get PostgreSQL connection."""
+# Process-wide connection pool (gunicorn -w 4 → up to 4 × DB_POOL_MAX server connections).
+# DB_POOL_MIN is also how many idle connections are kept open (psycopg2 closes extras on return).
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+# Seconds to wait for a free pooled connection before giving up.
+DB_POOL_TIMEOUT_SECONDS = float(os.getenv("DB_POOL_TIMEOUT_SECONDS", "30"))
+# Connections idle longer than this are pinged (SELECT 1) before reuse; stale ones are replaced.
+DB_POOL_HEALTHCHECK_IDLE_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE_SECONDS", "60"))
+
+# TCP keepalives so the server / proxies do not silently drop idle pooled sockets.
+_CONNECT_KWARGS = {
+    "keepalives": 1,
+    "keepalives_idle": 30,
+    "keepalives_interval": 10,
+    "keepalives_count": 3,
+}
+
+_pool: Optional[psycopg2.pool.ThreadedConnectionPool] = None
+_pool_pid: Optional[int] = None
+_pool_slots: Optional[threading.BoundedSemaphore] = None
+_pool_lock = threading.Lock()
+_conn_last_used: Dict[int, float] = {}
+# Pools inherited across fork are kept referenced, never closed: closing would
+# terminate the parent's sessions on the shared sockets.
+_inherited_pools: List[Any] = []
+
+
+def _database_url() -> str:
     database_url = os.getenv('DATABASE_URL')
     if not database_url:
         raise ValueError("DATABASE_URL not set in environment")
-    return psycopg2.connect(database_url)
+    return database_url
+
+
+def get_db_connection():
+    """Open a new, unpooled PostgreSQL connection (caller closes it)."""
+    return psycopg2.connect(_database_url(), **_CONNECT_KWARGS)
+
+
+def _get_pool() -> psycopg2.pool.ThreadedConnectionPool:
+    """Return this process's pool, creating it on first use and after fork."""
+    global _pool, _pool_pid, _pool_slots
+    pid = os.getpid()
+    if _pool is not None and _pool_pid == pid:
+        return _pool
+    with _pool_lock:
+        if _pool is None or _pool_pid != pid:
+            if _pool is not None:
+                _inherited_pools.append(_pool)
+            _conn_last_used.clear()
+            _pool = psycopg2.pool.ThreadedConnectionPool(
+                DB_POOL_MIN, DB_POOL_MAX, _database_url(), **_CONNECT_KWARGS
+            )
+            _pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+            _pool_pid = pid
+    return _pool
+
+
+def _connection_is_healthy(conn) -> bool:
+    """Ping a connection that has been idle past the health-check threshold."""
+    if conn.closed:
+        return False
+    last_used = _conn_last_used.get(id(conn))
+    if last_used is None or time.monotonic() - last_used < DB_POOL_HEALTHCHECK_IDLE_SECONDS:
+        return True
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.close()
+        conn.rollback()
+        return True
+    except Exception:
+        return False
+
+
+@contextmanager
+def db_connection():
+    """
+    Borrow a pooled connection for one unit of work.
+
+    Commits when the block exits normally, rolls back on error, and always
+    returns the connection to the pool (discarding it if it is broken).
+    """
+    pool = _get_pool()
+    slots = _pool_slots
+    if not slots.acquire(timeout=DB_POOL_TIMEOUT_SECONDS):
+        raise psycopg2.pool.PoolError(
+            f"no pooled connection available after {DB_POOL_TIMEOUT_SECONDS:.0f}s"
+        )
+    try:
+        conn = pool.getconn()
+        while not _connection_is_healthy(conn):
+            print("[db] Discarding stale pooled connection")
+            _conn_last_used.pop(id(conn), None)
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+
+        broken = False
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            try:
+                conn.rollback()
+            except Exception:
+                broken = True
+            raise
+        finally:
+            broken = broken or bool(conn.closed)
+            if broken:
+                _conn_last_used.pop(id(conn), None)
+            else:
+                _conn_last_used[id(conn)] = time.monotonic()
+            pool.putconn(conn, close=broken)
+    finally:
+        slots.release()
+
+
+@contextmanager
+def db_cursor():
+    """Cursor on a pooled connection — see db_connection for commit/rollback rules."""
+    with db_connection() as conn:
+        cursor = conn.cursor()
+        try:
+            yield cursor
+        finally:
+            cursor.close()
+
+
+# Advisory lock id serialising _init_schema across workers (any fixed bigint).
+SCHEMA_INIT_LOCK_KEY = 0x5343484D494E4954  # "SCHMINIT"
 
 
 def init_database():
@@ -37,8 +176,16 @@ def init_database():
     Safe to call multiple times (uses CREATE TABLE IF NOT EXISTS).
     Called automatically by the /api/health endpoint on first boot.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with db_cursor() as cursor:
+        _init_schema(cursor)
+    print("[db] Tables initialised OK")
+
+
+def _init_schema(cursor) -> None:
+    """DDL and one-time migrations for init_database (single transaction)."""
+    # Every worker calls this from /api/health; one migrates at a time, the rest
+    # then see the finished schema (held until commit).
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (SCHEMA_INIT_LOCK_KEY,))
 
     # Drop legacy note_type-based analysis_notes (data cleared on migrate).
     cursor.execute("""
@@ -109,6 +256,26 @@ def init_database():
             created_at  TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
         )
     """)
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_market_data_cache_created "
+        "ON market_data_cache(created_at DESC)"
+    )
+    # Single-row pointer to the newest snapshot, kept current by save_market_data_cache.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS market_data_latest (
+            singleton   BOOLEAN      PRIMARY KEY DEFAULT TRUE CHECK (singleton),
+            cache_id    INTEGER      NOT NULL,
+            created_at  TIMESTAMP WITH TIME ZONE NOT NULL
+        )
+    """)
+    cursor.execute("""
+        INSERT INTO market_data_latest (cache_id, created_at)
+        SELECT id, created_at FROM market_data_cache
+        WHERE created_at IS NOT NULL
+        ORDER BY created_at DESC
+        LIMIT 1
+        ON CONFLICT (singleton) DO NOTHING
+    """)
 
     cursor.execute("DROP TABLE IF EXISTS bot_action CASCADE")
 
@@ -175,14 +342,15 @@ def init_database():
         END $$
     """)
 
-    cursor.execute("""
+    _ensure_partitioned_table(cursor, "trade_events", """
         CREATE TABLE IF NOT EXISTS trade_events (
-            id          SERIAL PRIMARY KEY,
+            id          BIGINT       NOT NULL DEFAULT nextval('trade_events_id_seq'),
             symbol      VARCHAR(20)  NOT NULL,
             event_type  VARCHAR(50)  NOT NULL,
             event_data  JSONB,
-            created_at  TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-        )
+            created_at  TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
     """)
 
     cursor.execute("""
@@ -281,9 +449,9 @@ def init_database():
         END $$
     """)
 
-    cursor.execute("""
+    _ensure_partitioned_table(cursor, "test_inputs", """
         CREATE TABLE IF NOT EXISTS test_inputs (
-            id                SERIAL PRIMARY KEY,
+            id                BIGINT       NOT NULL DEFAULT nextval('test_inputs_id_seq'),
             magic_number      BIGINT       NOT NULL,
             symbol            VARCHAR(20)  NOT NULL,
             strategy_name     VARCHAR(100) NOT NULL DEFAULT '',
@@ -294,13 +462,25 @@ def init_database():
             test_intraday     TEXT,
             test_chart        TEXT,
             test_output       JSONB,
-            created_at        TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-        )
+            test_macro_ref    CHAR(64),
+            test_prompt_ref   CHAR(64),
+            created_at        TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (id, created_at)
+        ) PARTITION BY RANGE (created_at)
     """)
     cursor.execute(
         "CREATE INDEX IF NOT EXISTS idx_test_inputs_magic_created "
         "ON test_inputs(magic_number, created_at DESC)"
     )
+    # Content-addressed storage for payloads repeated across runs (system prompt,
+    # market synthesis); test_inputs rows reference them by SHA-256.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS test_blobs (
+            sha256      CHAR(64)     PRIMARY KEY,
+            content     TEXT         NOT NULL,
+            created_at  TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
     cursor.execute(
         "CREATE INDEX IF NOT EXISTS idx_test_inputs_symbol_strategy "
         "ON test_inputs(symbol, strategy_name)"
@@ -317,6 +497,36 @@ def init_database():
     ):
         cursor.execute(f"DROP TABLE IF EXISTS {legacy_test_table} CASCADE")
 
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS analysis_jobs (
+            job_id        UUID         PRIMARY KEY,
+            magic_number  BIGINT       NOT NULL,
+            symbol        VARCHAR(20)  NOT NULL,
+            strategy_name VARCHAR(100) NOT NULL DEFAULT '',
+            run_type      VARCHAR(10)  NOT NULL,
+            status        VARCHAR(20)  NOT NULL DEFAULT 'pending',
+            result        JSONB,
+            error         TEXT,
+            created_at    TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            updated_at    TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            started_at    TIMESTAMP WITH TIME ZONE
+        )
+    """)
+    cursor.execute("ALTER TABLE analysis_jobs ADD COLUMN IF NOT EXISTS started_at TIMESTAMP WITH TIME ZONE")
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_analysis_jobs_magic_created "
+        "ON analysis_jobs(magic_number, created_at DESC)"
+    )
+    # Optional cross-worker memo for ohlc_analyzer (OHLC_CACHE_SHARED=1).
+    # Keyed by a content hash of one timeframe's candles; rows are disposable.
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS ohlc_analysis_cache (
+            cache_key   VARCHAR(64)  PRIMARY KEY,
+            result      JSONB        NOT NULL,
+            created_at  TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
     cursor.execute(
         "CREATE INDEX IF NOT EXISTS idx_analysis_notes_lookup "
         "ON analysis_notes(magic_number, symbol, strategy_name)"
@@ -326,10 +536,240 @@ def init_database():
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_users_email ON users(email)")
     cursor.execute("CREATE INDEX IF NOT EXISTS idx_strategies_name ON strategies(strategy_name)")
 
-    conn.commit()
-    cursor.close()
-    conn.close()
-    print("[db] Tables initialised OK")
+    # Upcoming months only; retention (detach/drop, blob sweep, cache compaction, expired
+    # jobs and OHLC memo rows) takes locks on hot tables and runs from
+    # POST /api/cron/db-maintenance, not /api/health. Init does idempotent DDL only.
+    _premake_partitions(cursor)
+
+
+# =============================================================================
+# PARTITIONS
+# test_inputs and trade_events are RANGE-partitioned by created_at, one partition
+# per calendar month (UTC) named <table>_pYYYYMM, plus <table>_default as a
+# safety net. init_database pre-creates upcoming months; POST /api/cron/db-maintenance
+# does that too and applies retention (detach or drop whole months).
+# =============================================================================
+
+PARTITIONED_TABLES = ("test_inputs", "trade_events")
+# Months created ahead of the current one.
+PARTITION_PREMAKE_MONTHS = int(os.getenv("PARTITION_PREMAKE_MONTHS", "2"))
+# Whole months kept (current month included); 0 keeps everything.
+PARTITION_RETENTION_MONTHS = {
+    "test_inputs": int(os.getenv("TEST_INPUTS_RETENTION_MONTHS", "6")),
+    "trade_events": int(os.getenv("TRADE_EVENTS_RETENTION_MONTHS", "0")),
+}
+# detach keeps expired months as standalone tables (archive/export); drop deletes them.
+PARTITION_RETENTION_MODE = os.getenv("PARTITION_RETENTION_MODE", "detach").strip().lower()
+
+
+def _month_start(value: datetime) -> date:
+    return date(value.year, value.month, 1)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _partition_name(table: str, month: date) -> str:
+    return f"{table}_p{month:%Y%m}"
+
+
+def _create_month_partition(cursor, table: str, month: date) -> bool:
+    """Create one monthly partition (savepoint-guarded: a clash with rows already in
+    the default partition is logged, not fatal to the surrounding transaction)."""
+    name = _partition_name(table, month)
+    cursor.execute("SAVEPOINT create_partition")
+    try:
+        # Literal UTC bounds: a date parameter would be cast in the session time zone.
+        cursor.execute(
+            f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {table} "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d} 00:00:00+00') "
+            f"TO ('{_add_months(month, 1):%Y-%m-%d} 00:00:00+00')"
+        )
+        cursor.execute("RELEASE SAVEPOINT create_partition")
+        return True
+    except psycopg2.Error as e:
+        cursor.execute("ROLLBACK TO SAVEPOINT create_partition")
+        print(f"[db] could not create partition {name}: {e}")
+        return False
+
+
+def _relkind(cursor, table: str) -> Optional[str]:
+    """pg_class.relkind of public.`table` ('r' plain, 'p' partitioned), None if absent."""
+    cursor.execute("""
+        SELECT c.relkind FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relname = %s
+    """, (table,))
+    row = cursor.fetchone()
+    return row[0] if row else None
+
+
+def _ensure_partitioned_table(cursor, table: str, create_sql: str) -> None:
+    """
+    Create `table` from create_sql (a PARTITION BY RANGE (created_at) DDL whose id
+    defaults to nextval('<table>_id_seq')). A plain table left by an older release
+    is migrated in place: renamed aside, its rows copied into monthly partitions
+    (ids and sequence preserved), then dropped.
+    """
+    legacy = f"{table}_legacy"
+    migrate = _relkind(cursor, table) == "r"
+    if migrate:
+        # Re-check under the table lock: a concurrent migration may have just finished.
+        cursor.execute(f"LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE")
+        migrate = _relkind(cursor, table) == "r"
+
+    if migrate:
+        print(f"[db] Migrating {table} to monthly partitions...")
+        cursor.execute(f"ALTER TABLE {table} RENAME TO {legacy}")
+        cursor.execute(f"ALTER SEQUENCE IF EXISTS {table}_id_seq OWNED BY NONE")
+        # Free index names (pkey and idx_<table>_*) for the new parent.
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE schemaname = 'public' AND tablename = %s",
+            (legacy,),
+        )
+        for (index_name,) in cursor.fetchall():
+            cursor.execute(f'ALTER INDEX "{index_name}" RENAME TO "{index_name}_legacy"')
+
+    cursor.execute(f"CREATE SEQUENCE IF NOT EXISTS {table}_id_seq")
+    cursor.execute(create_sql)
+    cursor.execute(f"ALTER SEQUENCE {table}_id_seq OWNED BY {table}.id")
+    cursor.execute(f"CREATE TABLE IF NOT EXISTS {table}_default PARTITION OF {table} DEFAULT")
+
+    if not migrate:
+        return
+
+    cursor.execute(f"SELECT min(created_at) FROM {legacy}")
+    first = cursor.fetchone()[0]
+    if first is not None:
+        month, last = _month_start(first), _month_start(datetime.now(timezone.utc))
+        while month <= last:
+            _create_month_partition(cursor, table, month)
+            month = _add_months(month, 1)
+
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = %s
+    """, (legacy,))
+    legacy_columns = {r[0] for r in cursor.fetchall()}
+    cursor.execute("""
+        SELECT column_name FROM information_schema.columns
+        WHERE table_schema = 'public' AND table_name = %s
+        ORDER BY ordinal_position
+    """, (table,))
+    columns = [r[0] for r in cursor.fetchall() if r[0] in legacy_columns]
+    select_list = ", ".join(
+        "COALESCE(created_at, CURRENT_TIMESTAMP)" if c == "created_at" else c for c in columns
+    )
+    cursor.execute(f"INSERT INTO {table} ({', '.join(columns)}) SELECT {select_list} FROM {legacy}")
+    print(f"[db] {table}: {cursor.rowcount} row(s) moved into partitions")
+    cursor.execute(f"DROP TABLE {legacy}")
+
+
+def _detached_partitions(cursor, table: str) -> List[str]:
+    """Standalone <table>_pYYYYMM tables left by detach-mode retention."""
+    cursor.execute("""
+        SELECT c.relname FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = 'public' AND c.relkind = 'r'
+          AND c.relname ~ %s
+          AND NOT c.relispartition
+        ORDER BY c.relname
+    """, (f"^{table}_p[0-9]{{6}}$",))
+    return [r[0] for r in cursor.fetchall()]
+
+
+def _premake_partitions(cursor) -> Dict[str, int]:
+    """Create missing partitions for the current and next PARTITION_PREMAKE_MONTHS months."""
+    current = _month_start(datetime.now(timezone.utc))
+    created: Dict[str, int] = {}
+    for table in PARTITIONED_TABLES:
+        created[table] = 0
+        for offset in range(PARTITION_PREMAKE_MONTHS + 1):
+            month = _add_months(current, offset)
+            cursor.execute("SELECT to_regclass(%s)", (_partition_name(table, month),))
+            if cursor.fetchone()[0] is None and _create_month_partition(cursor, table, month):
+                created[table] += 1
+    return created
+
+
+def _maintain_partitions(cursor) -> Dict[str, Any]:
+    """Pre-create upcoming monthly partitions and apply retention. Returns a summary."""
+    current = _month_start(datetime.now(timezone.utc))
+    summary: Dict[str, Any] = {}
+    sweep_blobs = PARTITION_RETENTION_MONTHS.get("test_inputs", 0) > 0
+    if sweep_blobs:
+        # Before any DETACH/DROP: _insert_test_runs takes this lock (shared) and then
+        # writes test_inputs, so the same order here avoids a lock-order deadlock. Held
+        # until commit, it also keeps the blob sweep below clear of in-flight inserts.
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (TEST_BLOBS_LOCK_KEY,))
+    created = _premake_partitions(cursor)
+    for table in PARTITIONED_TABLES:
+        expired: List[str] = []
+        keep = PARTITION_RETENTION_MONTHS.get(table, 0)
+        if keep > 0:
+            cutoff = _add_months(current, -(keep - 1))
+            cursor.execute("""
+                SELECT c.relname FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = %s::regclass
+            """, (table,))
+            for (name,) in cursor.fetchall():
+                suffix = name[len(table) + 2:]
+                if not (name.startswith(f"{table}_p") and len(suffix) == 6 and suffix.isdigit()):
+                    continue
+                if date(int(suffix[:4]), int(suffix[4:]), 1) < cutoff:
+                    if PARTITION_RETENTION_MODE == "drop":
+                        cursor.execute(f"DROP TABLE {name}")
+                    else:
+                        cursor.execute(f"ALTER TABLE {table} DETACH PARTITION {name}")
+                    expired.append(name)
+        if expired:
+            print(f"[db] {table}: {PARTITION_RETENTION_MODE} {', '.join(sorted(expired))}")
+        summary[table] = {"created": created[table], PARTITION_RETENTION_MODE: sorted(expired)}
+
+    if sweep_blobs:
+        # Blobs no longer referenced by any month. Detached months are no longer
+        # children of test_inputs, so they are checked explicitly and keep their blobs
+        # while the archive table exists; once an operator drops one, the next run
+        # reclaims the blobs only it referenced. Runs in both retention modes.
+        sources = ["test_inputs"] + _detached_partitions(cursor, "test_inputs")
+        anti_joins = "\n              AND ".join(
+            f"NOT EXISTS (SELECT 1 FROM {src} t WHERE t.{col} = b.sha256)"
+            for src in sources
+            for col in ("test_macro_ref", "test_prompt_ref")
+        )
+        cursor.execute(f"""
+            DELETE FROM test_blobs b
+            WHERE {anti_joins}
+        """)
+        summary["test_blobs_deleted"] = cursor.rowcount
+    return summary
+
+
+def maintain_partitions() -> Dict[str, Any]:
+    """Run partition pre-creation and retention now (cron entry point)."""
+    with db_cursor() as cursor:
+        return _maintain_partitions(cursor)
+
+
+def prune_transient_rows() -> Dict[str, int]:
+    """
+    Delete day-old analysis_jobs (only polled for minutes after submit, a day is kept
+    for debugging) and ohlc_analysis_cache rows (cron entry point). Returns rows deleted.
+    """
+    deleted: Dict[str, int] = {}
+    try:
+        with db_cursor() as cursor:
+            for table in ("analysis_jobs", "ohlc_analysis_cache"):
+                cursor.execute(
+                    f"DELETE FROM {table} WHERE created_at < CURRENT_TIMESTAMP - INTERVAL '1 day'"
+                )
+                deleted[table] = cursor.rowcount
+    except Exception as e:
+        print(f"[db] prune_transient_rows error: {e}")
+    return deleted
 
 
 # =============================================================================
@@ -344,16 +784,13 @@ def get_analysis_record(
 ) -> Optional[Dict[str, Any]]:
     """Load sod_analysis and intraday_analysis for an EA instance (by magic_number)."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT symbol, strategy_name, sod_analysis, intraday_analysis, created_at, updated_at
-            FROM analysis_notes
-            WHERE magic_number = %s
-        """, (magic_number,))
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT symbol, strategy_name, sod_analysis, intraday_analysis, created_at, updated_at
+                FROM analysis_notes
+                WHERE magic_number = %s
+            """, (magic_number,))
+            row = cursor.fetchone()
 
         if not row:
             return None
@@ -381,22 +818,18 @@ def save_sod_analysis(
 ) -> bool:
     """Upsert SOD analysis text; clears intraday_analysis for a fresh trading day."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO analysis_notes
-                (magic_number, symbol, strategy_name, sod_analysis, intraday_analysis, updated_at)
-            VALUES (%s, %s, %s, %s, NULL, CURRENT_TIMESTAMP)
-            ON CONFLICT (magic_number) DO UPDATE SET
-                symbol            = EXCLUDED.symbol,
-                strategy_name     = EXCLUDED.strategy_name,
-                sod_analysis      = EXCLUDED.sod_analysis,
-                intraday_analysis = NULL,
-                updated_at        = CURRENT_TIMESTAMP
-        """, (magic_number, symbol, strategy_name or '', sod_analysis))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO analysis_notes
+                    (magic_number, symbol, strategy_name, sod_analysis, intraday_analysis, updated_at)
+                VALUES (%s, %s, %s, %s, NULL, CURRENT_TIMESTAMP)
+                ON CONFLICT (magic_number) DO UPDATE SET
+                    symbol            = EXCLUDED.symbol,
+                    strategy_name     = EXCLUDED.strategy_name,
+                    sod_analysis      = EXCLUDED.sod_analysis,
+                    intraday_analysis = NULL,
+                    updated_at        = CURRENT_TIMESTAMP
+            """, (magic_number, symbol, strategy_name or '', sod_analysis))
         return True
 
     except Exception as e:
@@ -412,21 +845,17 @@ def save_intraday_analysis(
 ) -> bool:
     """Upsert intraday analysis text (creates row if missing)."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO analysis_notes
-                (magic_number, symbol, strategy_name, intraday_analysis, updated_at)
-            VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
-            ON CONFLICT (magic_number) DO UPDATE SET
-                symbol            = EXCLUDED.symbol,
-                strategy_name     = EXCLUDED.strategy_name,
-                intraday_analysis = EXCLUDED.intraday_analysis,
-                updated_at        = CURRENT_TIMESTAMP
-        """, (magic_number, symbol, strategy_name or '', intraday_analysis))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO analysis_notes
+                    (magic_number, symbol, strategy_name, intraday_analysis, updated_at)
+                VALUES (%s, %s, %s, %s, CURRENT_TIMESTAMP)
+                ON CONFLICT (magic_number) DO UPDATE SET
+                    symbol            = EXCLUDED.symbol,
+                    strategy_name     = EXCLUDED.strategy_name,
+                    intraday_analysis = EXCLUDED.intraday_analysis,
+                    updated_at        = CURRENT_TIMESTAMP
+            """, (magic_number, symbol, strategy_name or '', intraday_analysis))
         return True
 
     except Exception as e:
@@ -441,16 +870,12 @@ def clear_intraday_analysis(
 ) -> bool:
     """Clear intraday_analysis for an EA instance."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE analysis_notes
-            SET intraday_analysis = NULL, updated_at = CURRENT_TIMESTAMP
-            WHERE magic_number = %s
-        """, (magic_number,))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                UPDATE analysis_notes
+                SET intraday_analysis = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE magic_number = %s
+            """, (magic_number,))
         return True
 
     except Exception as e:
@@ -460,22 +885,103 @@ def clear_intraday_analysis(
 
 # =============================================================================
 # MARKET DATA CACHE (global)
+# The latest row is memoised per worker (decoded once, shallow-copied per caller)
+# for MARKET_DATA_MEMO_TTL_SECONDS and dropped early when save_market_data_cache
+# NOTIFYs MARKET_DATA_NOTIFY_CHANNEL.
 # =============================================================================
 
-def get_market_data_cache() -> Optional[Dict[str, Any]]:
-    """Return latest cached market intelligence with _db_created_at injected."""
+MARKET_DATA_MEMO_TTL_SECONDS = float(os.getenv("MARKET_DATA_MEMO_TTL_SECONDS", "60"))
+MARKET_DATA_NOTIFY_CHANNEL = "market_data_cache"
+
+_market_memo_lock = threading.Lock()
+_market_memo: Dict[str, Any] = {"data": None, "loaded_at": 0.0, "generation": 0}
+_market_listener_pid: Optional[int] = None
+
+
+def _invalidate_market_data_memo() -> None:
+    with _market_memo_lock:
+        _market_memo["data"] = None
+        _market_memo["generation"] += 1
+
+
+def _market_data_listener() -> None:
+    """Worker-local LISTEN loop; any notification invalidates the memo."""
+    while True:
+        conn = None
+        try:
+            conn = get_db_connection()
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {MARKET_DATA_NOTIFY_CHANNEL}")
+            # Anything saved while we were disconnected went unannounced.
+            _invalidate_market_data_memo()
+            while True:
+                select.select([conn], [], [], 60)
+                conn.poll()
+                if conn.notifies:
+                    conn.notifies.clear()
+                    _invalidate_market_data_memo()
+        except Exception as e:
+            print(f"[db] market data listener error (TTL-only until reconnect): {e}")
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        time.sleep(5)
+
+
+def _ensure_market_data_listener() -> None:
+    global _market_listener_pid
+    pid = os.getpid()
+    if _market_listener_pid == pid:
+        return
+    with _market_memo_lock:
+        if _market_listener_pid == pid:
+            return
+        _market_listener_pid = pid
+        # A forked worker must not trust the parent's memo.
+        _market_memo["data"] = None
+        _market_memo["generation"] += 1
+    threading.Thread(target=_market_data_listener, name="market-data-listen", daemon=True).start()
+
+
+def get_market_data_cache(use_memo: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Return latest cached market intelligence with _db_created_at injected.
+
+    Served from the per-worker memo when use_memo is set. The memo holds the decoded
+    row and every call gets a shallow copy, so callers may set top-level keys (e.g.
+    "_stale") but must copy nested sections before mutating them.
+    Pass use_memo=False to read through to the database (e.g. after taking the
+    refresh lock, when a NOTIFY may not have arrived yet).
+    """
+    if use_memo and MARKET_DATA_MEMO_TTL_SECONDS > 0:
+        _ensure_market_data_listener()
+        with _market_memo_lock:
+            memo = _market_memo["data"]
+            if memo is not None and time.monotonic() - _market_memo["loaded_at"] < MARKET_DATA_MEMO_TTL_SECONDS:
+                return dict(memo)
+            generation = _market_memo["generation"]
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT data, created_at
-            FROM market_data_cache
-            ORDER BY created_at DESC
-            LIMIT 1
-        """)
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            # Two primary-key lookups via the pointer row; index scan if it is missing.
+            cursor.execute("""
+                SELECT c.data, c.created_at
+                FROM market_data_latest l
+                JOIN market_data_cache c ON c.id = l.cache_id
+            """)
+            row = cursor.fetchone()
+            if not row:
+                cursor.execute("""
+                    SELECT data, created_at
+                    FROM market_data_cache
+                    ORDER BY created_at DESC
+                    LIMIT 1
+                """)
+                row = cursor.fetchone()
 
         if not row:
             return None
@@ -484,6 +990,14 @@ def get_market_data_cache() -> Optional[Dict[str, Any]]:
         if isinstance(data, str):
             data = json.loads(data)
         data["_db_created_at"] = row[1].isoformat() if row[1] else None
+
+        if use_memo and MARKET_DATA_MEMO_TTL_SECONDS > 0:
+            with _market_memo_lock:
+                # Skip if a save was announced while we were reading.
+                if _market_memo["generation"] == generation:
+                    _market_memo["data"] = data
+                    _market_memo["loaded_at"] = time.monotonic()
+            return dict(data)
         return data
 
     except Exception as e:
@@ -491,18 +1005,162 @@ def get_market_data_cache() -> Optional[Dict[str, Any]]:
         return None
 
 
-def save_market_data_cache(data: Dict[str, Any]) -> bool:
-    """Append a new market intelligence snapshot (latest row wins on read)."""
+# Snapshots younger than this are all kept; older ones are compacted to the last
+# snapshot of each UTC day, and daily snapshots older than MARKET_DATA_ARCHIVE_DAYS
+# are deleted (0 keeps the daily history forever). The latest row is never removed.
+MARKET_DATA_RETENTION_DAYS = int(os.getenv("MARKET_DATA_RETENTION_DAYS", "7"))
+MARKET_DATA_ARCHIVE_DAYS = int(os.getenv("MARKET_DATA_ARCHIVE_DAYS", "90"))
+
+
+def _prune_market_data_cache(cursor) -> int:
+    if MARKET_DATA_RETENTION_DAYS <= 0:
+        return 0
+    cursor.execute("""
+        WITH ranked AS (
+            SELECT id, created_at,
+                   row_number() OVER (
+                       PARTITION BY date_trunc('day', created_at AT TIME ZONE 'UTC')
+                       ORDER BY created_at DESC
+                   ) AS day_rank
+            FROM market_data_cache
+            WHERE created_at < CURRENT_TIMESTAMP - make_interval(days => %s)
+        )
+        DELETE FROM market_data_cache m
+        USING ranked r
+        WHERE m.id = r.id
+          AND m.id <> COALESCE((SELECT cache_id FROM market_data_latest), -1)
+          AND (r.day_rank > 1
+               OR (%s > 0 AND r.created_at < CURRENT_TIMESTAMP - make_interval(days => %s)))
+    """, (MARKET_DATA_RETENTION_DAYS, MARKET_DATA_ARCHIVE_DAYS, MARKET_DATA_ARCHIVE_DAYS))
+    deleted = cursor.rowcount
+    if deleted:
+        print(f"[db] market_data_cache: compacted {deleted} old snapshot(s)")
+    return deleted
+
+
+def prune_market_data_cache() -> int:
+    """Apply market_data_cache retention now (cron entry point). Returns rows deleted."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO market_data_cache (data, created_at)
-            VALUES (%s, CURRENT_TIMESTAMP)
-        """, (json.dumps(data),))
+        with db_cursor() as cursor:
+            return _prune_market_data_cache(cursor)
+    except Exception as e:
+        print(f"[db] prune_market_data_cache error: {e}")
+        return 0
+
+
+# Advisory lock id for the single-flight market data refresh (any fixed bigint).
+MARKET_DATA_REFRESH_LOCK_KEY = 0x4D4B5444415441  # "MKTDATA"
+
+
+# Poll interval while waiting for an advisory lock (jittered; no connection held between polls).
+ADVISORY_LOCK_POLL_SECONDS = float(os.getenv("ADVISORY_LOCK_POLL_SECONDS", "0.25"))
+
+
+def _try_advisory_lock(lock_key: int):
+    """
+    One pg_try_advisory_lock attempt. Returns (ExitStack owning the pooled connection,
+    connection) when taken, else None with the connection already back in the pool.
+    """
+    with ExitStack() as stack:
+        conn = stack.enter_context(db_connection())
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (lock_key,))
+            acquired = bool(cursor.fetchone()[0])
         conn.commit()
-        cursor.close()
-        conn.close()
+        if not acquired:
+            return None
+        return stack.pop_all(), conn
+
+
+@contextmanager
+def advisory_lock(lock_key: int, wait_seconds: float = 0.0):
+    """
+    Hold a session-level Postgres advisory lock on a pooled connection.
+
+    Yields True if the lock was taken within wait_seconds (0 = try once), False if
+    another session still holds it, or None if the database could not be reached
+    (callers then carry on without cross-worker coordination).
+    Waiting polls pg_try_advisory_lock and returns the connection to the pool between
+    polls, so queued waiters never tie up the pool. The lock is released when the
+    block exits.
+    """
+    deadline = time.monotonic() + max(0.0, wait_seconds)
+    held = None
+    unavailable = False
+    while True:
+        try:
+            held = _try_advisory_lock(lock_key)
+        except Exception as e:
+            print(f"[db] advisory_lock unavailable: {e}")
+            unavailable = True
+            break
+        remaining = deadline - time.monotonic()
+        if held is not None or remaining <= 0:
+            break
+        time.sleep(min(remaining, random.uniform(0.5, 1.5) * ADVISORY_LOCK_POLL_SECONDS))
+
+    if held is None:
+        yield None if unavailable else False
+        return
+
+    stack, conn = held
+    with stack:
+        try:
+            yield True
+        finally:
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (lock_key,))
+                conn.commit()
+            except Exception as e:
+                # The lock dies with the session, so make sure the pool discards it.
+                print(f"[db] advisory unlock failed, closing connection: {e}")
+                conn.close()
+
+
+def save_market_data_cache(data: Dict[str, Any], replace_latest: bool = False) -> bool:
+    """
+    Append a new market intelligence snapshot and point market_data_latest at it.
+
+    replace_latest=True overwrites the latest row in place (created_at bumped) instead.
+    Refreshes that kept the previous synthesis and only updated raw sources (quotes)
+    use it, so the table grows by one row per synthesis, not one per quote refresh.
+    Falls back to an insert if there is no latest row yet.
+    """
+    try:
+        with db_cursor() as cursor:
+            replaced = False
+            if replace_latest:
+                cursor.execute("""
+                    WITH updated AS (
+                        UPDATE market_data_cache c
+                        SET data = %s, created_at = CURRENT_TIMESTAMP
+                        FROM market_data_latest l
+                        WHERE c.id = l.cache_id
+                        RETURNING c.id, c.created_at
+                    )
+                    UPDATE market_data_latest l
+                    SET created_at = u.created_at
+                    FROM updated u
+                    WHERE l.cache_id = u.id
+                """, (json.dumps(data),))
+                replaced = cursor.rowcount > 0
+            if not replaced:
+                cursor.execute("""
+                    WITH inserted AS (
+                        INSERT INTO market_data_cache (data, created_at)
+                        VALUES (%s, CURRENT_TIMESTAMP)
+                        RETURNING id, created_at
+                    )
+                    INSERT INTO market_data_latest (cache_id, created_at)
+                    SELECT id, created_at FROM inserted
+                    ON CONFLICT (singleton) DO UPDATE
+                        SET cache_id = EXCLUDED.cache_id, created_at = EXCLUDED.created_at
+                        WHERE market_data_latest.created_at <= EXCLUDED.created_at
+                """, (json.dumps(data),))
+            # Delivered to every worker's listener on commit.
+            cursor.execute(f"NOTIFY {MARKET_DATA_NOTIFY_CHANNEL}")
+        _invalidate_market_data_memo()
         return True
 
     except Exception as e:
@@ -510,6 +1168,67 @@ def save_market_data_cache(data: Dict[str, Any]) -> bool:
         return False
 
 
+# =============================================================================
+# OHLC ANALYSIS CACHE (optional, shared across gunicorn workers)
+# Per-timeframe analyze_ohlc_data results keyed by content hash. Results are
+# passed through as JSON text so the analyzer controls (de)serialisation.
+# =============================================================================
+
+def get_ohlc_analysis_cache(cache_keys: List[str], max_age_seconds: int) -> Dict[str, str]:
+    """Return {cache_key: result JSON text} for keys cached within max_age_seconds."""
+    if not cache_keys:
+        return {}
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT cache_key, result::text
+                FROM ohlc_analysis_cache
+                WHERE cache_key = ANY(%s)
+                  AND created_at >= CURRENT_TIMESTAMP - make_interval(secs => %s)
+            """, (list(cache_keys), max_age_seconds))
+            return {row[0]: row[1] for row in cursor.fetchall()}
+
+    except Exception as e:
+        print(f"[db] get_ohlc_analysis_cache error: {e}")
+        return {}
+
+
+def save_ohlc_analysis_cache(entries: Dict[str, str]) -> bool:
+    """Upsert {cache_key: result JSON text} in one statement."""
+    if not entries:
+        return True
+    try:
+        keys = list(entries)
+        with db_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO ohlc_analysis_cache (cache_key, result, created_at)
+                SELECT k, r::jsonb, CURRENT_TIMESTAMP
+                FROM unnest(%s::text[], %s::text[]) AS t(k, r)
+                ON CONFLICT (cache_key) DO UPDATE
+                SET result = EXCLUDED.result, created_at = EXCLUDED.created_at
+            """, (keys, [entries[k] for k in keys]))
+        return True
+
+    except Exception as e:
+        print(f"[db] save_ohlc_analysis_cache error: {e}")
+        return False
+
+
+def prune_ohlc_analysis_cache(max_age_seconds: int) -> int:
+    """Delete cache rows older than max_age_seconds. Returns rows removed."""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("""
+                DELETE FROM ohlc_analysis_cache
+                WHERE created_at < CURRENT_TIMESTAMP - make_interval(secs => %s)
+            """, (max_age_seconds,))
+            return cursor.rowcount
+
+    except Exception as e:
+        print(f"[db] prune_ohlc_analysis_cache error: {e}")
+        return 0
+
+
 # =============================================================================
 # MAGIC NUMBER (EA instance identity)
 # =============================================================================
@@ -531,37 +1250,57 @@ def magic_number_is_available(
             "Set a unique MagicNumber per EA chart in MT5 inputs."
         )
 
-    sym = (symbol or "").strip().upper()
-    strat = (strategy_name or "").strip()
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT symbol, strategy_name
-            FROM analysis_notes
-            WHERE magic_number = %s
-        """, (magic_number,))
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
-
-        if not row:
-            return True, ""
-
-        row_sym = (row[0] or "").strip().upper()
-        row_strat = (row[1] or "").strip()
-        if row_sym == sym and row_strat == strat:
-            return True, ""
-
-        return False, (
-            f"Magic number {magic_number} is already registered on the server "
-            f"({row_sym} / {row_strat}). Use a different MagicNumber for this chart."
-        )
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT symbol, strategy_name
+                FROM analysis_notes
+                WHERE magic_number = %s
+            """, (magic_number,))
+            row = cursor.fetchone()
 
     except Exception as e:
         print(f"[db] magic_number_is_available error: {e}")
         return False, str(e)
 
+    return _magic_number_claim(magic_number, symbol, strategy_name, row)
+
+
+def magic_number_matches_record(
+    magic_number: int,
+    symbol: str,
+    strategy_name: str,
+    analysis_record: Optional[Dict[str, Any]],
+) -> tuple[bool, str]:
+    """magic_number_is_available() against an analysis_record already loaded by load_run_context."""
+    if magic_number <= 0:
+        return magic_number_is_available(magic_number)
+    row = (analysis_record["symbol"], analysis_record["strategy_name"]) if analysis_record else None
+    return _magic_number_claim(magic_number, symbol, strategy_name, row)
+
+
+def _magic_number_claim(
+    magic_number: int,
+    symbol: str,
+    strategy_name: str,
+    row: Optional[tuple],
+) -> tuple[bool, str]:
+    """(ok, message) for claiming magic_number given its analysis_notes (symbol, strategy) row."""
+    if not row:
+        return True, ""
+
+    sym = (symbol or "").strip().upper()
+    strat = (strategy_name or "").strip()
+    row_sym = (row[0] or "").strip().upper()
+    row_strat = (row[1] or "").strip()
+    if row_sym == sym and row_strat == strat:
+        return True, ""
+
+    return False, (
+        f"Magic number {magic_number} is already registered on the server "
+        f"({row_sym} / {row_strat}). Use a different MagicNumber for this chart."
+    )
+
 
 # =============================================================================
 # TEST INPUTS (append-only — one row per AI run, all fields in one table)
@@ -589,6 +1328,270 @@ def _chart_to_text(chart: Any) -> Optional[str]:
     return json.dumps(chart)
 
 
+# Write-behind: save_test_run enqueues and a per-worker flusher thread batches rows
+# into multi-row INSERTs, keeping the audit write off the EA's request path.
+TEST_INPUTS_ASYNC = os.getenv("TEST_INPUTS_ASYNC", "1") == "1"
+TEST_INPUTS_QUEUE_MAX = int(os.getenv("TEST_INPUTS_QUEUE_MAX", "200"))
+TEST_INPUTS_BATCH_SIZE = int(os.getenv("TEST_INPUTS_BATCH_SIZE", "20"))
+TEST_INPUTS_FLUSH_INTERVAL_SECONDS = float(os.getenv("TEST_INPUTS_FLUSH_INTERVAL_SECONDS", "1"))
+# When the queue is full: drop_newest | drop_oldest | block (wait up to TEST_INPUTS_BLOCK_SECONDS, then drop).
+TEST_INPUTS_QUEUE_POLICY = os.getenv("TEST_INPUTS_QUEUE_POLICY", "drop_newest").strip().lower()
+TEST_INPUTS_BLOCK_SECONDS = float(os.getenv("TEST_INPUTS_BLOCK_SECONDS", "2"))
+# A failed batch INSERT is retried this many times (full-jitter exponential backoff) before
+# its rows are dropped. The queue keeps filling meanwhile and overflows per the policy above.
+TEST_INPUTS_FLUSH_RETRIES = max(0, int(os.getenv("TEST_INPUTS_FLUSH_RETRIES", "3")))
+TEST_INPUTS_RETRY_BASE_SECONDS = float(os.getenv("TEST_INPUTS_RETRY_BASE_SECONDS", "0.5"))
+TEST_INPUTS_RETRY_MAX_SECONDS = float(os.getenv("TEST_INPUTS_RETRY_MAX_SECONDS", "5"))
+
+_test_queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max(1, TEST_INPUTS_QUEUE_MAX))
+_test_flusher_pid: Optional[int] = None
+_test_flusher_lock = threading.Lock()
+_test_stats_lock = threading.Lock()
+_test_stats: Dict[str, float] = {
+    "enqueued": 0, "written": 0, "dropped": 0, "failed": 0, "retries": 0,
+    "flushes": 0, "flush_ms_total": 0.0, "flush_ms_max": 0.0, "last_flush_ms": 0.0,
+}
+
+
+def _bump_test_stat(key: str, amount: float = 1) -> None:
+    with _test_stats_lock:
+        _test_stats[key] += amount
+
+
+# Advisory lock id guarding test_blobs: inserts hold it shared, the orphan sweep in
+# _maintain_partitions exclusive, so a blob is never deleted under an uncommitted row.
+TEST_BLOBS_LOCK_KEY = 0x54424C4F4253  # "TBLOBS"
+
+
+def _blob_ref(content: Optional[str], blobs: Dict[str, str]) -> Optional[str]:
+    """SHA-256 reference for content, collecting it in blobs for insertion."""
+    if content is None:
+        return None
+    digest = hashlib.sha256(content.encode("utf-8")).hexdigest()
+    blobs[digest] = content
+    return digest
+
+
+def _test_run_row(run: Dict[str, Any], blobs: Dict[str, str]) -> tuple:
+    """Serialise one queued run into a test_inputs row (done on the flusher thread).
+    The system prompt and macro go to test_blobs; the row keeps their hashes."""
+    return (
+        run["magic_number"],
+        run["symbol"],
+        run["strategy_name"] or "",
+        run["run_type"],
+        _blob_ref(_to_jsonb(run["macro"]), blobs),
+        _to_jsonb(run["ohlc"]),
+        _blob_ref(run["system_prompt"], blobs),
+        _chart_to_text(run["chart"]),
+        _to_jsonb({"flat": run["flat_output"], "raw_gpt_response": run["raw_gpt_response"]}),
+        run["created_at"],
+    )
+
+
+def _insert_test_runs(runs: List[Dict[str, Any]]) -> None:
+    blobs: Dict[str, str] = {}
+    rows = [_test_run_row(run, blobs) for run in runs]
+    with db_cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock_shared(%s)", (TEST_BLOBS_LOCK_KEY,))
+        # Only send content the table does not already hold (checked under the lock).
+        cursor.execute("SELECT sha256 FROM test_blobs WHERE sha256 = ANY(%s)", (list(blobs),))
+        stored = {r[0] for r in cursor.fetchall()}
+        new_blobs = [(digest, content) for digest, content in blobs.items() if digest not in stored]
+        if new_blobs:
+            psycopg2.extras.execute_values(cursor, """
+                INSERT INTO test_blobs (sha256, content) VALUES %s
+                ON CONFLICT (sha256) DO NOTHING
+            """, new_blobs, page_size=len(new_blobs))
+        psycopg2.extras.execute_values(cursor, """
+            INSERT INTO test_inputs
+                (magic_number, symbol, strategy_name, run_type,
+                 test_macro_ref, test_ohlc, test_prompt_ref, test_chart, test_output, created_at)
+            VALUES %s
+        """, rows,
+            template="(%s, %s, %s, %s, %s, %s::jsonb, %s, %s, %s::jsonb, %s)",
+            page_size=len(rows),
+        )
+
+
+def get_test_runs(
+    magic_number: int,
+    limit: int = 50,
+    run_type: Optional[str] = None,
+    days: Optional[int] = 30,
+) -> List[Dict[str, Any]]:
+    """
+    Latest test_inputs rows for an EA instance, newest first, with blob references
+    re-hydrated into test_macro / test_sod / test_intraday (rows written before
+    deduplication carry the values inline and are returned unchanged).
+
+    days bounds created_at so only the matching monthly partitions are scanned
+    (None searches all history).
+    """
+    since = datetime.now(timezone.utc) - timedelta(days=days) if days else None
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT t.id, t.magic_number, t.symbol, t.strategy_name, t.run_type,
+                       COALESCE(t.test_macro, mb.content::jsonb)                       AS test_macro,
+                       t.test_ohlc,
+                       COALESCE(t.test_sod,
+                                CASE WHEN t.run_type = 'sod' THEN pb.content END)      AS test_sod,
+                       COALESCE(t.test_intraday,
+                                CASE WHEN t.run_type = 'intraday' THEN pb.content END) AS test_intraday,
+                       t.test_chart, t.test_output, t.created_at
+                FROM test_inputs t
+                LEFT JOIN test_blobs mb ON mb.sha256 = t.test_macro_ref
+                LEFT JOIN test_blobs pb ON pb.sha256 = t.test_prompt_ref
+                WHERE t.magic_number = %s
+                  AND t.created_at >= %s
+                  AND (%s::text IS NULL OR t.run_type = %s)
+                ORDER BY t.created_at DESC
+                LIMIT %s
+            """, (magic_number, since or datetime.min.replace(tzinfo=timezone.utc), run_type, run_type, limit))
+            columns = [desc[0] for desc in cursor.description]
+            rows = cursor.fetchall()
+
+        out = []
+        for row in rows:
+            item = dict(zip(columns, row))
+            item["created_at"] = item["created_at"].isoformat() if item["created_at"] else None
+            out.append(item)
+        return out
+
+    except Exception as e:
+        print(f"[db] get_test_runs error: {e}")
+        return []
+
+
+def _flush_test_batch(batch: List[Dict[str, Any]]) -> None:
+    started = time.monotonic()
+    try:
+        for attempt in range(TEST_INPUTS_FLUSH_RETRIES + 1):
+            try:
+                _insert_test_runs(batch)
+                _bump_test_stat("written", len(batch))
+                return
+            except Exception as e:
+                if attempt >= TEST_INPUTS_FLUSH_RETRIES:
+                    _bump_test_stat("failed", len(batch))
+                    print(f"[db] test_inputs flush error after {attempt + 1} attempt(s) "
+                          f"({len(batch)} row(s) dropped): {e}")
+                    return
+                delay = random.uniform(
+                    0, min(TEST_INPUTS_RETRY_MAX_SECONDS, TEST_INPUTS_RETRY_BASE_SECONDS * (2 ** attempt))
+                )
+                _bump_test_stat("retries")
+                print(f"[db] test_inputs flush error ({len(batch)} row(s)), retrying in {delay:.1f}s: {e}")
+                time.sleep(delay)
+    finally:
+        elapsed_ms = (time.monotonic() - started) * 1000
+        with _test_stats_lock:
+            _test_stats["flushes"] += 1
+            _test_stats["flush_ms_total"] += elapsed_ms
+            _test_stats["last_flush_ms"] = elapsed_ms
+            _test_stats["flush_ms_max"] = max(_test_stats["flush_ms_max"], elapsed_ms)
+        for _ in batch:
+            _test_queue.task_done()
+
+
+def _test_flusher() -> None:
+    while True:
+        batch = [_test_queue.get()]
+        # Linger briefly so bursts (several EAs at SOD) share one INSERT.
+        deadline = time.monotonic() + TEST_INPUTS_FLUSH_INTERVAL_SECONDS
+        while len(batch) < TEST_INPUTS_BATCH_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_test_queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        _flush_test_batch(batch)
+
+
+def _ensure_test_flusher() -> None:
+    global _test_flusher_pid
+    pid = os.getpid()
+    if _test_flusher_pid == pid:
+        return
+    with _test_flusher_lock:
+        if _test_flusher_pid != pid:
+            threading.Thread(target=_test_flusher, name="test-inputs-flush", daemon=True).start()
+            _test_flusher_pid = pid
+
+
+def _enqueue_test_run(run: Dict[str, Any]) -> bool:
+    """Queue a run per TEST_INPUTS_QUEUE_POLICY; False if it had to be dropped."""
+    _ensure_test_flusher()
+    try:
+        if TEST_INPUTS_QUEUE_POLICY == "block":
+            _test_queue.put(run, timeout=TEST_INPUTS_BLOCK_SECONDS)
+        else:
+            _test_queue.put_nowait(run)
+    except queue.Full:
+        if TEST_INPUTS_QUEUE_POLICY != "drop_oldest":
+            _bump_test_stat("dropped")
+            print("[db] test_inputs queue full — run dropped")
+            return False
+        try:
+            _test_queue.get_nowait()
+            _test_queue.task_done()
+            _bump_test_stat("dropped")
+            print("[db] test_inputs queue full — oldest queued run dropped")
+        except queue.Empty:
+            pass
+        try:
+            _test_queue.put_nowait(run)
+        except queue.Full:
+            _bump_test_stat("dropped")
+            return False
+    _bump_test_stat("enqueued")
+    return True
+
+
+def flush_test_runs(timeout: float = 10.0) -> bool:
+    """Wait until every queued test_inputs row has been written (or failed). True if drained."""
+    deadline = time.monotonic() + timeout
+    while _test_queue.unfinished_tasks:
+        if _test_flusher_pid != os.getpid() or time.monotonic() >= deadline:
+            return False
+        time.sleep(0.05)
+    return True
+
+
+def _flush_test_runs_at_exit() -> None:
+    if _test_queue.unfinished_tasks and not flush_test_runs(timeout=10.0):
+        print(f"[db] test_inputs: {_test_queue.unfinished_tasks} queued row(s) not flushed at exit")
+
+
+atexit.register(_flush_test_runs_at_exit)
+
+
+def test_run_queue_stats() -> Dict[str, Any]:
+    """
+    Queue depth and flush metrics for this worker (for /api/trading/status).
+    dropped: runs rejected by a full queue; failed: rows dropped after every flush
+    retry failed; retries: flush attempts that were retried.
+    """
+    with _test_stats_lock:
+        stats = dict(_test_stats)
+    flushes = stats.pop("flushes")
+    total_ms = stats.pop("flush_ms_total")
+    stats.update({
+        "async": TEST_INPUTS_ASYNC,
+        "policy": TEST_INPUTS_QUEUE_POLICY,
+        "depth": _test_queue.qsize(),
+        "capacity": TEST_INPUTS_QUEUE_MAX,
+        "flushes": int(flushes),
+        "avg_flush_ms": round(total_ms / flushes, 1) if flushes else 0.0,
+        "last_flush_ms": round(stats["last_flush_ms"], 1),
+        "flush_ms_max": round(stats["flush_ms_max"], 1),
+    })
+    return stats
+
+
 def save_test_run(
     magic_number: int,
     run_type: str,
@@ -605,41 +1608,32 @@ def save_test_run(
     Append one test_inputs row for a trading run (testing/audit).
 
     run_type: 'sod' | 'intraday' — system prompt goes in test_sod or test_intraday; the other is NULL.
+    With TEST_INPUTS_ASYNC (default) the row is queued for the background flusher and
+    True means it was accepted; callers must not mutate the passed objects afterwards.
     """
     run_type = (run_type or "").lower()
     if run_type not in ("sod", "intraday"):
         raise ValueError("run_type must be 'sod' or 'intraday'")
 
-    test_sod = system_prompt if run_type == "sod" else None
-    test_intraday = system_prompt if run_type == "intraday" else None
-    test_output = {
-        "flat": flat_output,
+    run = {
+        "magic_number": magic_number,
+        "symbol": symbol,
+        "strategy_name": strategy_name,
+        "run_type": run_type,
+        "macro": macro,
+        "ohlc": ohlc,
+        "chart": chart,
+        "system_prompt": system_prompt,
+        "flat_output": flat_output,
         "raw_gpt_response": raw_gpt_response,
+        "created_at": datetime.now(timezone.utc),
     }
 
+    if TEST_INPUTS_ASYNC:
+        return _enqueue_test_run(run)
+
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO test_inputs
-                (magic_number, symbol, strategy_name, run_type,
-                 test_macro, test_ohlc, test_sod, test_intraday, test_chart, test_output)
-            VALUES (%s, %s, %s, %s, %s::jsonb, %s::jsonb, %s, %s, %s, %s::jsonb)
-        """, (
-            magic_number,
-            symbol,
-            strategy_name or "",
-            run_type,
-            _to_jsonb(macro),
-            _to_jsonb(ohlc),
-            test_sod,
-            test_intraday,
-            _chart_to_text(chart),
-            _to_jsonb(test_output),
-        ))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        _insert_test_runs([run])
         print(f"[db] test_inputs saved ({run_type}, magic {magic_number})")
         return True
 
@@ -648,6 +1642,320 @@ def save_test_run(
         return False
 
 
+# =============================================================================
+# RUN CONTEXT
+# Everything sod_action / intraday_action read from the DB, in one round trip.
+# =============================================================================
+
+def _float_or_none(value: Any) -> Optional[float]:
+    return float(value) if value is not None else None
+
+
+def _empty_account_context(magic_number: int) -> Dict[str, Any]:
+    return {
+        "magic_number": magic_number,
+        "symbol": None,
+        "strategy_name": None,
+        "account_size": None,
+        "realised_pnl": None,
+        "unrealised_pnl": None,
+        "today_realised_pnl": None,
+        "week_pnl": None,
+        "month_pnl": None,
+        "snapshot_at": None,
+    }
+
+
+_RUN_CONTEXT_CTES = {
+    "positions": """
+        SELECT COALESCE(json_agg(json_build_object(
+            'trade_id',      trade_id,
+            'asset',         asset,
+            'direction',     direction,
+            'entry_price',   entry_price,
+            'current_price', current_price,
+            'stop_loss',     stop_loss,
+            'take_profit',   take_profit,
+            'lot_size',      lot_size,
+            'entry_time',    entry_time
+        ) ORDER BY entry_time ASC), '[]'::json) AS data
+        FROM current_positions
+        WHERE symbol = %(symbol)s AND magic_number = %(magic_number)s
+    """,
+    "note": """
+        SELECT json_build_object(
+            'symbol',            symbol,
+            'strategy_name',     strategy_name,
+            'sod_analysis',      sod_analysis,
+            'intraday_analysis', intraday_analysis,
+            'created_at',        created_at,
+            'updated_at',        updated_at
+        ) AS data
+        FROM analysis_notes
+        WHERE magic_number = %(magic_number)s
+    """,
+    "account": """
+        SELECT json_build_object(
+            'symbol',             symbol,
+            'strategy_name',      strategy_name,
+            'account_size',       account_size,
+            'realised_pnl',       realised_pnl,
+            'unrealised_pnl',     unrealised_pnl,
+            'today_realised_pnl', today_realised_pnl,
+            'week_pnl',           week_pnl,
+            'month_pnl',          month_pnl,
+            'created_at',         created_at
+        ) AS data
+        FROM account_snapshots
+        WHERE magic_number = %(magic_number)s
+        LIMIT 1
+    """,
+    "strategy": """
+        SELECT json_build_object(
+            'strategy_name',   strategy_name,
+            'strategy_prompt', strategy_prompt,
+            'uploaded_by',     uploaded_by,
+            'created_at',      created_at,
+            'updated_at',      updated_at
+        ) AS data
+        FROM strategies
+        WHERE strategy_name = %(strategy_name)s
+    """,
+}
+
+
+def _fetch_run_context_parts(parts: List[str], params: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the named _RUN_CONTEXT_CTES as one statement; {part: json value or None}."""
+    ctes = ",\n".join(f"{name} AS ({_RUN_CONTEXT_CTES[name]})" for name in parts)
+    selects = ", ".join(f"(SELECT data FROM {name})" for name in parts)
+    with db_cursor() as cursor:
+        cursor.execute(f"WITH {ctes} SELECT {selects}", params)
+        return dict(zip(parts, cursor.fetchone()))
+
+
+def _apply_run_state(context: Dict[str, Any], magic_number: int, positions: Any, account: Any) -> None:
+    """Fill context["positions"] / context["account"] from the positions / account CTE values."""
+    context["positions"] = [{
+        "trade_id":      int(p["trade_id"]),
+        "asset":         p["asset"],
+        "direction":     p["direction"],
+        "entry_price":   _float_or_none(p["entry_price"]),
+        "current_price": float(p["current_price"]) if p["current_price"] else None,
+        "stop_loss":     float(p["stop_loss"]) if p["stop_loss"] else None,
+        "take_profit":   float(p["take_profit"]) if p["take_profit"] else None,
+        "lot_size":      _float_or_none(p["lot_size"]),
+        "entry_time":    p["entry_time"],
+    } for p in positions or []]
+
+    context["account"] = _empty_account_context(magic_number)
+    if account:
+        context["account"].update({
+            "symbol": account["symbol"],
+            "strategy_name": account["strategy_name"],
+            "account_size": _float_or_none(account["account_size"]),
+            "realised_pnl": _float_or_none(account["realised_pnl"]),
+            "unrealised_pnl": _float_or_none(account["unrealised_pnl"]),
+            "today_realised_pnl": _float_or_none(account["today_realised_pnl"]),
+            "week_pnl": _float_or_none(account["week_pnl"]),
+            "month_pnl": _float_or_none(account["month_pnl"]),
+            "snapshot_at": account["created_at"],
+        })
+
+
+def load_run_context(
+    magic_number: int,
+    symbol: str,
+    strategy_name: str,
+    include_state: bool = True,
+) -> Dict[str, Any]:
+    """
+    Load positions, analysis record, account snapshot and strategy in one query.
+
+    include_state=False skips positions and account (left at their empty defaults):
+    the trading endpoints validate strategy and magic number against this read, persist
+    the EA payload, then fill the state in from that payload with apply_payload_run_state().
+
+    Returns:
+        {
+            "positions":       same shape as get_current_positions,
+            "analysis_record": same shape as get_analysis_record (or None),
+            "account":         same shape as get_account_context_for_analysis,
+            "strategy":        same shape as get_strategy (or None),
+        }
+
+    Database errors are logged and re-raised (not turned into an empty context), so a
+    DB outage surfaces as a 5xx instead of "Strategy not found".
+    """
+    context: Dict[str, Any] = {
+        "positions": [],
+        "analysis_record": None,
+        "account": _empty_account_context(magic_number),
+        "strategy": None,
+    }
+    parts = ["note", "strategy"] + (["positions", "account"] if include_state else [])
+    try:
+        values = _fetch_run_context_parts(parts, {
+            "magic_number": magic_number,
+            "symbol": symbol,
+            "strategy_name": (strategy_name or '').strip(),
+        })
+    except Exception as e:
+        print(f"[db] load_run_context error: {e}")
+        raise
+
+    note = values["note"]
+    if note:
+        context["analysis_record"] = {
+            "magic_number": magic_number,
+            "symbol": note["symbol"],
+            "strategy_name": note["strategy_name"] or '',
+            "sod_analysis": note["sod_analysis"],
+            "intraday_analysis": note["intraday_analysis"],
+            "_db_created_at": note["created_at"],
+            "_db_updated_at": note["updated_at"],
+        }
+    context["strategy"] = values["strategy"]
+    if include_state:
+        _apply_run_state(context, magic_number, values["positions"], values["account"])
+    return context
+
+
+def apply_payload_run_state(
+    context: Dict[str, Any],
+    magic_number: int,
+    symbol: str,
+    strategy_name: str,
+    positions: List[Dict[str, Any]],
+    account: Dict[str, Any],
+) -> Dict[str, Any]:
+    """
+    Fill context positions / account from the EA payload just written by
+    store_current_positions / save_account_snapshot, in the shapes load_run_context
+    returns, without reading them back.
+
+    account: the save_account_snapshot metric kwargs (account_size ... month_pnl).
+    """
+    # Same normalisation and last-report-wins dedupe as store_current_positions.
+    by_trade_id = {
+        pos["trade_id"]: pos for pos in normalize_positions_for_storage(positions, symbol)
+    }
+    rows = []
+    for pos in by_trade_id.values():
+        entry_time = pos["entry_time"]
+        rows.append(dict(pos, entry_time=(
+            entry_time.isoformat() if isinstance(entry_time, datetime) else entry_time
+        )))
+    rows.sort(key=lambda p: str(p["entry_time"] or ""))
+
+    _apply_run_state(context, magic_number, rows, dict(
+        account,
+        symbol=symbol,
+        strategy_name=strategy_name or '',
+        created_at=datetime.now(timezone.utc).isoformat(),
+    ))
+    return context
+
+
+# =============================================================================
+# ANALYSIS JOBS
+# Async SOD/intraday runs: the API inserts a pending row, a background executor
+# runs the brain and stores the flat EA payload. Any gunicorn worker can serve polls.
+# =============================================================================
+
+def create_analysis_job(
+    job_id: str,
+    magic_number: int,
+    symbol: str,
+    strategy_name: str,
+    run_type: str,
+) -> bool:
+    """Insert a pending job row."""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO analysis_jobs (job_id, magic_number, symbol, strategy_name, run_type, status)
+                VALUES (%s, %s, %s, %s, %s, 'pending')
+            """, (job_id, magic_number, symbol, strategy_name or '', run_type))
+        return True
+
+    except Exception as e:
+        print(f"[db] create_analysis_job error: {e}")
+        return False
+
+
+def update_analysis_job(
+    job_id: str,
+    status: str,
+    result: Optional[Dict[str, Any]] = None,
+    error: Optional[str] = None,
+    from_status: Optional[str] = None,
+) -> bool:
+    """
+    Set job status ('running' | 'done' | 'failed') and optionally its result / error.
+
+    from_status makes the transition conditional (pending -> running, running -> done,
+    pending/running -> failed), so a job already failed as stale is never revived.
+    Moving to 'running' stamps started_at. Returns True only if the row was updated.
+    """
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("""
+                UPDATE analysis_jobs
+                SET status     = %s,
+                    result     = COALESCE(%s::jsonb, result),
+                    error      = COALESCE(%s, error),
+                    started_at = CASE WHEN %s = 'running' THEN CURRENT_TIMESTAMP ELSE started_at END,
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE job_id = %s
+                  AND (%s::text IS NULL OR status = %s)
+            """, (
+                status, json.dumps(result) if result is not None else None, error,
+                status, job_id, from_status, from_status,
+            ))
+            return cursor.rowcount > 0
+
+    except Exception as e:
+        print(f"[db] update_analysis_job error: {e}")
+        return False
+
+
+def get_analysis_job(job_id: str) -> Optional[Dict[str, Any]]:
+    """Return a job row (status, result, error, timestamps) or None if unknown."""
+    try:
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT job_id, magic_number, symbol, strategy_name, run_type,
+                       status, result, error, created_at, updated_at, started_at
+                FROM analysis_jobs
+                WHERE job_id = %s
+            """, (job_id,))
+            row = cursor.fetchone()
+
+        if not row:
+            return None
+
+        result = row[6]
+        if isinstance(result, str):
+            result = json.loads(result)
+        return {
+            "job_id":        str(row[0]),
+            "magic_number":  row[1],
+            "symbol":        row[2],
+            "strategy_name": row[3] or '',
+            "run_type":      row[4],
+            "status":        row[5],
+            "result":        result,
+            "error":         row[7],
+            "created_at":    row[8].isoformat() if row[8] else None,
+            "updated_at":    row[9].isoformat() if row[9] else None,
+            "started_at":    row[10].isoformat() if row[10] else None,
+        }
+
+    except Exception as e:
+        print(f"[db] get_analysis_job error: {e}")
+        return None
+
+
 # =============================================================================
 # LEGACY COMPATIBILITY (brain.py / api_server.py until SOD rework is wired)
 # magic_number defaults to 0 when callers do not pass it yet.
@@ -719,7 +2027,8 @@ def clear_analysis_notes(symbol: str, note_types: List[str], strategy_name: str
 
 # =============================================================================
 # CURRENT POSITIONS
-# Fully replaced on every EA update — always reflects live MT5 state.
+# Synced to each EA update (closed trades deleted, new or changed ones upserted,
+# unchanged rows left alone). entry_time is fixed at first sight of a trade_id.
 # =============================================================================
 
 def _entry_time_for_db(raw: Any) -> Any:
@@ -770,41 +2079,73 @@ def store_current_positions(
     positions: List[Dict[str, Any]],
     magic_number: int,
 ) -> bool:
-    """Replace all positions for an EA instance (magic_number + symbol)."""
-    normalized = normalize_positions_for_storage(positions, symbol)
-    try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+    """
+    Sync positions for an EA instance (magic_number + symbol) to exactly `positions`.
 
-        cursor.execute(
-            "DELETE FROM current_positions WHERE symbol = %s AND magic_number = %s",
-            (symbol, magic_number),
-        )
+    Rows for trades no longer reported are deleted; new or changed trades are upserted
+    in one statement, and unchanged rows are not rewritten at all (so their updated_at
+    is the last time they actually changed). A stored entry_time is kept: payloads
+    without one would otherwise stamp "now" and rewrite the row on every update.
+    """
+    normalized = normalize_positions_for_storage(positions, symbol)
+    # One row per trade_id (last report wins): ON CONFLICT cannot touch a row twice.
+    by_trade_id = {int(pos["trade_id"]): pos for pos in normalized}
+    rows = [(
+        magic_number,
+        symbol,
+        trade_id,
+        pos["asset"],
+        pos["direction"],
+        pos.get("entry_price"),
+        pos.get("current_price"),
+        pos.get("stop_loss"),
+        pos.get("take_profit"),
+        pos.get("lot_size"),
+        pos.get("entry_time"),
+    ) for trade_id, pos in by_trade_id.items()]
 
-        for pos in normalized:
+    try:
+        with db_cursor() as cursor:
             cursor.execute("""
-                INSERT INTO current_positions
-                (magic_number, symbol, trade_id, asset, direction, entry_price, current_price,
-                 stop_loss, take_profit, lot_size, entry_time, updated_at)
-                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)
-            """, (
-                magic_number,
-                symbol,
-                pos["trade_id"],
-                pos["asset"],
-                pos["direction"],
-                pos.get("entry_price"),
-                pos.get("current_price"),
-                pos.get("stop_loss"),
-                pos.get("take_profit"),
-                pos.get("lot_size"),
-                pos.get("entry_time"),
-            ))
-
-        conn.commit()
-        cursor.close()
-        conn.close()
-        print(f"[db] Stored {len(normalized)} position(s) for {symbol}")
+                DELETE FROM current_positions
+                WHERE symbol = %s AND magic_number = %s AND trade_id <> ALL(%s::bigint[])
+            """, (symbol, magic_number, list(by_trade_id)))
+            closed = cursor.rowcount
+
+            written = 0
+            if rows:
+                psycopg2.extras.execute_values(cursor, """
+                    INSERT INTO current_positions
+                    (magic_number, symbol, trade_id, asset, direction, entry_price, current_price,
+                     stop_loss, take_profit, lot_size, entry_time, updated_at)
+                    VALUES %s
+                    ON CONFLICT (magic_number, symbol, trade_id) DO UPDATE SET
+                        asset         = EXCLUDED.asset,
+                        direction     = EXCLUDED.direction,
+                        entry_price   = EXCLUDED.entry_price,
+                        current_price = EXCLUDED.current_price,
+                        stop_loss     = EXCLUDED.stop_loss,
+                        take_profit   = EXCLUDED.take_profit,
+                        lot_size      = EXCLUDED.lot_size,
+                        entry_time    = COALESCE(current_positions.entry_time, EXCLUDED.entry_time),
+                        updated_at    = CURRENT_TIMESTAMP
+                    WHERE (current_positions.asset, current_positions.direction,
+                           current_positions.entry_price, current_positions.current_price,
+                           current_positions.stop_loss, current_positions.take_profit,
+                           current_positions.lot_size)
+                        IS DISTINCT FROM
+                          (EXCLUDED.asset, EXCLUDED.direction,
+                           EXCLUDED.entry_price, EXCLUDED.current_price,
+                           EXCLUDED.stop_loss, EXCLUDED.take_profit,
+                           EXCLUDED.lot_size)
+                """, rows,
+                    template="(%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, CURRENT_TIMESTAMP)",
+                    page_size=len(rows),
+                )
+                written = cursor.rowcount
+
+        print(f"[db] Stored {len(rows)} position(s) for {symbol} "
+              f"({written} written, {len(rows) - written} unchanged, {closed} closed)")
         return True
 
     except Exception as e:
@@ -815,18 +2156,15 @@ def store_current_positions(
 def get_current_positions(symbol: str, magic_number: int) -> List[Dict[str, Any]]:
     """Return live positions for an EA instance (magic_number + symbol)."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT trade_id, asset, direction, entry_price, current_price,
-                   stop_loss, take_profit, lot_size, entry_time, updated_at
-            FROM current_positions
-            WHERE symbol = %s AND magic_number = %s
-            ORDER BY entry_time ASC
-        """, (symbol, magic_number))
-        results = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT trade_id, asset, direction, entry_price, current_price,
+                       stop_loss, take_profit, lot_size, entry_time, updated_at
+                FROM current_positions
+                WHERE symbol = %s AND magic_number = %s
+                ORDER BY entry_time ASC
+            """, (symbol, magic_number))
+            results = cursor.fetchall()
 
         return [{
             "trade_id":      int(row[0]),
@@ -847,21 +2185,18 @@ def get_current_positions(symbol: str, magic_number: int) -> List[Dict[str, Any]
 
 # =============================================================================
 # TRADE EVENTS
-# Append-only audit log. Never deleted or overwritten.
+# Append-only audit log. Never overwritten; whole months expire only if
+# TRADE_EVENTS_RETENTION_MONTHS is set (see PARTITIONS).
 # =============================================================================
 
 def save_trade_event(symbol: str, event_type: str, event_data: Dict[str, Any]) -> bool:
     """Append a trade execution event to the audit log."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO trade_events (symbol, event_type, event_data)
-            VALUES (%s, %s, %s)
-        """, (symbol, event_type, json.dumps(event_data)))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO trade_events (symbol, event_type, event_data)
+                VALUES (%s, %s, %s)
+            """, (symbol, event_type, json.dumps(event_data)))
         return True
 
     except Exception as e:
@@ -881,19 +2216,15 @@ def save_strategy(strategy_name: str, strategy_prompt: str, uploaded_by: str) ->
     uploaded_by are updated and updated_at is refreshed.
     """
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO strategies (strategy_name, strategy_prompt, uploaded_by, created_at, updated_at)
-            VALUES (%s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
-            ON CONFLICT (strategy_name) DO UPDATE SET
-                strategy_prompt = EXCLUDED.strategy_prompt,
-                uploaded_by     = EXCLUDED.uploaded_by,
-                updated_at      = CURRENT_TIMESTAMP
-        """, (strategy_name.strip(), strategy_prompt.strip(), uploaded_by.strip()))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO strategies (strategy_name, strategy_prompt, uploaded_by, created_at, updated_at)
+                VALUES (%s, %s, %s, CURRENT_TIMESTAMP, CURRENT_TIMESTAMP)
+                ON CONFLICT (strategy_name) DO UPDATE SET
+                    strategy_prompt = EXCLUDED.strategy_prompt,
+                    uploaded_by     = EXCLUDED.uploaded_by,
+                    updated_at      = CURRENT_TIMESTAMP
+            """, (strategy_name.strip(), strategy_prompt.strip(), uploaded_by.strip()))
         return True
 
     except Exception as e:
@@ -904,16 +2235,13 @@ def save_strategy(strategy_name: str, strategy_prompt: str, uploaded_by: str) ->
 def get_strategy(strategy_name: str) -> Optional[Dict[str, Any]]:
     """Return a single strategy by name, or None if not found."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT strategy_name, strategy_prompt, uploaded_by, created_at, updated_at
-            FROM strategies
-            WHERE strategy_name = %s
-        """, (strategy_name.strip(),))
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT strategy_name, strategy_prompt, uploaded_by, created_at, updated_at
+                FROM strategies
+                WHERE strategy_name = %s
+            """, (strategy_name.strip(),))
+            row = cursor.fetchone()
 
         if not row:
             return None
@@ -934,16 +2262,13 @@ def get_strategy(strategy_name: str) -> Optional[Dict[str, Any]]:
 def list_strategies() -> List[Dict[str, Any]]:
     """Return all strategies ordered by name (prompt text excluded for brevity)."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT strategy_name, uploaded_by, created_at, updated_at
-            FROM strategies
-            ORDER BY strategy_name ASC
-        """)
-        rows = cursor.fetchall()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT strategy_name, uploaded_by, created_at, updated_at
+                FROM strategies
+                ORDER BY strategy_name ASC
+            """)
+            rows = cursor.fetchall()
 
         return [{
             "strategy_name": row[0],
@@ -960,13 +2285,9 @@ def list_strategies() -> List[Dict[str, Any]]:
 def delete_strategy(strategy_name: str) -> bool:
     """Delete a strategy by name."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM strategies WHERE strategy_name = %s", (strategy_name.strip(),))
-        deleted = cursor.rowcount > 0
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("DELETE FROM strategies WHERE strategy_name = %s", (strategy_name.strip(),))
+            deleted = cursor.rowcount > 0
         return deleted
 
     except Exception as e:
@@ -992,38 +2313,34 @@ def save_account_snapshot(
 ) -> bool:
     """Upsert latest account metrics for this EA (keyed by magic_number only)."""
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO account_snapshots
-            (magic_number, symbol, strategy_name, account_size, realised_pnl, unrealised_pnl,
-             today_realised_pnl, week_pnl, month_pnl)
-            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-            ON CONFLICT (magic_number)
-            DO UPDATE SET
-                symbol             = EXCLUDED.symbol,
-                strategy_name      = EXCLUDED.strategy_name,
-                account_size       = EXCLUDED.account_size,
-                realised_pnl       = EXCLUDED.realised_pnl,
-                unrealised_pnl     = EXCLUDED.unrealised_pnl,
-                today_realised_pnl = EXCLUDED.today_realised_pnl,
-                week_pnl           = EXCLUDED.week_pnl,
-                month_pnl          = EXCLUDED.month_pnl,
-                created_at         = CURRENT_TIMESTAMP
-        """, (
-            magic_number,
-            symbol,
-            strategy_name or '',
-            account_size,
-            realised_pnl,
-            unrealised_pnl,
-            today_realised_pnl,
-            week_pnl,
-            month_pnl,
-        ))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO account_snapshots
+                (magic_number, symbol, strategy_name, account_size, realised_pnl, unrealised_pnl,
+                 today_realised_pnl, week_pnl, month_pnl)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (magic_number)
+                DO UPDATE SET
+                    symbol             = EXCLUDED.symbol,
+                    strategy_name      = EXCLUDED.strategy_name,
+                    account_size       = EXCLUDED.account_size,
+                    realised_pnl       = EXCLUDED.realised_pnl,
+                    unrealised_pnl     = EXCLUDED.unrealised_pnl,
+                    today_realised_pnl = EXCLUDED.today_realised_pnl,
+                    week_pnl           = EXCLUDED.week_pnl,
+                    month_pnl          = EXCLUDED.month_pnl,
+                    created_at         = CURRENT_TIMESTAMP
+            """, (
+                magic_number,
+                symbol,
+                strategy_name or '',
+                account_size,
+                realised_pnl,
+                unrealised_pnl,
+                today_realised_pnl,
+                week_pnl,
+                month_pnl,
+            ))
         return True
     except Exception as e:
         print(f"[db] save_account_snapshot error: {e}")
@@ -1032,43 +2349,29 @@ def save_account_snapshot(
 
 def get_account_context_for_analysis(magic_number: int) -> Dict[str, Any]:
     """Return the account snapshot for this magic_number (one row per bot instance)."""
-    result = {
-        "magic_number": magic_number,
-        "symbol": None,
-        "strategy_name": None,
-        "account_size": None,
-        "realised_pnl": None,
-        "unrealised_pnl": None,
-        "today_realised_pnl": None,
-        "week_pnl": None,
-        "month_pnl": None,
-        "snapshot_at": None,
-    }
+    result = _empty_account_context(magic_number)
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db_cursor() as cursor:
 
-        cursor.execute("""
-            SELECT symbol, strategy_name, account_size, realised_pnl, unrealised_pnl,
-                   today_realised_pnl, week_pnl, month_pnl, created_at
-            FROM account_snapshots
-            WHERE magic_number = %s
-            LIMIT 1
-        """, (magic_number,))
-        row = cursor.fetchone()
-        if row:
-            result["symbol"] = row[0]
-            result["strategy_name"] = row[1]
-            result["account_size"] = float(row[2]) if row[2] is not None else None
-            result["realised_pnl"] = float(row[3]) if row[3] is not None else None
-            result["unrealised_pnl"] = float(row[4]) if row[4] is not None else None
-            result["today_realised_pnl"] = float(row[5]) if row[5] is not None else None
-            result["week_pnl"] = float(row[6]) if row[6] is not None else None
-            result["month_pnl"] = float(row[7]) if row[7] is not None else None
-            result["snapshot_at"] = row[8].isoformat() if row[8] else None
+            cursor.execute("""
+                SELECT symbol, strategy_name, account_size, realised_pnl, unrealised_pnl,
+                       today_realised_pnl, week_pnl, month_pnl, created_at
+                FROM account_snapshots
+                WHERE magic_number = %s
+                LIMIT 1
+            """, (magic_number,))
+            row = cursor.fetchone()
+            if row:
+                result["symbol"] = row[0]
+                result["strategy_name"] = row[1]
+                result["account_size"] = float(row[2]) if row[2] is not None else None
+                result["realised_pnl"] = float(row[3]) if row[3] is not None else None
+                result["unrealised_pnl"] = float(row[4]) if row[4] is not None else None
+                result["today_realised_pnl"] = float(row[5]) if row[5] is not None else None
+                result["week_pnl"] = float(row[6]) if row[6] is not None else None
+                result["month_pnl"] = float(row[7]) if row[7] is not None else None
+                result["snapshot_at"] = row[8].isoformat() if row[8] else None
 
-        cursor.close()
-        conn.close()
     except Exception as e:
         print(f"[db] get_account_context_for_analysis error: {e}")
     return result
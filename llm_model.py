@@ -3,15 +3,28 @@ LLM Model Integration
 
 Handles OpenAI API calls for text-only analysis (trading decisions).
 Chart image analysis is handled separately in chart_analyzer.py via the Vision API.
+
+Every module goes through get_client() / create_chat_completion() so that all
+calls share one pooled HTTP client per worker, retry 429/5xx with jittered
+exponential backoff, and respect LLM_MAX_CONCURRENCY across gunicorn workers.
 """
 
 from openai import OpenAI
+import openai
 import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
 from dotenv import load_dotenv
 
-load_dotenv()
+try:
+    import fcntl
+except ImportError:  # non-POSIX: limiter falls back to per-process only
+    fcntl = None
 
-client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+load_dotenv()
 
 # Default model — chat, commands, classifier, simple tasks
 DEFAULT_MODEL = "gpt-5.4-nano"
@@ -19,6 +32,240 @@ DEFAULT_MODEL = "gpt-5.4-nano"
 # Mini model — synthesis, analysis, trading decisions, deeper reasoning
 MINI_MODEL = "gpt-5.4-mini"
 
+# Total deadline per call — slot queueing, every attempt and backoff all come out of it
+# (callers may pass a shorter timeout=). Keep it below gunicorn's --timeout.
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "120"))
+# A retry is only made if at least this much of the deadline is left after backing off.
+LLM_MIN_ATTEMPT_SECONDS = float(os.getenv("LLM_MIN_ATTEMPT_SECONDS", "5"))
+# Retries after the first attempt on 429 / 5xx / connection errors.
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_SECONDS = float(os.getenv("LLM_RETRY_BASE_SECONDS", "1"))
+LLM_RETRY_MAX_SECONDS = float(os.getenv("LLM_RETRY_MAX_SECONDS", "20"))
+# In-flight completions allowed across all workers on this host (flock slot files).
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_SLOT_DIR = os.getenv("LLM_SLOT_DIR", "/tmp/botcore_llm_slots")
+# How long a call may queue for a slot before failing (capped by the call's deadline).
+LLM_QUEUE_TIMEOUT_SECONDS = float(os.getenv("LLM_QUEUE_TIMEOUT_SECONDS", "120"))
+
+
+# =============================================================================
+# SHARED CLIENT
+# =============================================================================
+
+_client: Optional[OpenAI] = None
+_client_pid: Optional[int] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> OpenAI:
+    """
+    Return this worker's shared OpenAI client (created lazily, again after fork).
+
+    SDK-level retries are off — create_chat_completion() retries itself so that a
+    concurrency slot is not held while backing off.
+    """
+    global _client, _client_pid
+    pid = os.getpid()
+    if _client is not None and _client_pid == pid:
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != pid:
+            api_key = os.getenv("OPENAI_API_KEY")
+            if not api_key:
+                raise ValueError("OPENAI_API_KEY environment variable is not set")
+            _client = OpenAI(api_key=api_key, max_retries=0, timeout=LLM_TIMEOUT_SECONDS)
+            _client_pid = pid
+    return _client
+
+
+# =============================================================================
+# CONCURRENCY LIMITER (shared across workers)
+# One lock file per slot; a call holds an exclusive flock on one of them.
+# Locks die with the process, so a crashed worker never leaks a slot.
+# =============================================================================
+
+_local_slots = threading.BoundedSemaphore(max(1, LLM_MAX_CONCURRENCY))
+
+
+def _try_file_slot() -> Optional[int]:
+    for i in range(LLM_MAX_CONCURRENCY):
+        fd = os.open(os.path.join(LLM_SLOT_DIR, f"slot{i}.lock"), os.O_CREAT | os.O_RDWR, 0o666)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return fd
+        except OSError:
+            os.close(fd)
+    return None
+
+
+@contextmanager
+def llm_slot(timeout: Optional[float] = None) -> Iterator[None]:
+    """Hold one of LLM_MAX_CONCURRENCY completion slots; raises TimeoutError if none frees up."""
+    if LLM_MAX_CONCURRENCY <= 0:
+        yield
+        return
+    wait = LLM_QUEUE_TIMEOUT_SECONDS if timeout is None else timeout
+    deadline = time.monotonic() + wait
+
+    # Per-process gate first so local threads queue on a semaphore, not by polling files.
+    if not _local_slots.acquire(timeout=wait):
+        raise TimeoutError(f"no LLM slot free after {wait:.0f}s")
+    fd = None
+    try:
+        use_files = fcntl is not None
+        while use_files:
+            # Only slot-file setup may fall back to per-worker limiting; the wait's
+            # TimeoutError (an OSError subclass) must reach the caller.
+            try:
+                os.makedirs(LLM_SLOT_DIR, exist_ok=True)
+                fd = _try_file_slot()
+            except OSError as e:
+                print(f"[llm] Slot dir unavailable, limiting per worker only: {e}")
+                break
+            if fd is not None:
+                break
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"no LLM slot free after {wait:.0f}s")
+            time.sleep(random.uniform(0.05, 0.25))
+        yield
+    finally:
+        if fd is not None:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+            finally:
+                os.close(fd)
+        _local_slots.release()
+
+
+# =============================================================================
+# USAGE TRACKING
+# Per-worker totals, including provider prompt-cache hits (cached_tokens).
+# =============================================================================
+
+_usage_lock = threading.Lock()
+_usage_totals: Dict[str, float] = {
+    "calls": 0, "prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0, "latency_seconds": 0.0,
+}
+
+
+def response_usage(response: Any) -> Dict[str, int]:
+    """prompt / cached / completion token counts from a completion response (zeros if absent)."""
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return {"prompt_tokens": 0, "cached_tokens": 0, "completion_tokens": 0}
+    details = getattr(usage, "prompt_tokens_details", None)
+    return {
+        "prompt_tokens": getattr(usage, "prompt_tokens", 0) or 0,
+        "cached_tokens": (getattr(details, "cached_tokens", 0) or 0) if details is not None else 0,
+        "completion_tokens": getattr(usage, "completion_tokens", 0) or 0,
+    }
+
+
+def _record_usage(response: Any, elapsed: float) -> None:
+    usage = response_usage(response)
+    with _usage_lock:
+        _usage_totals["calls"] += 1
+        _usage_totals["latency_seconds"] += elapsed
+        for key, value in usage.items():
+            _usage_totals[key] += value
+
+
+def llm_usage_stats() -> Dict[str, Any]:
+    """Token and latency totals for this worker since start (for /api/trading/status)."""
+    with _usage_lock:
+        stats = dict(_usage_totals)
+    stats["latency_seconds"] = round(stats["latency_seconds"], 2)
+    stats["cached_ratio"] = round(stats["cached_tokens"] / stats["prompt_tokens"], 3) if stats["prompt_tokens"] else 0.0
+    return stats
+
+
+# =============================================================================
+# RETRYING CALLS
+# =============================================================================
+
+def _is_retryable(exc: Exception) -> bool:
+    if isinstance(exc, (openai.RateLimitError, openai.APIConnectionError)):
+        return True  # APITimeoutError is an APIConnectionError
+    if isinstance(exc, openai.APIStatusError):
+        return exc.status_code >= 500
+    return False
+
+
+def _retry_delay(exc: Exception, attempt: int) -> float:
+    """Honour Retry-After when the API sends one, else full-jitter exponential backoff."""
+    response = getattr(exc, "response", None)
+    retry_after = response.headers.get("retry-after") if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), LLM_RETRY_MAX_SECONDS)
+        except ValueError:
+            pass
+    return random.uniform(0, min(LLM_RETRY_MAX_SECONDS, LLM_RETRY_BASE_SECONDS * (2 ** attempt)))
+
+
+def _remaining(deadline: float) -> float:
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError("LLM call deadline exceeded")
+    return remaining
+
+
+def _retry_or_raise(exc: Exception, attempt: int, deadline: float, label: str) -> None:
+    """Sleep before the next attempt, or re-raise when out of retries or deadline."""
+    if attempt >= LLM_MAX_RETRIES or not _is_retryable(exc):
+        raise exc
+    delay = _retry_delay(exc, attempt)
+    if deadline - time.monotonic() - delay < LLM_MIN_ATTEMPT_SECONDS:
+        raise exc
+    print(f"[llm] {type(exc).__name__} — {label} {attempt + 1}/{LLM_MAX_RETRIES} in {delay:.1f}s")
+    time.sleep(delay)
+
+
+def create_chat_completion(timeout: Optional[float] = None, **kwargs: Any) -> Any:
+    """
+    chat.completions.create() through the shared client, slot limiter and retries.
+
+    timeout is the deadline for the whole call (default LLM_TIMEOUT_SECONDS):
+    waiting for a slot, each attempt and the backoff between them all share it,
+    and no retry is made once too little of it is left. With stream=True the slot
+    is held until the returned iterator is exhausted or closed; only opening the
+    stream is retried and bounded by the deadline.
+    """
+    deadline = time.monotonic() + (timeout or LLM_TIMEOUT_SECONDS)
+    if kwargs.get("stream"):
+        return _stream_chat_completion(deadline, kwargs)
+
+    client = get_client()
+    attempt = 0
+    while True:
+        try:
+            with llm_slot(min(LLM_QUEUE_TIMEOUT_SECONDS, _remaining(deadline))):
+                started = time.monotonic()
+                response = client.chat.completions.create(
+                    timeout=_remaining(deadline), **kwargs
+                )
+            _record_usage(response, time.monotonic() - started)
+            return response
+        except Exception as e:
+            _retry_or_raise(e, attempt, deadline, "retry")
+            attempt += 1
+
+
+def _stream_chat_completion(deadline: float, kwargs: Dict[str, Any]) -> Iterator[Any]:
+    client = get_client()
+    attempt = 0
+    with llm_slot(min(LLM_QUEUE_TIMEOUT_SECONDS, _remaining(deadline))):
+        while True:
+            try:
+                stream = client.chat.completions.create(
+                    timeout=_remaining(deadline), **kwargs
+                )
+                break
+            except Exception as e:
+                _retry_or_raise(e, attempt, deadline, "stream retry")
+                attempt += 1
+        yield from stream
+
 
 def call_gpt(
     system_prompt: str,
@@ -26,9 +273,11 @@ def call_gpt(
     model: str = DEFAULT_MODEL,
     max_completion_tokens: int = 6000,
     temperature: float = 0.7,
+    usage_out: Optional[Dict[str, Any]] = None,
 ) -> str:
-    """Standard call — gpt-5.4-nano. For chat, commands, and simple tasks."""
-    response = client.chat.completions.create(
+    """Standard call — gpt-5.4-nano. For chat, commands, and simple tasks.
+    usage_out, if given, receives prompt / cached / completion token counts."""
+    response = create_chat_completion(
         model=model,
         messages=[
             {"role": "system", "content": system_prompt},
@@ -37,6 +286,8 @@ def call_gpt(
         max_completion_tokens=max_completion_tokens,
         temperature=temperature,
     )
+    if usage_out is not None:
+        usage_out.update(response_usage(response))
     return response.choices[0].message.content
 
 
@@ -46,9 +297,11 @@ def call_gpt_mini(
     model: str = MINI_MODEL,
     max_completion_tokens: int = 6000,
     temperature: float = 0.7,
+    usage_out: Optional[Dict[str, Any]] = None,
 ) -> str:
-    """Mini call — gpt-5.4-mini. For synthesis, portfolio analysis, and trading decisions."""
-    response = client.chat.completions.create(
+    """Mini call — gpt-5.4-mini. For synthesis, portfolio analysis, and trading decisions.
+    usage_out, if given, receives prompt / cached / completion token counts."""
+    response = create_chat_completion(
         model=model,
         messages=[
             {"role": "system", "content": system_prompt},
@@ -57,4 +310,6 @@ def call_gpt_mini(
         max_completion_tokens=max_completion_tokens,
         temperature=temperature,
     )
+    if usage_out is not None:
+        usage_out.update(response_usage(response))
     return response.choices[0].message.content
@@ -12,6 +12,12 @@ Flow:
 The synthesis is done ONCE at SOD (or when cache is stale).
 Every intraday AI call reads the synthesis straight from the DB — no re-fetching.
 
+Refreshes are partial: each raw source is kept in the snapshot under "_sources"
+with its own TTL, a snapshot is due for refresh once its earliest source expires
+(sources_expire_at), only expired sources are re-fetched, and synthesis re-runs
+only when the hashed inputs changed. Live quote fields are left out of that hash,
+so a prices-only refresh never re-runs synthesis.
+
 APIs used (already in .env):
   RAPIDAPI_KEY       - Yahoo Finance via RapidAPI
   OPENROUTER_API_KEY - Perplexity via OpenRouter
@@ -22,9 +28,10 @@ import requests
 import os
 import json
 import re
+import hashlib
 from concurrent.futures import ThreadPoolExecutor, as_completed
-from datetime import datetime, timezone
-from typing import Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, Any, Optional, Tuple
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -32,6 +39,11 @@ load_dotenv()
 RAPIDAPI_KEY   = os.getenv("RAPIDAPI_KEY")
 OPENROUTER_KEY = os.getenv("OPENROUTER_API_KEY")
 
+# Per-source reuse windows for partial refreshes (quotes move in minutes, macro text in hours).
+RISK_ASSETS_TTL_SECONDS    = int(os.getenv("MARKET_RISK_ASSETS_TTL_SECONDS", "900"))
+MACRO_FED_TTL_SECONDS      = int(os.getenv("MARKET_MACRO_TTL_SECONDS", "21600"))
+CATALYSTS_NEWS_TTL_SECONDS = int(os.getenv("MARKET_CATALYSTS_TTL_SECONDS", "7200"))
+
 
 # =============================================================================
 # SECTION 1: RAPIDAPI — KEY RISK ASSETS
@@ -401,11 +413,9 @@ Output ONLY valid JSON as specified."""
 
     try:
         print("[market] Synthesizing market intelligence via gpt-5.4-mini...")
-        from llm_model import MINI_MODEL
-        from openai import OpenAI
-        client = OpenAI(api_key=openai_key)
+        from llm_model import MINI_MODEL, create_chat_completion
 
-        response = client.chat.completions.create(
+        response = create_chat_completion(
             model=MINI_MODEL,
             messages=[
                 {"role": "system", "content": SYNTHESIS_SYSTEM_PROMPT},
@@ -446,78 +456,216 @@ Output ONLY valid JSON as specified."""
         }
 
 
+# =============================================================================
+# SECTION 5: PER-SOURCE CACHE — partial refresh bookkeeping
+# Snapshot["_sources"][name] = {"data", "hash", "fetched_at"}; "_inputs_hash"
+# covers the raw sections minus live quote fields and decides whether synthesis
+# has to run again.
+# =============================================================================
+
+_SOURCES: Dict[str, Any] = {
+    # name → (fetcher, ttl_seconds)
+    "risk_assets":    (fetch_risk_assets,        RISK_ASSETS_TTL_SECONDS),
+    "macro_and_fed":  (fetch_macro_and_fed,      MACRO_FED_TTL_SECONDS),
+    "catalysts_news": (fetch_catalysts_and_news, CATALYSTS_NEWS_TTL_SECONDS),
+}
+
+# Placeholders the fetchers return instead of raising; never reused across refreshes.
+_SOURCE_FAILURE_PREFIXES = (
+    "Macro data unavailable", "Macro data fetch failed",
+    "Catalyst data unavailable", "Catalyst data fetch failed",
+)
+
+
+
+# Per-quote fields that move every fetch; excluded from the synthesis hash (the
+# slower averages and 52-week range still count).
+_VOLATILE_QUOTE_FIELDS = ("price", "change_pct")
+
+
+def _source_ok(value: Any) -> bool:
+    if not value:
+        return False
+    return not (isinstance(value, str) and value.startswith(_SOURCE_FAILURE_PREFIXES))
+
+
+def _hash_section(value: Any) -> str:
+    return hashlib.sha256(json.dumps(value, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def _synthesis_inputs_hash(sources: Dict[str, Dict[str, Any]]) -> str:
+    """Hash of the raw sections as far as synthesis cares (live quote fields excluded)."""
+    view: Dict[str, Any] = {}
+    for name in _SOURCES:
+        value = sources[name]["data"]
+        if name == "risk_assets" and isinstance(value, dict):
+            value = {
+                asset: ({k: v for k, v in quote.items() if k not in _VOLATILE_QUOTE_FIELDS}
+                        if isinstance(quote, dict) else quote)
+                for asset, quote in value.items()
+            }
+        view[name] = _hash_section(value)
+    return _hash_section(view)
+
+
+def _parse_fetched_at(entry: Dict[str, Any]) -> Optional[datetime]:
+    try:
+        fetched_at = datetime.fromisoformat(entry["fetched_at"])
+    except Exception:
+        return None
+    if fetched_at.tzinfo is None:
+        fetched_at = fetched_at.replace(tzinfo=timezone.utc)
+    return fetched_at
+
+
+def sources_expire_at(data: Optional[Dict[str, Any]]) -> Optional[datetime]:
+    """
+    Earliest time a source in data["_sources"] passes its TTL, i.e. when the snapshot
+    is due for a (partial) refresh. Missing or unreadable entries count as expired;
+    sources with TTL <= 0 are re-fetched on every refresh but never trigger one.
+    None if the snapshot predates per-source bookkeeping.
+    """
+    entries = (data or {}).get("_sources")
+    if not entries:
+        return None
+    expired = datetime.min.replace(tzinfo=timezone.utc)
+    expiries = []
+    for name, (_, ttl) in _SOURCES.items():
+        if ttl <= 0:
+            continue
+        entry = entries.get(name)
+        fetched_at = _parse_fetched_at(entry) if entry else None
+        expiries.append(fetched_at + timedelta(seconds=ttl) if fetched_at else expired)
+    return min(expiries) if expiries else None
+
+
+def risk_asset_quotes(data: Optional[Dict[str, Any]]) -> Tuple[Dict[str, Any], Optional[str]]:
+    """Live quotes ({asset: {"price", "change_pct"}}) and their fetch time from a snapshot."""
+    entry = ((data or {}).get("_sources") or {}).get("risk_assets") or {}
+    quotes = {
+        asset: {k: quote.get(k) for k in _VOLATILE_QUOTE_FIELDS}
+        for asset, quote in (entry.get("data") or {}).items()
+        if isinstance(quote, dict)
+    }
+    return quotes, entry.get("fetched_at")
+
+
+def _reusable_source(previous: Optional[Dict[str, Any]], name: str, ttl: int, now: datetime) -> Optional[Dict[str, Any]]:
+    """Return the previous snapshot's entry for a source if it is still within its TTL."""
+    entry = ((previous or {}).get("_sources") or {}).get(name)
+    if not entry or ttl <= 0 or not _source_ok(entry.get("data")):
+        return None
+    fetched_at = _parse_fetched_at(entry)
+    if fetched_at is None or (now - fetched_at).total_seconds() >= ttl:
+        return None
+    return entry
+
+
+def synthesis_reused(data: Optional[Dict[str, Any]]) -> bool:
+    """True if get_market_data kept the previous synthesis and only raw sources changed."""
+    data = data or {}
+    return bool(data.get("_fetched_at")) and data.get("_synthesized_at") != data.get("_fetched_at")
+
+
+def market_data_for_prompt(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Synthesis only: every "_"-prefixed key (raw sources, hashes, timestamps, "_stale")
+    is dropped, so the block is byte-identical until the synthesis itself changes and
+    stays a cacheable prompt prefix. Freshness belongs in the per-run section.
+    """
+    return {k: v for k, v in (data or {}).items() if not k.startswith("_")}
+
+
 # =============================================================================
 # MAIN FUNCTION — called by brain.py
 # =============================================================================
 
-def get_market_data(symbol: str) -> Dict[str, Any]:
+def get_market_data(
+    symbol: str,
+    previous: Optional[Dict[str, Any]] = None,
+    resynthesize: bool = False,
+) -> Dict[str, Any]:
     """
     Collect and synthesize full market intelligence for a trading symbol.
 
-    Step 1 — Parallel fetch (all independent):
-      - RapidAPI  : live risk asset prices
-      - Perplexity: macro/Fed data
-      - Perplexity: news/catalysts
+    Step 1 — Parallel fetch (all independent) of every source whose copy in
+    previous["_sources"] is missing, failed or past its TTL:
+      - RapidAPI  : live risk asset prices  (MARKET_RISK_ASSETS_TTL_SECONDS)
+      - Perplexity: macro/Fed data          (MARKET_MACRO_TTL_SECONDS)
+      - Perplexity: news/catalysts          (MARKET_CATALYSTS_TTL_SECONDS)
 
     Step 2 — Synthesis (GPT-4o-mini):
       Collates all raw data into structured forex intelligence JSON.
+      Skipped when the hash of the raw sections (live quote fields excluded)
+      matches previous["_inputs_hash"], so a prices-only refresh reuses it
+      (and keeps its "_synthesized_at"), unless resynthesize is set.
 
     Step 3 — Return synthesis dict.
       brain.py saves this to DB as market_data_note.
       Every intraday AI decision reads the synthesis from DB — no re-fetching.
 
     Args:
-        symbol: Trading symbol being analysed (e.g. "EURUSD") — for logging only,
-                market intelligence is global across all forex pairs.
+        symbol:   Trading symbol being analysed (e.g. "EURUSD") — for logging only,
+                  market intelligence is global across all forex pairs.
+        previous: Last saved snapshot to refresh from; None fetches everything.
+        resynthesize: Always run synthesis, even if the inputs are unchanged
+                  (SOD wants a brief synthesized today, not just fresh quotes).
 
     Returns:
         Structured market intelligence dict (synthesis output).
     """
     print(f"\n[market] Starting market data collection for {symbol}...")
-    timestamp = datetime.now(timezone.utc).isoformat()
-
-    # --- Step 1: Parallel fetch ---
-    risk_assets     = {}
-    macro_and_fed   = ""
-    catalysts_news  = ""
-
-    with ThreadPoolExecutor(max_workers=3) as executor:
-        future_assets    = executor.submit(fetch_risk_assets)
-        future_macro     = executor.submit(fetch_macro_and_fed)
-        future_catalysts = executor.submit(fetch_catalysts_and_news)
-
-        for future in as_completed([future_assets, future_macro, future_catalysts]):
-            if future is future_assets:
-                try:
-                    risk_assets = future.result()
-                except Exception as e:
-                    print(f"[market] Risk assets error: {e}")
+    now       = datetime.now(timezone.utc)
+    timestamp = now.isoformat()
+
+    # --- Step 1: Parallel fetch of expired sources ---
+    sources: Dict[str, Dict[str, Any]] = {}
+    to_fetch: Dict[str, Callable[[], Any]] = {}
+    for name, (fetcher, ttl) in _SOURCES.items():
+        entry = _reusable_source(previous, name, ttl, now)
+        if entry:
+            sources[name] = entry
+        else:
+            to_fetch[name] = fetcher
 
-            elif future is future_macro:
-                try:
-                    macro_and_fed = future.result()
-                except Exception as e:
-                    print(f"[market] Macro error: {e}")
+    if sources:
+        print(f"[market] Reusing cached sources: {', '.join(sources)}")
 
-            elif future is future_catalysts:
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=len(to_fetch)) as executor:
+            futures = {executor.submit(fetcher): name for name, fetcher in to_fetch.items()}
+            for future in as_completed(futures):
+                name = futures[future]
                 try:
-                    catalysts_news = future.result()
+                    value = future.result()
                 except Exception as e:
-                    print(f"[market] Catalysts error: {e}")
+                    print(f"[market] {name} error: {e}")
+                    value = {} if name == "risk_assets" else ""
+                sources[name] = {"data": value, "hash": _hash_section(value), "fetched_at": timestamp}
 
     raw_data = {
         "timestamp":      timestamp,
         "symbol":         symbol,
-        "risk_assets":    risk_assets,
-        "macro_and_fed":  macro_and_fed,
-        "catalysts_news": catalysts_news,
+        "risk_assets":    sources["risk_assets"]["data"],
+        "macro_and_fed":  sources["macro_and_fed"]["data"],
+        "catalysts_news": sources["catalysts_news"]["data"],
     }
-
-    # --- Step 2: Synthesize ---
-    intelligence = synthesize_market_data(raw_data)
+    inputs_hash = _synthesis_inputs_hash(sources)
+
+    # --- Step 2: Synthesize (only if an input changed) ---
+    if (not resynthesize and previous and previous.get("_inputs_hash") == inputs_hash
+            and not previous.get("synthesis_error")):
+        print("[market] Raw inputs unchanged — reusing previous synthesis")
+        intelligence = {k: v for k, v in previous.items() if not k.startswith("_")}
+        intelligence["_synthesized_at"] = previous.get("_synthesized_at") or previous.get("_fetched_at")
+    else:
+        intelligence = synthesize_market_data(raw_data)
+        intelligence["_synthesized_at"] = timestamp
 
     # Attach timestamp so brain.py cache logic can check freshness
-    intelligence["_fetched_at"] = timestamp
+    intelligence["_fetched_at"]  = timestamp
+    intelligence["_sources"]     = sources
+    intelligence["_inputs_hash"] = inputs_hash
 
     print(f"[market] Market intelligence ready for {symbol}")
     return intelligence
@@ -10,12 +10,30 @@ Converts raw candle arrays into structured technical analysis for GPT-4o.
 
 Candle arrays arrive newest-first (index 0 = most recent bar).
 Each candle: {"time": int, "open": float, "high": float, "low": float, "close": float, "volume": int}
+Each timeframe is converted once into a CandleFrame (parallel array('d') columns, same
+newest-first order) and every detector below runs on those columns.
+
+When called with a state_key (magic_number, symbol), swing and gap positions from the
+previous call for that EA/timeframe are reused for bars that are unchanged, so only the
+newly appended bars are scanned. See INCREMENTAL STATE below.
+
+Per-timeframe results are also memoised by a hash of the candle columns, so EAs on the
+same symbol sending identical arrays share one analysis per bar close. See RESULT MEMO.
 
 Output feeds directly into the === OHLC DATA ANALYSIS === section of the trading context.
 """
 
-from typing import Dict, Any, List, Optional, Tuple
-from datetime import datetime, timezone
+import json
+import os
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict, deque
+from itertools import accumulate
+from typing import Dict, Any, List, NamedTuple, Optional, Sequence, Tuple
+from datetime import datetime
+from hashlib import blake2b
 from zoneinfo import ZoneInfo
 
 _LONDON_TZ = ZoneInfo("Europe/London")
@@ -43,32 +61,132 @@ def _is_h1_key(tf: str) -> bool:
     return tf.upper() in ("1H_DATA", "H1_DATA")
 
 
+# =============================================================================
+# CANDLE FRAME  (columnar candles, built once per timeframe)
+# =============================================================================
+
+_NAN = float("nan")
+
+
+class CandleFrame(NamedTuple):
+    """Newest-first candle columns. Missing/invalid time, open or volume -> NaN."""
+    time: array
+    open: array
+    high: array
+    low: array
+    close: array
+    volume: array
+
+
+def _float_or_nan(value: Any) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return _NAN
+
+
+def _optional_column(candles: List[Dict[str, Any]], key: str) -> array:
+    try:
+        return array("d", [c[key] for c in candles])
+    except (KeyError, TypeError):
+        return array("d", [_float_or_nan(c.get(key)) for c in candles])
+
+
+def to_candle_frame(candles: List[Dict[str, Any]]) -> CandleFrame:
+    """
+    Convert EA candle dicts into a CandleFrame.
+    high/low/close are required (KeyError as before); the rest are optional.
+    """
+    return CandleFrame(
+        time=_optional_column(candles, "time"),
+        open=_optional_column(candles, "open"),
+        high=array("d", [c["high"] for c in candles]),
+        low=array("d", [c["low"] for c in candles]),
+        close=array("d", [c["close"] for c in candles]),
+        volume=_optional_column(candles, "volume"),
+    )
+
+
 # =============================================================================
 # SWING POINTS
 # =============================================================================
 
-def _swing_points(candles: List[Dict], strength: int = 3) -> Tuple[List[Dict], List[Dict]]:
+# Bars each side that must be lower (swing high) / higher (swing low).
+# Per-timeframe overrides go in _SWING_STRENGTH_BY_TF (keys as in _TF_RANK).
+_DEFAULT_SWING_STRENGTH = 3
+_SWING_STRENGTH_BY_TF: Dict[str, int] = {}
+
+
+def _swing_strength(tf: str, overrides: Optional[Dict[str, int]] = None) -> int:
+    for table in (overrides or {}, _SWING_STRENGTH_BY_TF):
+        for key in (tf, tf.upper()):
+            if key in table:
+                return max(0, int(table[key]))
+    return _DEFAULT_SWING_STRENGTH
+
+
+def _window_extreme_centres(values: Sequence[float], strength: int, want_max: bool) -> List[int]:
+    """
+    Indices i in [strength, n - strength) where values[i] is the max (or min) of
+    values[i - strength : i + strength + 1]. Ties count, as in the original all(>=) test.
+    Monotonic deque: each index is pushed and popped at most once -> O(n).
+    """
+    n = len(values)
+    width = 2 * strength + 1
+    out: List[int] = []
+    if n < width:
+        return out
+
+    dq: deque = deque()
+    for j in range(n):
+        v = values[j]
+        if want_max:
+            while dq and values[dq[-1]] <= v:
+                dq.pop()
+        else:
+            while dq and values[dq[-1]] >= v:
+                dq.pop()
+        dq.append(j)
+        start = j - width + 1
+        if start < 0:
+            continue
+        if dq[0] < start:
+            dq.popleft()
+        centre = start + strength
+        if values[centre] == values[dq[0]]:
+            out.append(centre)
+    return out
+
+
+def _swing_centres(frame: CandleFrame, strength: int) -> Tuple[List[int], List[int]]:
+    """(swing high indexes, swing low indexes), ascending."""
+    return (
+        _window_extreme_centres(frame.high, strength, want_max=True),
+        _window_extreme_centres(frame.low, strength, want_max=False),
+    )
+
+
+def _swing_points(
+    frame: CandleFrame,
+    strength: int = _DEFAULT_SWING_STRENGTH,
+    centres: Optional[Tuple[List[int], List[int]]] = None,
+) -> Tuple[List[Dict], List[Dict]]:
     """
     Detect swing highs and swing lows.
     strength = number of bars each side that must be lower/higher.
-    Candles newest-first; we work on reversed list and translate indices back.
+    The window is symmetric, so we scan the newest-first columns directly (no reversed copy).
+    centres: precomputed _swing_centres() result (incremental path); computed if None.
     Returns (swing_highs, swing_lows) each as list of {"price": float, "bar_index": int}
     Sorted newest-first (smallest index first).
     """
-    rev = list(reversed(candles))
-    n = len(rev)
-    highs, lows = [], []
-
-    for i in range(strength, n - strength):
-        h = rev[i]["high"]
-        l = rev[i]["low"]
-        if all(rev[i]["high"] >= rev[j]["high"] for j in range(i - strength, i + strength + 1) if j != i):
-            highs.append({"price": round(h, 5), "bar_index": (n - 1 - i)})
-        if all(rev[i]["low"] <= rev[j]["low"] for j in range(i - strength, i + strength + 1) if j != i):
-            lows.append({"price": round(l, 5), "bar_index": (n - 1 - i)})
-
-    highs.sort(key=lambda x: x["bar_index"])
-    lows.sort(key=lambda x: x["bar_index"])
+    if centres is None:
+        centres = _swing_centres(frame, strength)
+    high_idx, low_idx = centres
+    highs_v = frame.high
+    lows_v = frame.low
+
+    highs = [{"price": round(highs_v[i], 5), "bar_index": i} for i in high_idx]
+    lows = [{"price": round(lows_v[i], 5), "bar_index": i} for i in low_idx]
     return highs, lows
 
 
@@ -76,31 +194,66 @@ def _swing_points(candles: List[Dict], strength: int = 3) -> Tuple[List[Dict], L
 # IMBALANCE (3-candle gap, no level condition)
 # =============================================================================
 
-def _detect_imb(candles: List[Dict], max_imb: int = 10) -> List[Dict]:
+def _is_bull_gap(frame: CandleFrame, i: int) -> bool:
+    return frame.low[i] > frame.high[i + 2]
+
+
+def _is_bear_gap(frame: CandleFrame, i: int) -> bool:
+    return frame.high[i] < frame.low[i + 2]
+
+
+def _gap_indexes(frame: CandleFrame) -> Tuple[List[int], List[int]]:
+    """
+    (bullish, bearish) 3-candle gap positions i, ascending (newest first).
+    Shared by imbalance and FVG detection.
+    """
+    highs, lows = frame.high, frame.low
+    bull: List[int] = []
+    bear: List[int] = []
+    for i in range(len(frame.close) - 2):
+        if lows[i] > highs[i + 2]:
+            bull.append(i)
+        if highs[i] < lows[i + 2]:
+            bear.append(i)
+    return bull, bear
+
+
+def _detect_imb(
+    frame: CandleFrame,
+    max_imb: int = 10,
+    gaps: Optional[Tuple[List[int], List[int]]] = None,
+) -> List[Dict]:
     """
     Imbalance: 3-candle formation where candle[i] and candle[i+2] do not overlap (gap).
     Candles newest-first. Bullish: c[i].low > c[i+2].high. Bearish: c[i].high < c[i+2].low.
+    gaps: precomputed _gap_indexes() result; computed if None.
     Returns newest first, capped at max_imb.
     """
+    highs, lows = frame.high, frame.low
+    bull, bear = gaps if gaps is not None else _gap_indexes(frame)
     imb = []
-    for i in range(len(candles) - 2):
-        c0, c2 = candles[i], candles[i + 2]
-        if c0["low"] > c2["high"]:
+    bi = be = 0
+    while len(imb) < max_imb and (bi < len(bull) or be < len(bear)):
+        if be >= len(bear) or (bi < len(bull) and bull[bi] <= bear[be]):
+            i = bull[bi]
+            bi += 1
+            if be < len(bear) and bear[be] == i:
+                be += 1  # bullish wins on malformed bars that satisfy both
             imb.append({
                 "type": "BULLISH",
-                "top": round(c0["low"], 5),
-                "bottom": round(c2["high"], 5),
+                "top": round(lows[i], 5),
+                "bottom": round(highs[i + 2], 5),
                 "bar_index": i,
             })
-        elif c0["high"] < c2["low"]:
+        else:
+            i = bear[be]
+            be += 1
             imb.append({
                 "type": "BEARISH",
-                "top": round(c2["low"], 5),
-                "bottom": round(c0["high"], 5),
+                "top": round(lows[i + 2], 5),
+                "bottom": round(highs[i], 5),
                 "bar_index": i,
             })
-        if len(imb) >= max_imb:
-            break
     return imb
 
 
@@ -108,11 +261,41 @@ def _detect_imb(candles: List[Dict], max_imb: int = 10) -> List[Dict]:
 # FVG (imbalance after swing break + cross back; one of 3 candles must touch level)
 # =============================================================================
 
+def _first_swing_in_bands(
+    prices: List[float],
+    bar_indexes: List[int],
+    bands: List[Tuple[float, float]],
+    break_level: float,
+    min_bar: int,
+    below: bool,
+) -> Optional[int]:
+    """
+    Position (in the price-sorted swing arrays) of the swing with the smallest
+    bar_index >= min_bar whose price lies in one of the closed bands and has been
+    broken: price > break_level when below=True (a later low went under it),
+    price < break_level otherwise. None if no swing qualifies.
+    """
+    best: Optional[int] = None
+    for lo, hi in bands:
+        if below:
+            lo_pos = max(bisect_left(prices, lo), bisect_right(prices, break_level))
+            hi_pos = bisect_right(prices, hi)
+        else:
+            lo_pos = bisect_left(prices, lo)
+            hi_pos = min(bisect_right(prices, hi), bisect_left(prices, break_level))
+        for pos in range(lo_pos, hi_pos):
+            bi = bar_indexes[pos]
+            if bi >= min_bar and (best is None or bi < bar_indexes[best]):
+                best = pos
+    return best
+
+
 def _detect_fvg(
-    candles: List[Dict],
+    frame: CandleFrame,
     swing_highs: List[Dict],
     swing_lows: List[Dict],
     max_fvgs: int = 5,
+    gaps: Optional[Tuple[List[int], List[int]]] = None,
 ) -> List[Dict]:
     """
     FVG: imbalance that forms when price crosses back through a swing level after breaking it.
@@ -121,79 +304,72 @@ def _detect_fvg(
     - Downward FVG (sells): swing high → price breaks above (raid) → crosses back down; one of
       the 3 candles must touch the swing high; gap = FVG range for shorts.
     Candles newest-first. Returns newest first.
+    gaps: precomputed _gap_indexes() result; computed if None.
+
+    When several swings qualify for one gap, the newest (smallest bar_index) is used.
+    Break checks read suffix min-low / max-high tables, and candidate swings come from a
+    bisect over price-sorted swings, so each gap costs O(log s) plus the matching swings.
     """
-    fvgs = []
-    n = len(candles)
-
-    def _touches(c0: Dict, c1: Dict, c2: Dict, level: float) -> bool:
-        for c in (c0, c1, c2):
-            if c["low"] <= level <= c["high"]:
-                return True
-        return False
-
-    def _broke_below(level: float, start: int) -> bool:
-        for j in range(start, n):
-            if candles[j]["low"] < level:
-                return True
-        return False
-
-    def _broke_above(level: float, start: int) -> bool:
-        for j in range(start, n):
-            if candles[j]["high"] > level:
-                return True
-        return False
+    fvgs: List[Dict] = []
+    n = len(frame.close)
+    if n < 3 or max_fvgs <= 0:
+        return fvgs
+
+    highs, lows = frame.high, frame.low
+    bull_gaps, bear_gaps = gaps if gaps is not None else _gap_indexes(frame)
+
+    # suffix_min_low[j] = min(lows[j:]), suffix_max_high[j] = max(highs[j:])
+    suffix_min_low = list(accumulate(reversed(lows), min))[::-1]
+    suffix_max_high = list(accumulate(reversed(highs), max))[::-1]
+
+    sl_sorted = sorted(swing_lows, key=lambda x: x["price"])
+    sl_prices = [x["price"] for x in sl_sorted]
+    sl_bars = [x["bar_index"] for x in sl_sorted]
+    sh_sorted = sorted(swing_highs, key=lambda x: x["price"])
+    sh_prices = [x["price"] for x in sh_sorted]
+    sh_bars = [x["bar_index"] for x in sh_sorted]
 
     # Upward FVG: bullish gap after break below swing low; one of 3 candles touches level
-    for i in range(n - 2):
-        c0, c1, c2 = candles[i], candles[i + 1], candles[i + 2]
-        if c0["low"] <= c2["high"]:
-            continue
-        top, bottom = round(c0["low"], 5), round(c2["high"], 5)
-        for sl in swing_lows:
-            level = sl["price"]
-            if level > bottom:
-                continue
-            if sl["bar_index"] < i + 2:
-                continue
-            if not _touches(c0, c1, c2, level):
-                continue
-            if not _broke_below(level, i + 2):
+    if sl_prices:
+        for i in bull_gaps:
+            top, bottom = round(lows[i], 5), round(highs[i + 2], 5)
+            bands = [(lows[k], min(highs[k], bottom)) for k in (i, i + 1, i + 2)]
+            pos = _first_swing_in_bands(
+                sl_prices, sl_bars, bands, suffix_min_low[i + 2], i + 2, below=True,
+            )
+            if pos is None:
                 continue
             fvgs.append({
                 "type": "BULLISH",
                 "top": top,
                 "bottom": bottom,
-                "swing_level": level,
+                "swing_level": sl_prices[pos],
                 "bar_index": i,
             })
-            break
+            if len(fvgs) >= max_fvgs:
+                return fvgs
 
     # Downward FVG: bearish gap after break above swing high; one of 3 candles touches level
-    for i in range(n - 2):
-        c0, c1, c2 = candles[i], candles[i + 1], candles[i + 2]
-        if c0["high"] >= c2["low"]:
-            continue
-        top, bottom = round(c2["low"], 5), round(c0["high"], 5)
-        for sh in swing_highs:
-            level = sh["price"]
-            if level < top:
-                continue
-            if sh["bar_index"] < i + 2:
-                continue
-            if not _touches(c0, c1, c2, level):
-                continue
-            if not _broke_above(level, i + 2):
+    if sh_prices:
+        for i in bear_gaps:
+            top, bottom = round(lows[i + 2], 5), round(highs[i], 5)
+            bands = [(max(lows[k], top), highs[k]) for k in (i, i + 1, i + 2)]
+            pos = _first_swing_in_bands(
+                sh_prices, sh_bars, bands, suffix_max_high[i + 2], i + 2, below=False,
+            )
+            if pos is None:
                 continue
             fvgs.append({
                 "type": "BEARISH",
                 "top": top,
                 "bottom": bottom,
-                "swing_level": level,
+                "swing_level": sh_prices[pos],
                 "bar_index": i,
             })
-            break
+            if len(fvgs) >= max_fvgs:
+                return fvgs
 
-    return fvgs[:max_fvgs]
+    return fvgs
 
 
 # =============================================================================
@@ -210,49 +386,45 @@ _SESSIONS = [
 ]
 
 
-def _session_highs_lows(candles: List[Dict]) -> List[Dict]:
+def _session_highs_lows(frame: CandleFrame) -> List[Dict]:
     """
     Compute high and low per session from H1 candles (London local time).
-    Candles newest-first. Each candle has "time" (London-local epoch from EA).
-    If we're currently inside a session, note it as in-progress.
+    Candles newest-first. time column is the London-local epoch from the EA
+    (NaN where missing). If we're currently inside a session, note it as in-progress.
     If no data for a session, high/low are "NA".
     """
-    if not candles:
+    if not frame.close:
         return []
 
     now_london = datetime.now(_LONDON_TZ)
     current_hour = now_london.hour
-    results = []
 
+    # Hour of day, reading the London-local epoch as a clock value
+    # (same as datetime.fromtimestamp(t, tz=timezone.utc).hour). -1 = no time.
+    bar_hours = [int(t // 3600) % 24 if t == t else -1 for t in frame.time]
+    highs, lows = frame.high, frame.low
+
+    results = []
     for label, start_h, end_h in _SESSIONS:
         entry = {"session": label, "high": None, "low": None}
         in_progress = start_h <= current_hour < end_h
 
-        # Collect candles that fall in this London-time session window.
-        # fromtimestamp with utc reads the London-local epoch as a clock value.
-        session_candles = []
-        for c in candles:
-            t = c.get("time")
-            if t is None:
-                continue
-            try:
-                dt = datetime.fromtimestamp(t, tz=timezone.utc)
-            except (TypeError, OSError):
-                continue
-            h = dt.hour
-            if h >= start_h and h < end_h:
-                session_candles.append(c)
+        session_high = session_low = None
+        for i, h in enumerate(bar_hours):
+            if start_h <= h < end_h:
+                if session_high is None or highs[i] > session_high:
+                    session_high = highs[i]
+                if session_low is None or lows[i] < session_low:
+                    session_low = lows[i]
 
-        if not session_candles:
+        if session_high is None:
             entry["high"] = "NA"
             entry["low"] = "NA"
             if in_progress:
                 entry["note"] = "in progress, no completed bars yet"
         else:
-            all_highs = [c["high"] for c in session_candles]
-            all_lows = [c["low"] for c in session_candles]
-            entry["high"] = round(max(all_highs), 5)
-            entry["low"] = round(min(all_lows), 5)
+            entry["high"] = round(session_high, 5)
+            entry["low"] = round(session_low, 5)
             if in_progress:
                 entry["note"] = "current high/low so far (session in progress)"
 
@@ -261,22 +433,171 @@ def _session_highs_lows(candles: List[Dict]) -> List[Dict]:
     return results
 
 
+# =============================================================================
+# INCREMENTAL STATE  (per magic_number / symbol / timeframe, in-process LRU)
+# =============================================================================
+# Between two intraday calls for one EA, the window normally just slides by a bar
+# or two. We keep the previous frame plus its swing and gap indexes. A new frame
+# is lined up against it by the previous newest bar's time. If the overlapping
+# bars are unchanged, their swing/gap results are shifted across and only the
+# bars near the new edge (and any older tail the previous call never saw) are
+# scanned. The previous newest bar may still have been forming, so it is always
+# rescanned. Any other difference means history was rewritten -> full recompute.
+# FVG matching and sessions depend on the whole window and are always recomputed
+# from these indexes (both are cheap once the gaps are known).
+#
+# State is per worker process and is not persisted: a miss costs one full scan
+# of the window, which is cheaper than a DB round trip to load it.
+
+OHLC_STATE_MAX_ENTRIES = int(os.getenv("OHLC_STATE_MAX_ENTRIES", "256"))
+
+
+class _TimeframeState(NamedTuple):
+    frame: CandleFrame
+    strength: int
+    swings: Tuple[List[int], List[int]]
+    gaps: Tuple[List[int], List[int]]
+
+
+_state_lock = threading.Lock()
+_states: "OrderedDict[Tuple[Any, str, str], _TimeframeState]" = OrderedDict()
+
+
+def _get_state(key: Tuple[Any, str, str]) -> Optional[_TimeframeState]:
+    with _state_lock:
+        state = _states.get(key)
+        if state is not None:
+            _states.move_to_end(key)
+        return state
+
+
+def _put_state(key: Tuple[Any, str, str], state: _TimeframeState) -> None:
+    with _state_lock:
+        _states[key] = state
+        _states.move_to_end(key)
+        while len(_states) > max(0, OHLC_STATE_MAX_ENTRIES):
+            _states.popitem(last=False)
+
+
+def _frame_overlap(prev: CandleFrame, frame: CandleFrame) -> Optional[Tuple[int, int, int]]:
+    """
+    Line frame up against prev (both newest-first).
+    Returns (shift, dirty, end): prev bar i is frame bar i + shift for frame bars in
+    [shift, end); frame bars before `dirty` are new or changed. None if history differs.
+    """
+    if not prev.close or not frame.close:
+        return None
+    newest = prev.time[0]
+    if newest != newest:  # NaN: bars cannot be lined up
+        return None
+    try:
+        shift = frame.time.index(newest)
+    except ValueError:
+        return None
+
+    overlap = min(len(prev.close), len(frame.close) - shift)
+    end = shift + overlap
+    for col in ("time", "high", "low"):
+        if getattr(frame, col)[shift + 1:end] != getattr(prev, col)[1:overlap]:
+            return None
+
+    unchanged = frame.high[shift] == prev.high[0] and frame.low[shift] == prev.low[0]
+    return shift, (shift if unchanged else shift + 1), end
+
+
+def _merge_indexes(
+    prev_idx: List[int],
+    shift: int,
+    first: int,
+    last: int,
+    reuse_lo: int,
+    reuse_hi: int,
+    hit,
+) -> List[int]:
+    """
+    Indexes j in [first, last) where hit(j): previous results (shifted) inside
+    [reuse_lo, reuse_hi), hit() evaluated everywhere else. Ascending.
+    """
+    if last <= first:
+        return []
+    reuse_lo = min(max(reuse_lo, first), last)
+    reuse_hi = max(min(reuse_hi, last), reuse_lo)
+    out = [j for j in range(first, reuse_lo) if hit(j)]
+    out.extend(j for j in (i + shift for i in prev_idx) if reuse_lo <= j < reuse_hi)
+    out.extend(j for j in range(reuse_hi, last) if hit(j))
+    return out
+
+
+def _incremental_indexes(
+    frame: CandleFrame,
+    strength: int,
+    state_key: Optional[Tuple[Any, str, str]],
+) -> Tuple[Tuple[List[int], List[int]], Tuple[List[int], List[int]]]:
+    """(swing centres, gaps) for frame, reusing the previous call's state where bars are unchanged."""
+    prev = _get_state(state_key) if state_key is not None else None
+    overlap = None
+    if prev is not None and prev.strength == strength:
+        overlap = _frame_overlap(prev.frame, frame)
+
+    if overlap is None:
+        swings = _swing_centres(frame, strength)
+        gaps = _gap_indexes(frame)
+    else:
+        shift, dirty, end = overlap
+        n = len(frame.close)
+        k = strength
+        highs, lows = frame.high, frame.low
+
+        def _is_swing_high(j: int) -> bool:
+            return highs[j] == max(highs[j - k:j + k + 1])
+
+        def _is_swing_low(j: int) -> bool:
+            return lows[j] == min(lows[j - k:j + k + 1])
+
+        # A swing centre only depends on bars j-k..j+k; a gap on bars i..i+2.
+        swings = (
+            _merge_indexes(prev.swings[0], shift, k, n - k, dirty + k, end - k, _is_swing_high),
+            _merge_indexes(prev.swings[1], shift, k, n - k, dirty + k, end - k, _is_swing_low),
+        )
+        gaps = (
+            _merge_indexes(prev.gaps[0], shift, 0, n - 2, dirty, end - 2, lambda i: _is_bull_gap(frame, i)),
+            _merge_indexes(prev.gaps[1], shift, 0, n - 2, dirty, end - 2, lambda i: _is_bear_gap(frame, i)),
+        )
+
+    if state_key is not None:
+        _put_state(state_key, _TimeframeState(frame, strength, swings, gaps))
+    return swings, gaps
+
+
 # =============================================================================
 # PER-TIMEFRAME ANALYSIS
 # =============================================================================
 
-def _analyze_timeframe(tf: str, candles: List[Dict]) -> Dict[str, Any]:
-    """Analysis for one timeframe: swing points, imbalance, FVG; session high/low only for H1."""
-    if not candles:
+def _analyze_timeframe(
+    tf: str,
+    frame: CandleFrame,
+    swing_strength: Optional[int] = None,
+    state_key: Optional[Tuple[Any, str]] = None,
+) -> Dict[str, Any]:
+    """
+    Analysis for one timeframe: swing points, imbalance, FVG; session high/low only for H1.
+    state_key: (magic_number, symbol) to reuse incremental state for this timeframe.
+    """
+    if not frame.close:
         return {"error": "no data"}
 
-    current_price = candles[0]["close"]
-    period_high = max(c["high"] for c in candles)
-    period_low = min(c["low"] for c in candles)
+    current_price = frame.close[0]
+    period_high = max(frame.high)
+    period_low = min(frame.low)
 
-    swing_h, swing_l = _swing_points(candles, strength=3)
-    imb = _detect_imb(candles, max_imb=10)
-    fvgs = _detect_fvg(candles, swing_h, swing_l, max_fvgs=5)
+    if swing_strength is None:
+        swing_strength = _swing_strength(tf)
+    centres, gaps = _incremental_indexes(
+        frame, swing_strength, (*state_key, tf) if state_key is not None else None
+    )
+    swing_h, swing_l = _swing_points(frame, strength=swing_strength, centres=centres)
+    imb = _detect_imb(frame, max_imb=10, gaps=gaps)
+    fvgs = _detect_fvg(frame, swing_h, swing_l, max_fvgs=5, gaps=gaps)
 
     nearest_resistance = next(
         (sh["price"] for sh in sorted(swing_h, key=lambda x: x["price"]) if sh["price"] > current_price),
@@ -288,7 +609,7 @@ def _analyze_timeframe(tf: str, candles: List[Dict]) -> Dict[str, Any]:
     )
 
     out = {
-        "candle_count": len(candles),
+        "candle_count": len(frame.close),
         "current_price": round(current_price, 5),
         "period_high": round(period_high, 5),
         "period_low": round(period_low, 5),
@@ -301,22 +622,142 @@ def _analyze_timeframe(tf: str, candles: List[Dict]) -> Dict[str, Any]:
     }
 
     if _is_h1_key(tf):
-        out["session_highs_lows"] = _session_highs_lows(candles)
+        out["session_highs_lows"] = _session_highs_lows(frame)
     else:
         out["session_highs_lows"] = None  # only H1 has session analysis
 
     return out
 
 
+# =============================================================================
+# RESULT MEMO  (content-addressed, per timeframe)
+# =============================================================================
+# Several EAs on one symbol send identical 4h/1D arrays at SOD. Each timeframe's
+# result is keyed by a blake2b hash of the columns the analysis reads
+# (time/high/low/close) plus timeframe and swing strength. H1 keys also include
+# the current London hour, because session notes depend on it.
+# L1 is an in-process LRU with TTL. With OHLC_CACHE_SHARED=1, misses also
+# check the ohlc_analysis_cache table (one query per call), so all gunicorn
+# workers share results. Entries are stored as JSON text, so every hit returns
+# a fresh copy. The database module is only imported once the shared table is
+# actually used, so the analyzer itself has no DB dependency.
+
+OHLC_CACHE_MAX_ENTRIES = int(os.getenv("OHLC_CACHE_MAX_ENTRIES", "512"))
+OHLC_CACHE_TTL_SECONDS = int(os.getenv("OHLC_CACHE_TTL_SECONDS", "3600"))
+OHLC_CACHE_SHARED = os.getenv("OHLC_CACHE_SHARED", "").strip().lower() in ("1", "true", "yes")
+
+# Bump when the analysis output changes shape so old shared rows are ignored.
+_MEMO_VERSION = "1"
+# Shared rows are pruned by age after this many shared writes per worker.
+_MEMO_PRUNE_EVERY = 200
+
+_memo_lock = threading.Lock()
+_memo: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+_memo_stats = {"hits": 0, "shared_hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+_memo_shared_writes = 0
+
+
+def _memo_key(tf: str, frame: CandleFrame, strength: int) -> str:
+    h = blake2b(digest_size=16)
+    h.update(f"{_MEMO_VERSION}|{tf}|{strength}".encode())
+    if _is_h1_key(tf):
+        h.update(datetime.now(_LONDON_TZ).strftime("|%H").encode())
+    for col in (frame.time, frame.high, frame.low, frame.close):
+        h.update(col.tobytes())
+    return h.hexdigest()
+
+
+def _memo_store_local(entries: Dict[str, str], now: float) -> None:
+    if OHLC_CACHE_MAX_ENTRIES <= 0 or OHLC_CACHE_TTL_SECONDS <= 0:
+        return
+    with _memo_lock:
+        for key, text in entries.items():
+            _memo[key] = (now + OHLC_CACHE_TTL_SECONDS, text)
+            _memo.move_to_end(key)
+        while len(_memo) > OHLC_CACHE_MAX_ENTRIES:
+            _memo.popitem(last=False)
+            _memo_stats["evictions"] += 1
+
+
+def _memo_get_many(keys: List[str]) -> Dict[str, Dict[str, Any]]:
+    """{key: result} for every key found in L1 (or the shared table when enabled)."""
+    now = time.monotonic()
+    found: Dict[str, str] = {}
+    with _memo_lock:
+        for key in keys:
+            entry = _memo.get(key)
+            if entry is None:
+                continue
+            if entry[0] <= now:
+                del _memo[key]
+                _memo_stats["expired"] += 1
+                continue
+            _memo.move_to_end(key)
+            found[key] = entry[1]
+        _memo_stats["hits"] += len(found)
+
+    missing = [k for k in dict.fromkeys(keys) if k not in found]
+    if missing and OHLC_CACHE_SHARED:
+        from database import get_ohlc_analysis_cache
+
+        shared = get_ohlc_analysis_cache(missing, OHLC_CACHE_TTL_SECONDS)
+        if shared:
+            _memo_store_local(shared, now)
+            found.update(shared)
+            with _memo_lock:
+                _memo_stats["shared_hits"] += len(shared)
+
+    with _memo_lock:
+        _memo_stats["misses"] += sum(1 for k in missing if k not in found)
+    return {key: json.loads(text) for key, text in found.items()}
+
+
+def _memo_put_many(results: Dict[str, Dict[str, Any]]) -> None:
+    global _memo_shared_writes
+    if not results:
+        return
+    entries = {key: json.dumps(result) for key, result in results.items()}
+    _memo_store_local(entries, time.monotonic())
+    if OHLC_CACHE_SHARED:
+        from database import prune_ohlc_analysis_cache, save_ohlc_analysis_cache
+
+        save_ohlc_analysis_cache(entries)
+        with _memo_lock:
+            _memo_shared_writes += 1
+            prune = _memo_shared_writes % _MEMO_PRUNE_EVERY == 0
+        if prune:
+            prune_ohlc_analysis_cache(OHLC_CACHE_TTL_SECONDS)
+
+
+def ohlc_cache_stats() -> Dict[str, Any]:
+    """Hit/miss counters for the per-timeframe result memo (this worker)."""
+    with _memo_lock:
+        stats = dict(_memo_stats)
+        stats["entries"] = len(_memo)
+    lookups = stats["hits"] + stats["shared_hits"] + stats["misses"]
+    stats["hit_rate"] = round((stats["hits"] + stats["shared_hits"]) / lookups, 3) if lookups else None
+    stats["shared"] = OHLC_CACHE_SHARED
+    stats["max_entries"] = OHLC_CACHE_MAX_ENTRIES
+    stats["ttl_seconds"] = OHLC_CACHE_TTL_SECONDS
+    return stats
+
+
 # =============================================================================
 # MAIN ENTRY POINT
 # =============================================================================
 
-def analyze_ohlc_data(ohlc_data: Dict[str, List[Dict[str, Any]]]) -> Dict[str, Any]:
+def analyze_ohlc_data(
+    ohlc_data: Dict[str, List[Dict[str, Any]]],
+    swing_strength: Optional[Dict[str, int]] = None,
+    state_key: Optional[Tuple[Any, str]] = None,
+) -> Dict[str, Any]:
     """
     Analyze OHLC data for all timeframes.
 
     - Swing points, imbalance (detect_imb), FVG (swing-level-based), session high/low (H1 only).
+    - swing_strength: optional {timeframe_key: bars_each_side}; falls back to
+      _SWING_STRENGTH_BY_TF, then _DEFAULT_SWING_STRENGTH.
+    - state_key: optional (magic_number, symbol); enables incremental reuse across calls.
     """
     result: Dict[str, Any] = {
         "timeframes": {},
@@ -328,11 +769,32 @@ def analyze_ohlc_data(ohlc_data: Dict[str, List[Dict[str, Any]]]) -> Dict[str, A
     if not valid_tfs:
         return {"error": "no valid OHLC data", "timeframes": {}, "summary": {}}
 
+    tf_results: Dict[str, Dict[str, Any]] = {}
+    frames: Dict[str, Tuple[CandleFrame, int, str]] = {}
     for tf, candles in valid_tfs.items():
         try:
-            result["timeframes"][tf] = _analyze_timeframe(tf, candles)
+            frame = to_candle_frame(candles)
+            strength = _swing_strength(tf, swing_strength)
+            frames[tf] = (frame, strength, _memo_key(tf, frame, strength))
+        except Exception as e:
+            tf_results[tf] = {"error": str(e)}
+
+    cached = _memo_get_many([key for _, _, key in frames.values()])
+    fresh: Dict[str, Dict[str, Any]] = {}
+    for tf, (frame, strength, key) in frames.items():
+        if key in cached:
+            tf_results[tf] = cached[key]
+            continue
+        try:
+            tf_results[tf] = _analyze_timeframe(
+                tf, frame, swing_strength=strength, state_key=state_key
+            )
+            fresh[key] = tf_results[tf]
         except Exception as e:
-            result["timeframes"][tf] = {"error": str(e)}
+            tf_results[tf] = {"error": str(e)}
+    _memo_put_many(fresh)
+
+    result["timeframes"] = {tf: tf_results[tf] for tf in valid_tfs}
 
     sorted_tfs = sorted(valid_tfs.keys(), key=_tf_rank, reverse=True)
     lowest_tf = sorted(valid_tfs.keys(), key=_tf_rank)[0]
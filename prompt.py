@@ -13,6 +13,7 @@ Three compose functions assemble the final system prompt for each call type:
   compose_botcore_prompt()                  → general + botcore
 """
 
+from functools import lru_cache
 from typing import Optional
 
 
@@ -698,8 +699,11 @@ You are here to advise, explain, analyse and help the user create strategies.
 # =============================================================================
 # COMPOSE FUNCTIONS
 # These assemble the final system prompt for each call type.
+# Memoised per strategy text: the result is byte-identical across runs, which is
+# also what lets the provider's prompt cache reuse the system-message prefix.
 # =============================================================================
 
+@lru_cache(maxsize=64)
 def compose_sod_prompt(strategy_prompt: str) -> str:
     """
     Assemble the full SOD system prompt: general + strategy + sod.
@@ -717,6 +721,7 @@ def compose_sod_prompt(strategy_prompt: str) -> str:
     ])
 
 
+@lru_cache(maxsize=64)
 def compose_intraday_prompt(strategy_prompt: str) -> str:
     """
     Assemble the full intraday system prompt: general + strategy + intraday.
@@ -734,6 +739,7 @@ def compose_intraday_prompt(strategy_prompt: str) -> str:
     ])
 
 
+@lru_cache(maxsize=1)
 def compose_botcore_prompt() -> str:
     """
     Assemble the full BotCore chat system prompt: general + botcore.
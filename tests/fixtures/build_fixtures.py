@@ -0,0 +1,103 @@
+"""
+Rebuild the OHLC fixtures in this directory from the stock-indicators test data.
+
+    pip download --no-deps --no-binary :all: stock-indicators==1.3.5
+    tar xzf stock_indicators-1.3.5.tar.gz
+    python tests/fixtures/build_fixtures.py stock_indicators-1.3.5/test_data
+
+Source bars are resampled into clock-aligned EA timeframes and written in the
+ohlc_data shape the EA posts (keys as in ohlc_analyzer._TF_RANK, newest first).
+"""
+
+import csv
+import json
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def _epoch(naive: datetime) -> int:
+    # Exchange-local wall clock stored as if UTC, like the EA's London-local epochs.
+    return int(naive.replace(tzinfo=timezone.utc).timestamp())
+
+
+def _read_csv(path: str) -> List[Dict]:
+    bars = []
+    with open(path, newline="", encoding="utf-8") as f:
+        for row in csv.DictReader(f):
+            stamp = row["date"]
+            fmt = "%Y-%m-%d %H:%M:%S" if " " in stamp else "%Y-%m-%d"
+            bars.append({
+                "time": _epoch(datetime.strptime(stamp, fmt)),
+                "open": float(row["open"]), "high": float(row["high"]),
+                "low": float(row["low"]), "close": float(row["close"]),
+                "volume": int(float(row["volume"])),
+            })
+    return bars
+
+
+def _read_ethusdt(path: str) -> List[Dict]:
+    with open(path, encoding="utf-8") as f:
+        rows = json.load(f)
+    return [{
+        "time": _epoch(datetime.fromisoformat(r["Date"]).replace(tzinfo=None)),
+        "open": r["Open"], "high": r["High"], "low": r["Low"], "close": r["Close"],
+        "volume": int(r["Volume"]),
+    } for r in rows]
+
+
+def _resample(bars: List[Dict], seconds: int) -> List[Dict]:
+    """Oldest-first bars -> oldest-first bars bucketed on multiples of `seconds`."""
+    out: List[Dict] = []
+    for bar in bars:
+        start = bar["time"] - bar["time"] % seconds
+        if out and out[-1]["time"] == start:
+            agg = out[-1]
+            agg["high"] = max(agg["high"], bar["high"])
+            agg["low"] = min(agg["low"], bar["low"])
+            agg["close"] = bar["close"]
+            agg["volume"] += bar["volume"]
+        else:
+            out.append(dict(bar, time=start))
+    return out
+
+
+def _write(name: str, payload: Dict[str, List[Dict]]) -> None:
+    path = os.path.join(HERE, name)
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("{\n")
+        for n, (tf, bars) in enumerate(payload.items()):
+            rows = ",\n".join("    " + json.dumps(b) for b in reversed(bars))
+            f.write(f'  "{tf}": [\n{rows}\n  ]' + (",\n" if n < len(payload) - 1 else "\n"))
+        f.write("}\n")
+    print(f"{name}: " + ", ".join(f"{tf}={len(b)}" for tf, b in payload.items()))
+
+
+def main(test_data: str) -> None:
+    spy_m1 = _read_csv(os.path.join(test_data, "quotes", "Intraday.csv"))
+    _write("spy_intraday_2020-12.json", {
+        "M5_DATA": _resample(spy_m1, 300),
+        "M15_DATA": _resample(spy_m1, 900),
+        "H1_DATA": _resample(spy_m1, 3600),
+        "4h_DATA": _resample(spy_m1, 14400),
+    })
+    eth_m5 = _read_ethusdt(os.path.join(test_data, "zig_zag", "data.ethusdt.json"))
+    _write("ethusdt_intraday_2021-10.json", {
+        "M5_DATA": eth_m5,
+        "M15_DATA": _resample(eth_m5, 900),
+        "H1_DATA": _resample(eth_m5, 3600),
+        "4h_DATA": _resample(eth_m5, 14400),
+    })
+    btc_d1 = _read_csv(os.path.join(test_data, "quotes", "Bitcoin.csv"))
+    _write("daily_spy_btc.json", {
+        "1D_DATA": _read_csv(os.path.join(test_data, "quotes", "Default.csv")),
+        "D1_DATA": btc_d1,
+        "1W_DATA": _resample(btc_d1, 7 * 86400),
+    })
+
+
+if __name__ == "__main__":
+    main(sys.argv[1])
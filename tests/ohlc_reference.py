@@ -0,0 +1,147 @@
+"""
+Reference (pre-optimisation) OHLC detectors, kept verbatim on candle dicts so the
+tests and benchmarks can check the columnar versions in ohlc_analyzer against them.
+"""
+
+import glob
+import json
+import os
+import random
+from typing import Dict, List, Tuple
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def swing_points(candles: List[Dict], strength: int = 3) -> Tuple[List[Dict], List[Dict]]:
+    """Original O(n * strength) _swing_points (reversed copy + all() window test)."""
+    rev = list(reversed(candles))
+    n = len(rev)
+    highs, lows = [], []
+
+    for i in range(strength, n - strength):
+        h = rev[i]["high"]
+        l = rev[i]["low"]
+        if all(rev[i]["high"] >= rev[j]["high"] for j in range(i - strength, i + strength + 1) if j != i):
+            highs.append({"price": round(h, 5), "bar_index": (n - 1 - i)})
+        if all(rev[i]["low"] <= rev[j]["low"] for j in range(i - strength, i + strength + 1) if j != i):
+            lows.append({"price": round(l, 5), "bar_index": (n - 1 - i)})
+
+    highs.sort(key=lambda x: x["bar_index"])
+    lows.sort(key=lambda x: x["bar_index"])
+    return highs, lows
+
+
+def detect_fvg(
+    candles: List[Dict],
+    swing_highs: List[Dict],
+    swing_lows: List[Dict],
+    max_fvgs: int = 5,
+) -> List[Dict]:
+    """Original _detect_fvg: per-swing _touches check and linear _broke_below/_broke_above scans."""
+    fvgs = []
+    n = len(candles)
+
+    def _touches(c0: Dict, c1: Dict, c2: Dict, level: float) -> bool:
+        for c in (c0, c1, c2):
+            if c["low"] <= level <= c["high"]:
+                return True
+        return False
+
+    def _broke_below(level: float, start: int) -> bool:
+        for j in range(start, n):
+            if candles[j]["low"] < level:
+                return True
+        return False
+
+    def _broke_above(level: float, start: int) -> bool:
+        for j in range(start, n):
+            if candles[j]["high"] > level:
+                return True
+        return False
+
+    for i in range(n - 2):
+        c0, c1, c2 = candles[i], candles[i + 1], candles[i + 2]
+        if c0["low"] <= c2["high"]:
+            continue
+        top, bottom = round(c0["low"], 5), round(c2["high"], 5)
+        for sl in swing_lows:
+            level = sl["price"]
+            if level > bottom:
+                continue
+            if sl["bar_index"] < i + 2:
+                continue
+            if not _touches(c0, c1, c2, level):
+                continue
+            if not _broke_below(level, i + 2):
+                continue
+            fvgs.append({
+                "type": "BULLISH",
+                "top": top,
+                "bottom": bottom,
+                "swing_level": level,
+                "bar_index": i,
+            })
+            break
+
+    for i in range(n - 2):
+        c0, c1, c2 = candles[i], candles[i + 1], candles[i + 2]
+        if c0["high"] >= c2["low"]:
+            continue
+        top, bottom = round(c2["low"], 5), round(c0["high"], 5)
+        for sh in swing_highs:
+            level = sh["price"]
+            if level < top:
+                continue
+            if sh["bar_index"] < i + 2:
+                continue
+            if not _touches(c0, c1, c2, level):
+                continue
+            if not _broke_above(level, i + 2):
+                continue
+            fvgs.append({
+                "type": "BEARISH",
+                "top": top,
+                "bottom": bottom,
+                "swing_level": level,
+                "bar_index": i,
+            })
+            break
+
+    return fvgs[:max_fvgs]
+
+
+def random_candles(rng: random.Random, n: int, digits: int = 5, vol: float = 0.001) -> List[Dict]:
+    """
+    Random walk in the EA payload shape (newest-first dicts, hourly times).
+    Fewer digits quantise prices to coarser ticks, which produces equal highs/lows.
+    """
+    price = 1.25
+    t = 1_700_000_000
+    out = []
+    for i in range(n):
+        o = price
+        c = price + rng.gauss(0, vol)
+        h = max(o, c) + abs(rng.gauss(0, vol / 2))
+        l = min(o, c) - abs(rng.gauss(0, vol / 2))
+        out.append({
+            "time": t + 3600 * i,
+            "open": round(o, digits),
+            "high": round(h, digits),
+            "low": round(l, digits),
+            "close": round(c, digits),
+            "volume": rng.randint(1, 500),
+        })
+        price = c
+    return out[::-1]
+
+
+def fixture_series() -> List[Tuple[str, List[Dict]]]:
+    """(label, candles) for every timeframe in tests/fixtures/*.json EA payloads."""
+    series = []
+    for path in sorted(glob.glob(os.path.join(FIXTURE_DIR, "*.json"))):
+        with open(path) as f:
+            payload = json.load(f)
+        for tf, candles in payload.items():
+            if isinstance(candles, list) and candles:
+                series.append((f"{os.path.basename(path)}:{tf}", candles))
+    return series
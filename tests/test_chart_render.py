@@ -0,0 +1,81 @@
+"""Local chart renderer (CHART_SOURCE=local): PNG output and overlay edge cases."""
+
+import base64
+import io
+import random
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image
+
+import chart_analyzer
+import ohlc_analyzer
+from ohlc_reference import random_candles
+
+
+def _decode(png: bytes) -> Image.Image:
+    img = Image.open(io.BytesIO(png))
+    img.load()
+    return img
+
+
+@pytest.mark.parametrize("theme", ["dark", "light"])
+@pytest.mark.parametrize("size", [(800, 600), (320, 200), (1280, 720)])
+def test_render_chart_png_decodes_with_requested_size(theme, size):
+    candles = random_candles(random.Random(1), 300)
+    analysis = ohlc_analyzer.analyze_ohlc_data({"H1_DATA": candles})
+    png = chart_analyzer.render_chart_png(
+        candles, width=size[0], height=size[1], theme=theme,
+        title="FX:EURUSD H1", overlays=analysis["timeframes"]["H1_DATA"],
+    )
+    img = _decode(png)
+    assert img.format == "PNG"
+    assert img.size == size
+    assert img.mode == "RGB"
+
+
+def test_render_chart_png_rejects_empty_candles():
+    with pytest.raises(ValueError):
+        chart_analyzer.render_chart_png([])
+
+
+@pytest.mark.parametrize("n", [1, 2, 3, 4, 7])
+def test_render_chart_image_base64_short_frames(monkeypatch, n):
+    monkeypatch.setattr(chart_analyzer, "CHART_LOCAL_OVERLAYS", True)
+    candles = random_candles(random.Random(n), n)
+    b64 = chart_analyzer.render_chart_image_base64("FX:EURUSD", "M15", candles, width=400, height=300)
+    assert b64 is not None
+    assert _decode(base64.b64decode(b64)).size == (400, 300)
+
+
+def test_render_chart_image_base64_empty_frame_returns_none(monkeypatch):
+    monkeypatch.setattr(chart_analyzer, "CHART_LOCAL_OVERLAYS", True)
+    assert chart_analyzer.render_chart_image_base64("FX:EURUSD", "H1", []) is None
+
+
+@pytest.mark.parametrize("overlays", [
+    {},
+    {"error": "no data"},
+    {"swing_highs": [], "swing_lows": [], "fair_value_gaps": []},
+    {"swing_highs": None, "swing_lows": None, "fair_value_gaps": None},
+    # Indexes past the drawn window (more candles than fit the width) are skipped.
+    {
+        "swing_highs": [{"price": 1.3, "bar_index": 10_000}],
+        "swing_lows": [{"price": 1.2, "bar_index": 0}],
+        "fair_value_gaps": [
+            {"type": "BULLISH", "top": 1.26, "bottom": 1.25, "bar_index": 10_000},
+            {"type": "BEARISH", "top": 1.26, "bottom": 1.25, "bar_index": 0},
+        ],
+    },
+])
+def test_render_chart_png_tolerates_sparse_overlays(overlays):
+    candles = random_candles(random.Random(5), 400)
+    assert _decode(chart_analyzer.render_chart_png(candles, width=200, height=150, overlays=overlays)).size == (200, 150)
+
+
+def test_render_chart_png_flat_and_open_less_candles():
+    flat = [{"time": 1_700_000_000 - 3600 * i, "open": 1.1, "high": 1.1, "low": 1.1, "close": 1.1} for i in range(5)]
+    assert _decode(chart_analyzer.render_chart_png(flat, width=300, height=200)).size == (300, 200)
+    no_open = [{k: v for k, v in c.items() if k != "open"} for c in random_candles(random.Random(9), 20)]
+    assert _decode(chart_analyzer.render_chart_png(no_open, width=300, height=200)).size == (300, 200)
@@ -0,0 +1,36 @@
+"""Cross-worker LLM concurrency limiter (flock slot files)."""
+
+import os
+import time
+
+import pytest
+
+fcntl = pytest.importorskip("fcntl")
+
+import llm_model
+
+
+def test_llm_slot_times_out_when_every_slot_file_is_held(tmp_path, monkeypatch):
+    monkeypatch.setattr(llm_model, "LLM_SLOT_DIR", str(tmp_path))
+    monkeypatch.setattr(llm_model, "LLM_MAX_CONCURRENCY", 2)
+
+    # Separate open file descriptions conflict under flock even within one process,
+    # so these stand in for two other workers holding both slots.
+    held = []
+    for i in range(llm_model.LLM_MAX_CONCURRENCY):
+        fd = os.open(os.path.join(tmp_path, f"slot{i}.lock"), os.O_CREAT | os.O_RDWR, 0o666)
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        held.append(fd)
+    try:
+        started = time.monotonic()
+        with pytest.raises(TimeoutError):
+            with llm_model.llm_slot(timeout=0.3):
+                pytest.fail("entered the slot while every slot file was held")
+        assert time.monotonic() - started >= 0.3
+    finally:
+        for fd in held:
+            os.close(fd)
+
+    # Once a slot frees up the next caller gets in, and the local gate was released.
+    with llm_model.llm_slot(timeout=1):
+        pass
@@ -0,0 +1,54 @@
+"""Differential tests: ohlc_analyzer detectors vs the original implementations."""
+
+import random
+
+import pytest
+
+import ohlc_analyzer
+from ohlc_reference import detect_fvg, fixture_series, random_candles, swing_points
+
+STRENGTHS = [1, 2, 3, 5, 8]
+
+
+@pytest.mark.parametrize("strength", STRENGTHS)
+@pytest.mark.parametrize("digits", [5, 3])
+def test_swing_points_match_reference_on_random_candles(strength, digits):
+    rng = random.Random(strength * 100 + digits)
+    for _ in range(200):
+        candles = random_candles(rng, rng.randint(0, 300), digits=digits)
+        frame = ohlc_analyzer.to_candle_frame(candles)
+        assert ohlc_analyzer._swing_points(frame, strength) == swing_points(candles, strength)
+
+
+@pytest.mark.parametrize("strength", STRENGTHS)
+def test_swing_points_match_reference_on_fixtures(strength):
+    series = fixture_series()
+    if not series:
+        pytest.skip("no OHLC payloads in tests/fixtures")
+    for label, candles in series:
+        frame = ohlc_analyzer.to_candle_frame(candles)
+        assert ohlc_analyzer._swing_points(frame, strength) == swing_points(candles, strength), label
+
+
+@pytest.mark.parametrize("max_fvgs", [1, 5, 10**9])
+@pytest.mark.parametrize("digits", [5, 4])
+def test_detect_fvg_matches_reference_on_random_candles(max_fvgs, digits):
+    rng = random.Random(max_fvgs % 997 + digits)
+    for _ in range(300):
+        candles = random_candles(
+            rng, rng.randint(0, 200), digits=digits, vol=rng.choice([0.0003, 0.001, 0.003])
+        )
+        frame = ohlc_analyzer.to_candle_frame(candles)
+        highs, lows = ohlc_analyzer._swing_points(frame, rng.randint(1, 4))
+        assert ohlc_analyzer._detect_fvg(frame, highs, lows, max_fvgs) == detect_fvg(candles, highs, lows, max_fvgs)
+
+
+def test_detect_fvg_matches_reference_on_fixtures():
+    series = fixture_series()
+    if not series:
+        pytest.skip("no OHLC payloads in tests/fixtures")
+    for label, candles in series:
+        frame = ohlc_analyzer.to_candle_frame(candles)
+        highs, lows = ohlc_analyzer._swing_points(frame)
+        for max_fvgs in (5, 10**9):
+            assert ohlc_analyzer._detect_fvg(frame, highs, lows, max_fvgs) == detect_fvg(candles, highs, lows, max_fvgs), label
@@ -0,0 +1,160 @@
+"""
+Incremental swing/gap reuse (_incremental_indexes / _frame_overlap / _merge_indexes)
+replayed against cold analysis on sliding EA windows.
+"""
+
+import random
+
+import pytest
+
+import ohlc_analyzer
+from ohlc_reference import fixture_series, random_candles
+
+
+@pytest.fixture(autouse=True)
+def _fresh_state(monkeypatch):
+    # No result memo: every call must go through the incremental path.
+    monkeypatch.setattr(ohlc_analyzer, "OHLC_CACHE_MAX_ENTRIES", 0)
+    monkeypatch.setattr(ohlc_analyzer, "OHLC_CACHE_SHARED", False)
+    ohlc_analyzer._states.clear()
+    yield
+    ohlc_analyzer._states.clear()
+
+
+@pytest.fixture
+def overlap_hits(monkeypatch):
+    """Counts calls where _frame_overlap lined the frames up (i.e. state was reused)."""
+    hits = {"reused": 0, "calls": 0}
+    real = ohlc_analyzer._frame_overlap
+
+    def counting(prev, frame):
+        out = real(prev, frame)
+        hits["calls"] += 1
+        hits["reused"] += out is not None
+        return out
+
+    monkeypatch.setattr(ohlc_analyzer, "_frame_overlap", counting)
+    return hits
+
+
+def _series_with_gaps(rng, n):
+    """Oldest-first random walk with ~10% of bars missing (weekend/holiday gaps)."""
+    candles = random_candles(rng, n, digits=rng.choice([5, 3]))[::-1]
+    return [c for c in candles if rng.random() > 0.1]
+
+
+def _forming(bar, rng):
+    """The same bar part-way through: narrower range, different close."""
+    lo, hi = min(bar["open"], bar["close"]), max(bar["open"], bar["close"])
+    close = round(rng.uniform(bar["low"], bar["high"]), 5)
+    return dict(
+        bar,
+        high=max(hi, close, round(rng.uniform(hi, bar["high"]), 5)),
+        low=min(lo, close, round(rng.uniform(bar["low"], lo), 5)),
+        close=close,
+    )
+
+
+def _ea_windows(rng, series, steps, size):
+    """
+    Newest-first windows as one EA would post them on consecutive calls: mostly a
+    slide by 0-3 bars, sometimes a jump past the old window, a longer/shorter
+    history, a still-forming newest bar, or a revised older bar.
+    """
+    pos = size
+    for _ in range(steps):
+        pos += rng.choice([0, 0, 1, 1, 1, 1, 2, 3, size + 5])
+        length = max(3, rng.choice([size, size, size, size - 7, size + 11]))
+        if pos + 3 > len(series):
+            return
+        window = [dict(c) for c in reversed(series[max(0, pos - length):pos + 1])]
+        if rng.random() < 0.5:
+            window[0] = _forming(window[0], rng)
+        if rng.random() < 0.1 and len(window) > 10:
+            i = rng.randrange(2, len(window))
+            window[i]["high"] = round(window[i]["high"] + 0.002, 5)
+        yield window
+
+
+def _cold_indexes(frame, strength):
+    return ohlc_analyzer._swing_centres(frame, strength), ohlc_analyzer._gap_indexes(frame)
+
+
+@pytest.mark.parametrize("strength", [1, 2, 3, 5])
+def test_incremental_indexes_match_cold_scan(strength, overlap_hits):
+    rng = random.Random(strength)
+    for run in range(20):
+        series = _series_with_gaps(rng, 400)
+        key = (run, "EURUSD", "M15_DATA")
+        for window in _ea_windows(rng, series, 150, rng.choice([12, 60, 120])):
+            frame = ohlc_analyzer.to_candle_frame(window)
+            assert ohlc_analyzer._incremental_indexes(frame, strength, key) == _cold_indexes(frame, strength)
+    assert overlap_hits["reused"] > overlap_hits["calls"] // 2
+
+
+def test_incremental_analysis_matches_cold_on_fixtures(overlap_hits):
+    rng = random.Random(7)
+    series = fixture_series()
+    if not series:
+        pytest.skip("no OHLC payloads in tests/fixtures")
+    for label, candles in series:
+        history = candles[::-1]
+        for window in _ea_windows(rng, history, 80, min(100, len(history) // 2)):
+            payload = {"M15_DATA": window}
+            warm = ohlc_analyzer.analyze_ohlc_data(payload, state_key=(1, label))
+            assert warm == ohlc_analyzer.analyze_ohlc_data(payload), label
+    assert overlap_hits["reused"] > 0
+
+
+def test_incremental_analysis_survives_eviction_and_strength_changes(monkeypatch, overlap_hits):
+    # Three EAs round-robin through a two-entry LRU: states are evicted between calls.
+    monkeypatch.setattr(ohlc_analyzer, "OHLC_STATE_MAX_ENTRIES", 2)
+    rng = random.Random(11)
+    streams = {
+        magic: _ea_windows(rng, _series_with_gaps(rng, 500), 120, 80) for magic in (101, 202, 303)
+    }
+    done = set()
+    while len(done) < len(streams):
+        for magic, stream in streams.items():
+            window = next(stream, None)
+            if window is None:
+                done.add(magic)
+                continue
+            strengths = {"H1_DATA": rng.choice([3, 3, 3, 2])}
+            payload = {"H1_DATA": window, "4h_DATA": window[::4]}
+            warm = ohlc_analyzer.analyze_ohlc_data(payload, strengths, state_key=(magic, "GBPUSD"))
+            assert warm == ohlc_analyzer.analyze_ohlc_data(payload, strengths), magic
+        # Only the last two EAs' H1/4h entries can be live: 2 of the 6.
+        assert len(ohlc_analyzer._states) <= 2
+    assert overlap_hits["calls"] > 0
+
+
+def test_frame_overlap_flags_rewritten_bars():
+    rng = random.Random(3)
+    bars = random_candles(rng, 30)
+    prev = ohlc_analyzer.to_candle_frame(bars[1:])
+    assert ohlc_analyzer._frame_overlap(prev, ohlc_analyzer.to_candle_frame(bars)) == (1, 1, 30)
+
+    forming = [dict(b) for b in bars]
+    forming[1]["high"] += 0.01
+    assert ohlc_analyzer._frame_overlap(prev, ohlc_analyzer.to_candle_frame(forming)) == (1, 2, 30)
+
+    revised = [dict(b) for b in bars]
+    revised[5]["low"] -= 0.01
+    assert ohlc_analyzer._frame_overlap(prev, ohlc_analyzer.to_candle_frame(revised)) is None
+
+    unrelated = ohlc_analyzer.to_candle_frame(random_candles(rng, 30)[::-1][:10])
+    assert ohlc_analyzer._frame_overlap(prev, unrelated) is None
+
+
+def test_merge_indexes_reuses_only_inside_band():
+    calls = []
+
+    def hit(j):
+        calls.append(j)
+        return j % 3 == 0
+
+    # prev hits at 0, 4, 7 shift by 2 -> 2, 6, 9; only 4..8 is trusted.
+    out = ohlc_analyzer._merge_indexes([0, 4, 7], 2, 0, 12, 4, 8, hit)
+    assert out == [0, 3, 6, 9]
+    assert calls == [0, 1, 2, 3, 8, 9, 10, 11]
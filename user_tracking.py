@@ -19,7 +19,7 @@ import bcrypt
 from datetime import datetime, timezone
 from typing import Dict, Any, List, Optional
 
-from database import get_db_connection
+from database import db_cursor
 
 MAX_RECENT_MESSAGES = 20
 
@@ -46,15 +46,11 @@ def create_user(email: str, password: str, full_name: str) -> Optional[Dict[str,
     created_at   = datetime.now(timezone.utc)
 
     try:
-        conn   = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO users (user_id, email, password, full_name, created_at, recent_messages)
-            VALUES (%s, %s, %s, %s, %s, %s)
-        """, (user_id, email, hashed_pw, full_name, created_at, json.dumps([])))
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                INSERT INTO users (user_id, email, password, full_name, created_at, recent_messages)
+                VALUES (%s, %s, %s, %s, %s, %s)
+            """, (user_id, email, hashed_pw, full_name, created_at, json.dumps([])))
 
         return {
             "user_id":    user_id,
@@ -70,15 +66,12 @@ def create_user(email: str, password: str, full_name: str) -> Optional[Dict[str,
 def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
     """Return full user row (including hashed password) or None."""
     try:
-        conn   = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT user_id, email, password, full_name, created_at
-            FROM users WHERE email = %s
-        """, (email.strip().lower(),))
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT user_id, email, password, full_name, created_at
+                FROM users WHERE email = %s
+            """, (email.strip().lower(),))
+            row = cursor.fetchone()
 
         if not row:
             return None
@@ -98,15 +91,12 @@ def get_user_by_email(email: str) -> Optional[Dict[str, Any]]:
 def get_user_by_id(user_id: str) -> Optional[Dict[str, Any]]:
     """Return user row (without password) or None."""
     try:
-        conn   = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            SELECT user_id, email, full_name, created_at
-            FROM users WHERE user_id = %s
-        """, (user_id,))
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute("""
+                SELECT user_id, email, full_name, created_at
+                FROM users WHERE user_id = %s
+            """, (user_id,))
+            row = cursor.fetchone()
 
         if not row:
             return None
@@ -150,38 +140,31 @@ def add_message(user_id: str, role: str, content: str) -> bool:
     Older messages beyond MAX_RECENT_MESSAGES are dropped.
     """
     try:
-        conn   = get_db_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            "SELECT recent_messages FROM users WHERE user_id = %s",
-            (user_id,)
-        )
-        row = cursor.fetchone()
-        if not row:
-            cursor.close()
-            conn.close()
-            return False
-
-        messages: List[Dict] = row[0] if row[0] else []
-
-        messages.append({
-            "role":    role,
-            "content": content,
-            "ts":      datetime.now(timezone.utc).isoformat()
-        })
-
-        # Keep only the most recent MAX_RECENT_MESSAGES entries
-        if len(messages) > MAX_RECENT_MESSAGES:
-            messages = messages[-MAX_RECENT_MESSAGES:]
-
-        cursor.execute(
-            "UPDATE users SET recent_messages = %s WHERE user_id = %s",
-            (json.dumps(messages), user_id)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute(
+                "SELECT recent_messages FROM users WHERE user_id = %s",
+                (user_id,)
+            )
+            row = cursor.fetchone()
+            if not row:
+                return False
+
+            messages: List[Dict] = row[0] if row[0] else []
+
+            messages.append({
+                "role":    role,
+                "content": content,
+                "ts":      datetime.now(timezone.utc).isoformat()
+            })
+
+            # Keep only the most recent MAX_RECENT_MESSAGES entries
+            if len(messages) > MAX_RECENT_MESSAGES:
+                messages = messages[-MAX_RECENT_MESSAGES:]
+
+            cursor.execute(
+                "UPDATE users SET recent_messages = %s WHERE user_id = %s",
+                (json.dumps(messages), user_id)
+            )
         return True
 
     except Exception as e:
@@ -192,15 +175,12 @@ def add_message(user_id: str, role: str, content: str) -> bool:
 def get_messages(user_id: str) -> List[Dict[str, Any]]:
     """Return the list of recent messages for a user (oldest first)."""
     try:
-        conn   = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT recent_messages FROM users WHERE user_id = %s",
-            (user_id,)
-        )
-        row = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute(
+                "SELECT recent_messages FROM users WHERE user_id = %s",
+                (user_id,)
+            )
+            row = cursor.fetchone()
 
         if not row or not row[0]:
             return []
@@ -215,15 +195,11 @@ def get_messages(user_id: str) -> List[Dict[str, Any]]:
 def clear_messages(user_id: str) -> bool:
     """Wipe the message history for a user (e.g. new session)."""
     try:
-        conn   = get_db_connection()
-        cursor = conn.cursor()
-        cursor.execute(
-            "UPDATE users SET recent_messages = %s WHERE user_id = %s",
-            (json.dumps([]), user_id)
-        )
-        conn.commit()
-        cursor.close()
-        conn.close()
+        with db_cursor() as cursor:
+            cursor.execute(
+                "UPDATE users SET recent_messages = %s WHERE user_id = %s",
+                (json.dumps([]), user_id)
+            )
         return True
     except Exception as e:
         print(f"[users] clear_messages error: {e}")